@@ -3,12 +3,21 @@ Main application for the AI meeting recorder using Gradio.
 """
 
 import os
+import uuid
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import gradio as gr
 from core.audio import AudioRecorder
-from core.transcription import Transcriber
+from core.transcription import Transcriber, TranscriptionError
 from core.summary import SummaryGenerator
 from core.export import Exporter
 from utils import Config
+from utils.audio_utils import AudioPreflightError, combine_transcriptions, preflight_audio
+from utils.audio_pool import get_audio_pool
+from utils.profiling import profiled
+from config import GRADIO_CONFIG, SUMMARY_CONFIG, TRANSCRIPTION_CONFIG
 
 class MeetingRecorderApp:
     """Main application class for the meeting recorder."""
@@ -16,108 +25,290 @@ class MeetingRecorderApp:
     def __init__(self):
         """Initialize the application."""
         self.config = Config()
-        self.audio_recorder = AudioRecorder()
         self.transcriber = Transcriber()
         self.summary_generator = SummaryGenerator()
         self.exporter = Exporter()
         
-        self.meeting_title = self.config.get_app_config()["default_meeting_title"]
-        self.participants = []
+        self.default_meeting_title = self.config.get_app_config()["default_meeting_title"]
+        
+        # Recorders are per browser session, so users never stop each other's recordings
+        self._recorders = {}
+        self._recorders_lock = threading.Lock()
+        
+        # Heavy work runs on bounded pools, so the event loop keeps serving other sessions
+        # and transcription and summary calls are limited independently
+        self._transcription_pool = ThreadPoolExecutor(
+            max_workers=GRADIO_CONFIG["transcription_workers"], thread_name_prefix="transcription")
+        self._summary_pool = ThreadPoolExecutor(
+            max_workers=GRADIO_CONFIG["summary_workers"], thread_name_prefix="summary")
+    
+    def new_session_state(self):
+        """Initial per-session state (meeting info and the last summary of the browser session)."""
+        return {
+            # Id of the browser session, fixed for its lifetime; keys the session's recorder
+            "browser_id": None,
+            "session_id": None,
+            "meeting_title": self.default_meeting_title,
+            "participants": [],
+            "summary": "",
+            # (summary, structured summary) of the last export, reused while the summary is unchanged
+            "structured_summary": None,
+        }
+    
+    @staticmethod
+    def _session_id(state):
+        """Get the session's meeting id, starting a meeting on first use."""
+        if not state.get("session_id"):
+            # Transcription history is kept per meeting, so exports only contain this meeting
+            state["session_id"] = uuid.uuid4().hex
+        return state["session_id"]
+    
+    @staticmethod
+    def _browser_id(state):
+        """Get the id of the browser session; unlike the meeting id, it never changes."""
+        if not state.get("browser_id"):
+            state["browser_id"] = uuid.uuid4().hex
+        return state["browser_id"]
+    
+    @staticmethod
+    async def _stream(pool, fn, *args, **kwargs):
+        """
+        Run a blocking call on a worker pool without blocking the event loop.
+        
+        The call gets an `emit(item)` callback as its first argument; this yields
+        ("update", item) for every emitted item as it arrives, then ("result", return value).
+        If the consumer stops early, `emit` raises so the call can stop as well.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+        
+        def emit(item):
+            if cancelled.is_set():
+                raise RuntimeError("請求已取消")
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        
+        future = pool.submit(fn, emit, *args, **kwargs)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, done))
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield "update", item
+            yield "result", future.result()
+        finally:
+            cancelled.set()
     
-    def set_meeting_info(self, title, participants_str):
-        """Set meeting information."""
-        self.meeting_title = title if title else self.config.get_app_config()["default_meeting_title"]
-        self.participants = [p.strip() for p in participants_str.split(",") if p.strip()]
-        return f"會議訊息已設置: {self.meeting_title} (參與者: {', '.join(self.participants)})"
+    @staticmethod
+    def _emit_all(emit, generate, *args, **kwargs):
+        """Emit every item of a generator and return the last one."""
+        item = None
+        for item in generate(*args, **kwargs):
+            emit(item)
+        return item
     
-    def start_recording(self):
+    def set_meeting_info(self, title, participants_str, state):
+        """Set meeting information and start a new meeting session."""
+        state["session_id"] = uuid.uuid4().hex
+        state["meeting_title"] = title if title else self.default_meeting_title
+        state["participants"] = [p.strip() for p in (participants_str or "").split(",") if p.strip()]
+        state["summary"] = ""
+        return f"會議訊息已設置: {state['meeting_title']} (參與者: {', '.join(state['participants'])})", state
+    
+    def _recorder(self, state, create=False):
+        """Get the audio recorder of a browser session, which survives starting a new meeting."""
+        browser_id = self._browser_id(state)
+        with self._recorders_lock:
+            recorder = self._recorders.get(browser_id)
+            if recorder is None and create:
+                recorder = self._recorders[browser_id] = AudioRecorder()
+            return recorder
+    
+    def start_recording(self, state):
         """Start recording audio."""
-        return self.audio_recorder.start_recording()
-    def stop_recording(self):
+        return self._recorder(state, create=True).start_recording(), state
+    
+    def stop_recording(self, state):
         """Stop recording audio."""
-        return self.audio_recorder.stop_recording()
+        recorder = self._recorder(state)
+        if recorder is None:
+            return None, "沒有正在進行的錄音。"
+        return recorder.stop_recording()
+    
+    def close_session(self, state):
+        """Release the resources of a closed browser session."""
+        browser_id = state.get("browser_id") if state else None
+        with self._recorders_lock:
+            recorder = self._recorders.pop(browser_id, None)
+        if recorder is not None:
+            recorder.recording = False
+            if recorder.record_thread:
+                recorder.record_thread.join(timeout=2.0)
+            recorder.cleanup()
     
-    def transcribe_audio(self, audio_file):
-        """Transcribe audio to text."""
+    async def _transcribe_progressive(self, audio_file, state):
+        """Transcribe audio, yielding (transcript so far, progress message) as chunks complete."""
+        session_id = self._session_id(state)
+        chunks = []
+        updates = self._stream(
+            self._transcription_pool,
+            lambda emit: self.transcriber.transcribe_audio(
+                audio_file, session_id=session_id, on_chunk=lambda i, total, text: emit((i, total, text)))
+        )
+        async for kind, item in updates:
+            if kind == "update":
+                index, total, text = item
+                chunks.append(text)
+                yield combine_transcriptions(chunks, TRANSCRIPTION_CONFIG["chunk_overlap"]), f"正在轉錄音頻... 已完成 {index + 1}/{total} 個分段"
+            else:
+                yield item, "轉錄完成"
+    
+    async def _summarize_progressive(self, generate, *args, **kwargs):
+        """Run a streaming summary generator on the summary pool, yielding the summary so far."""
+        # Send at most one update per interval to the browser; the final summary is always sent
+        interval = GRADIO_CONFIG["stream_interval"]
+        last_sent = 0
+        async for kind, item in self._stream(self._summary_pool, self._emit_all, generate, *args, **kwargs):
+            now = asyncio.get_running_loop().time()
+            if item is not None and (kind == "result" or now - last_sent >= interval):
+                last_sent = now
+                yield item
+    
+    @profiled()
+    async def transcribe_audio(self, audio_file, state):
+        """Transcribe audio to text, showing each chunk as it is transcribed."""
         if not audio_file:
-            return "請先錄製音頻。"
-        return self.transcriber.transcribe_audio(audio_file)
+            yield "請先錄製音頻。", state
+            return
+        try:
+            async for transcription, _ in self._transcribe_progressive(audio_file, state):
+                yield transcription, state
+        except TranscriptionError as e:
+            yield str(e), state
     
-    def generate_summary(self, transcription):
-        """Generate meeting summary."""
-        return self.summary_generator.generate_summary(
+    @profiled()
+    async def generate_summary(self, transcription, state):
+        """Generate meeting summary, streaming it as the model writes it."""
+        async for summary in self._summarize_progressive(
+            self.summary_generator.generate_summary_stream,
             transcription, 
-            meeting_title=self.meeting_title, 
-            participants=self.participants
+            meeting_title=state["meeting_title"], 
+            participants=state["participants"]
+        ):
+            state["summary"] = summary
+            yield summary, state
+    
+    async def _structure_summary(self, state):
+        """Convert the session's summary to a structured summary for indexing, reusing it while the summary is unchanged."""
+        if not SUMMARY_CONFIG["structured_export"] or not state["summary"]:
+            return None
+        cached = state.get("structured_summary")
+        if cached and cached[0] == state["summary"]:
+            return cached[1]
+        _, structured = await asyncio.get_running_loop().run_in_executor(
+            self._summary_pool, functools.partial(
+                self.summary_generator.generate_structured_summary, None,
+                meeting_title=state["meeting_title"], participants=state["participants"], summary=state["summary"]
+            )
         )
+        if structured is not None:
+            state["structured_summary"] = (state["summary"], structured)
+        return structured
     
-    def export_meeting(self):
+    @profiled()
+    async def export_meeting(self, state):
         """Export meeting record."""
-        return self.exporter.export_meeting(
-            self.meeting_title,
-            self.participants,
-            self.transcriber.get_all_transcriptions(),
-            self.summary_generator.get_summary()
-        )
+        # The transcript history is read from the shared state store off the event loop
+        transcriptions = await asyncio.to_thread(self.transcriber.get_all_transcriptions, self._session_id(state))
+        return await asyncio.wrap_future(self.exporter.export_meeting_async(
+            state["meeting_title"],
+            state["participants"],
+            transcriptions,
+            state["summary"],
+            structured_summary=await self._structure_summary(state)
+        ))
     
-    def process_uploaded_audio(self, audio_file, title, participants_str):
-        """Process uploaded audio file: transcribe and generate summary."""
+    @profiled()
+    async def process_uploaded_audio(self, audio_file, title, participants_str, state):
+        """Process uploaded audio file: transcribe and generate summary, showing results as they arrive."""
         # Set meeting info
-        info_message = self.set_meeting_info(title, participants_str)
+        info_message, state = self.set_meeting_info(title, participants_str, state)
         
         # Transcribe audio
         if not audio_file:
-            return info_message, "請上傳音頻文件。", ""
+            yield info_message, "請上傳音頻文件。", "", "", state
+            return
+        
+        # Reject empty, corrupt or silent files before spending a transcription call on them
+        try:
+            audio_info = await get_audio_pool().run_async(preflight_audio, audio_file)
+        except AudioPreflightError as e:
+            yield f"{info_message}\n{e}", "", "", "", state
+            return
+        print(f"Uploaded audio: {audio_info['format']}, {audio_info['duration']:.0f}s, "
+              f"estimated cost ${audio_info['estimated_cost']:.3f}")
         
-        transcription = self.transcriber.transcribe_audio(audio_file)
+        transcription = ""
+        yield f"{info_message}\n正在轉錄音頻...", transcription, "", "", state
+        try:
+            async for transcription, progress in self._transcribe_progressive(audio_file, state):
+                yield f"{info_message}\n{progress}", transcription, "", "", state
+        except TranscriptionError as e:
+            yield f"{info_message}\n轉錄失敗", str(e), "", "", state
+            return
         
         # Generate summary
-        summary = self.summary_generator.generate_summary(
-            transcription, 
-            meeting_title=self.meeting_title, 
-            participants=self.participants
-        )
+        yield f"{info_message}\n正在生成摘要...", transcription, "", "", state
+        async for summary, state in self.generate_summary(transcription, state):
+            yield f"{info_message}\n正在生成摘要...", transcription, summary, "", state
         
         # Export meeting
-        export_status = self.exporter.export_meeting(
-            self.meeting_title,
-            self.participants,
-            self.transcriber.get_all_transcriptions(),
-            summary
-        )
+        yield f"{info_message}\n正在導出會議記錄...", transcription, state["summary"], "", state
+        export_status = await self.export_meeting(state)
         
-        return info_message, transcription, summary, export_status
+        yield f"{info_message}\n處理完成", transcription, state["summary"], export_status, state
     
-    def process_recorded_audio(self, audio_file):
-        """Process recorded audio: transcribe, generate summary, and export."""
+    @profiled()
+    async def process_recorded_audio(self, audio_file, state):
+        """Process recorded audio: transcribe, generate summary, and export, showing results as they arrive."""
         if not audio_file:
-            return "請先錄製音頻。", "", ""
+            yield "請先錄製音頻。", "", "", "", state
+            return
         
         print(f"Processing recorded audio: {audio_file}")
         
         # Transcribe audio
-        transcription = self.transcriber.transcribe_audio(audio_file)
-        
-        # If transcription failed with an error message, return it
-        if transcription.startswith("轉錄失敗") or transcription.startswith("請先錄製") or transcription.startswith("音頻文件不存在") or transcription.startswith("無法處理音頻"):
-            return transcription, "", ""
+        transcription = ""
+        yield transcription, "", "", "正在轉錄音頻...", state
+        try:
+            async for transcription, progress in self._transcribe_progressive(audio_file, state):
+                yield transcription, "", "", progress, state
+        except TranscriptionError as e:
+            # Failed transcriptions are neither summarized nor exported
+            yield str(e), "", "", "轉錄失敗", state
+            return
         
-        # Generate summary
-        summary = self.summary_generator.generate_summary(
-            transcription, 
-            meeting_title=self.meeting_title, 
-            participants=self.participants
-        )
+        # Update the meeting summary with the new recording instead of re-summarizing the whole meeting
+        session_id = self._session_id(state)
+        yield transcription, state["summary"], "", "正在更新會議摘要...", state
+        meeting_text = await asyncio.to_thread(self.transcriber.get_combined_text, session_id)
+        async for summary in self._summarize_progressive(
+            self.summary_generator.generate_incremental_summary_stream,
+            meeting_text,
+            session_id,
+            meeting_title=state["meeting_title"], 
+            participants=state["participants"]
+        ):
+            state["summary"] = summary
+            yield transcription, summary, "", "正在更新會議摘要...", state
         
         # Export meeting
-        export_status = self.exporter.export_meeting(
-            self.meeting_title,
-            self.participants,
-            self.transcriber.get_all_transcriptions(),
-            summary
-        )
+        yield transcription, state["summary"], "", "正在導出會議記錄...", state
+        export_status = await self.export_meeting(state)
         
-        return transcription, summary, export_status
+        yield transcription, state["summary"], export_status, "處理完成", state
     
     def create_interface(self):
         """Create the Gradio interface."""
@@ -130,11 +321,18 @@ class MeetingRecorderApp:
             """)
             gr.Markdown("### 自動記錄會議內容，識別說話者，並生成摘要")
             
+            # Meeting info, session id and summary of this browser session
+            session_state = gr.State(
+                self.new_session_state(),
+                time_to_live=GRADIO_CONFIG["session_ttl"],
+                delete_callback=self.close_session
+            )
+            
             with gr.Tab("一站式會議處理"):
                 gr.Markdown("### 在一個頁面完成所有會議記錄流程")
                 
                 with gr.Row():
-                    meeting_title_all = gr.Textbox(label="會議標題", placeholder="輸入會議標題", value=self.meeting_title)
+                    meeting_title_all = gr.Textbox(label="會議標題", placeholder="輸入會議標題", value=self.default_meeting_title)
                     participants_all = gr.Textbox(label="參與者 (用逗號分隔)", placeholder="例如: 張三, 李四, 王五")
                 
                 set_info_btn_all = gr.Button("設置會議訊息")
@@ -164,33 +362,29 @@ class MeetingRecorderApp:
                 # Connect the buttons to their respective functions
                 set_info_btn_all.click(
                     fn=self.set_meeting_info,
-                    inputs=[meeting_title_all, participants_all],
-                    outputs=info_output_all
+                    inputs=[meeting_title_all, participants_all, session_state],
+                    outputs=[info_output_all, session_state]
                 )
                 
-                start_btn_all.click(fn=self.start_recording, outputs=status_all)
-                
-                def stop_and_process():
-                    audio_file, message = self.stop_recording()
-                    return audio_file, message
+                start_btn_all.click(fn=self.start_recording, inputs=session_state, outputs=[status_all, session_state])
                 
-                stop_btn_all.click(fn=stop_and_process, outputs=[audio_output_all, status_all])
+                stop_btn_all.click(fn=self.stop_recording, inputs=session_state, outputs=[audio_output_all, status_all])
                 
                 process_recording_btn.click(
                     fn=self.process_recorded_audio,
-                    inputs=[audio_output_all],
-                    outputs=[transcription_all, summary_all, export_status_all]
+                    inputs=[audio_output_all, session_state],
+                    outputs=[transcription_all, summary_all, export_status_all, status_all, session_state]
                 )
                 
                 process_upload_btn.click(
                     fn=self.process_uploaded_audio,
-                    inputs=[upload_audio, meeting_title_all, participants_all],
-                    outputs=[info_output_all, transcription_all, summary_all, export_status_all]
+                    inputs=[upload_audio, meeting_title_all, participants_all, session_state],
+                    outputs=[info_output_all, transcription_all, summary_all, export_status_all, session_state]
                 )
             
             with gr.Tab("會議設置"):
                 with gr.Row():
-                    meeting_title = gr.Textbox(label="會議標題", placeholder="輸入會議標題", value=self.meeting_title)
+                    meeting_title = gr.Textbox(label="會議標題", placeholder="輸入會議標題", value=self.default_meeting_title)
                     participants = gr.Textbox(label="參與者 (用逗號分隔)", placeholder="例如: 張三, 李四, 王五")
                 
                 set_info_btn = gr.Button("設置會議訊息")
@@ -198,8 +392,8 @@ class MeetingRecorderApp:
                 
                 set_info_btn.click(
                     fn=self.set_meeting_info,
-                    inputs=[meeting_title, participants],
-                    outputs=info_output
+                    inputs=[meeting_title, participants, session_state],
+                    outputs=[info_output, session_state]
                 )
             
             with gr.Tab("錄音與轉錄"):
@@ -214,33 +408,37 @@ class MeetingRecorderApp:
                 transcribe_btn = gr.Button("轉錄音頻")
                 
                 # Connect the buttons to their respective functions
-                start_btn.click(fn=self.start_recording, outputs=status)
+                start_btn.click(fn=self.start_recording, inputs=session_state, outputs=[status, session_state])
                 
-                def stop_and_process():
-                    audio_file, message = self.stop_recording()
-                    return audio_file, message
-                
-                stop_btn.click(fn=stop_and_process, outputs=[audio_output, status])
-                transcribe_btn.click(fn=self.transcribe_audio, inputs=audio_output, outputs=transcription)
+                stop_btn.click(fn=self.stop_recording, inputs=session_state, outputs=[audio_output, status])
+                transcribe_btn.click(
+                    fn=self.transcribe_audio,
+                    inputs=[audio_output, session_state],
+                    outputs=[transcription, session_state]
+                )
             
             with gr.Tab("摘要生成"):
                 generate_btn = gr.Button("生成會議摘要")
                 summary_output = gr.Textbox(label="會議摘要", interactive=False, lines=15)
                 
-                generate_btn.click(fn=self.generate_summary, inputs=transcription, outputs=summary_output)
+                generate_btn.click(
+                    fn=self.generate_summary,
+                    inputs=[transcription, session_state],
+                    outputs=[summary_output, session_state]
+                )
             
             with gr.Tab("導出"):
                 export_btn = gr.Button("導出會議記錄")
                 export_output = gr.Textbox(label="導出狀態", interactive=False)
                 
-                export_btn.click(fn=self.export_meeting, outputs=export_output)
+                export_btn.click(fn=self.export_meeting, inputs=session_state, outputs=export_output)
             
             with gr.Tab("拖放音頻處理"):
                 gr.Markdown("### 拖放音頻文件進行快速處理")
                 gr.Markdown("上傳音頻文件，一鍵完成轉錄和摘要生成")
                 
                 with gr.Row():
-                    drop_title = gr.Textbox(label="會議標題", placeholder="輸入會議標題", value=self.meeting_title)
+                    drop_title = gr.Textbox(label="會議標題", placeholder="輸入會議標題", value=self.default_meeting_title)
                     drop_participants = gr.Textbox(label="參與者 (用逗號分隔)", placeholder="例如: 張三, 李四, 王五")
                 
                 drop_audio = gr.Audio(label="拖放音頻文件到這裡", type="filepath", interactive=True)
@@ -253,10 +451,16 @@ class MeetingRecorderApp:
                 
                 process_btn.click(
                     fn=self.process_uploaded_audio,
-                    inputs=[drop_audio, drop_title, drop_participants],
-                    outputs=[drop_info, drop_transcription, drop_summary, drop_export]
+                    inputs=[drop_audio, drop_title, drop_participants, session_state],
+                    outputs=[drop_info, drop_transcription, drop_summary, drop_export, session_state]
                 )
         
+        # Queue events so sessions wait their turn instead of piling onto the server;
+        # the transcription and summary pools bound the upstream calls themselves
+        app.queue(
+            default_concurrency_limit=GRADIO_CONFIG["concurrency_limit"],
+            max_size=GRADIO_CONFIG["max_queue_size"]
+        )
         return app
 
 def main():
@@ -4,6 +4,8 @@ YCM 智能會議記錄助手配置文件
 """
 
 import os
+import json
+import tempfile
 from dotenv import load_dotenv
 
 # 載入環境變量
@@ -18,12 +20,70 @@ TRANSCRIPTION_CONFIG = {
     "model": os.environ.get("TRANSCRIPTION_MODEL", "whisper-1"),
     # 語言: "zh" (中文), "en" (英文), "auto" (自動檢測)
     "language": os.environ.get("TRANSCRIPTION_LANGUAGE", "zh"),
+    # 轉錄引擎: "openai" (Whisper API)、"local" (本機 CPU，需要安裝 faster-whisper) 或 "auto" (API 失敗時改用本機)
+    "engine": os.environ.get("TRANSCRIPTION_ENGINE", "openai"),
+    
+    # 本機轉錄配置
+    # faster-whisper 模型: "tiny", "base", "small", "medium", "large-v3" 等
+    "local_model": os.environ.get("LOCAL_WHISPER_MODEL", "small"),
+    # 量化類型，int8 在 CPU 上最快
+    "local_compute_type": os.environ.get("LOCAL_WHISPER_COMPUTE_TYPE", "int8"),
+    # 每個轉錄進程使用的 CPU 線程數
+    "local_cpu_threads": int(os.environ.get("LOCAL_WHISPER_CPU_THREADS", "2")),
+    # 轉錄進程數，0 表示按 CPU 核心數 / 每進程線程數自動計算
+    "local_workers": int(os.environ.get("LOCAL_WHISPER_WORKERS", "0")),
+    "local_beam_size": int(os.environ.get("LOCAL_WHISPER_BEAM_SIZE", "5")),
+    # 單個文件（或分段）本地轉錄的最長秒數，包括排隊等待轉錄進程的時間
+    "local_timeout": float(os.environ.get("LOCAL_WHISPER_TIMEOUT", "1800")),
+    
+    # 長錄音分段轉錄配置
+    # 超過此秒數的 WAV 錄音按此長度分段轉錄
+    "chunk_duration": int(os.environ.get("TRANSCRIPTION_CHUNK_DURATION", "600")),
+    # 相鄰分段重疊的秒數，分段邊界上的詞句在兩個分段中都會完整出現，合併時對齊重疊的文字並去除重複，0 表示不重疊
+    "chunk_overlap": float(os.environ.get("TRANSCRIPTION_CHUNK_OVERLAP", "3")),
+    # 合併分段時，重疊部分至少有此數量的相同字符（不計標點和空白）才視為對齊成功，否則按換行拼接
+    "stitch_min_match": int(os.environ.get("TRANSCRIPTION_STITCH_MIN_MATCH", "6")),
+    # 已完成分段的轉錄結果保留的秒數，期間重試同一錄音只會轉錄缺失的分段
+    "checkpoint_ttl": float(os.environ.get("TRANSCRIPTION_CHECKPOINT_TTL", "86400")),
+}
+
+# 音頻預檢配置（只讀取文件頭和少量採樣，在調用轉錄前拒絕空白、損壞或靜音的文件）
+PREFLIGHT_CONFIG = {
+    # 短於此秒數的錄音視為空錄音
+    "min_duration": float(os.environ.get("PREFLIGHT_MIN_DURATION", "0.5")),
+    # 長於此秒數的錄音直接拒絕，0 表示不限制
+    "max_duration": float(os.environ.get("PREFLIGHT_MAX_DURATION", "14400")),
+    # 靜音檢測: 在錄音中均勻抽取的窗口數和每個窗口的秒數
+    "sample_windows": int(os.environ.get("PREFLIGHT_SAMPLE_WINDOWS", "8")),
+    "window_seconds": float(os.environ.get("PREFLIGHT_WINDOW_SECONDS", "0.5")),
+    # 所有窗口的音量 (RMS, dBFS) 都低於此值時視為靜音
+    "silence_threshold_db": float(os.environ.get("PREFLIGHT_SILENCE_THRESHOLD_DB", "-55")),
+    # 成本和時間估算: Whisper API 每分鐘價格（美元），以及轉錄耗時與錄音時長之比
+    "openai_cost_per_minute": float(os.environ.get("WHISPER_COST_PER_MINUTE", "0.006")),
+    "openai_realtime_factor": float(os.environ.get("WHISPER_REALTIME_FACTOR", "0.05")),
+    "local_realtime_factor": float(os.environ.get("LOCAL_WHISPER_REALTIME_FACTOR", "0.5")),
 }
 
 # 摘要生成配置
 SUMMARY_CONFIG = {
-    # 提供者: "openai" 或 "ollama"
+    # 提供者: "openai"、"ollama" 或 "auto"（按轉錄長度、近期延遲、排隊請求數和健康狀態為每個請求選擇）
     "provider": os.environ.get("SUMMARY_PROVIDER", "openai"),
+    # 提供者失敗時自動改用另一個提供者
+    "failover": os.environ.get("SUMMARY_FAILOVER", "true").lower() == "true",
+    # 提供者失敗後暫停使用的秒數
+    "provider_cooldown": float(os.environ.get("SUMMARY_PROVIDER_COOLDOWN", "60")),
+    # 延遲移動平均的權重，越大越快反映最近的延遲
+    "latency_ewma_alpha": float(os.environ.get("SUMMARY_LATENCY_EWMA_ALPHA", "0.3")),
+    # 尚未觀測到延遲時，每 1000 個提示詞 token 的預估秒數
+    "openai_seconds_per_ktoken": float(os.environ.get("OPENAI_SECONDS_PER_KTOKEN", "4")),
+    "ollama_seconds_per_ktoken": float(os.environ.get("OLLAMA_SECONDS_PER_KTOKEN", "10")),
+    # 提供者可並行處理的請求數，超出的請求需要排隊
+    "openai_concurrency": int(os.environ.get("OPENAI_CONCURRENCY", "64")),
+    "ollama_concurrency": int(os.environ.get("OLLAMA_NUM_PARALLEL", "1")),
+    # auto 模式下超過此長度的轉錄不交給本地模型（受上下文窗口限制）
+    "ollama_max_prompt_tokens": int(os.environ.get("OLLAMA_MAX_PROMPT_TOKENS", "8000")),
+    # 單個摘要請求的最長秒數
+    "request_timeout": float(os.environ.get("SUMMARY_REQUEST_TIMEOUT", "600")),
     
     # OpenAI 配置
     "model": os.environ.get("SUMMARY_MODEL", "gpt-4"),
@@ -37,4 +97,236 @@ SUMMARY_CONFIG = {
     "system_prompt": os.environ.get("SUMMARY_SYSTEM_PROMPT", 
         "你是一個專業的會議摘要助手，請根據會議轉錄內容生成一個結構化的會議摘要。"
         "摘要應包括：會議主題、主要討論點、決策和行動項目。請使用繁體中文。"),
+    
+    # 增量摘要配置（長會議/實時會議只發送新增的轉錄片段和上一次的摘要）
+    # 每隔多少次增量更新做一次完整的重新摘要，以限制累積偏差
+    "incremental_full_every": int(os.environ.get("SUMMARY_INCREMENTAL_FULL_EVERY", "5")),
+    # 增量摘要狀態在最後一次更新後保留的秒數
+    "incremental_state_ttl": float(os.environ.get("SUMMARY_INCREMENTAL_STATE_TTL", "86400")),
+    
+    # 結構化摘要配置
+    # 導出會議記錄時把文字摘要轉換為結構化摘要（JSON），以便按負責人、狀態和截止日期查詢行動項目
+    "structured_export": os.environ.get("SUMMARY_STRUCTURED_EXPORT", "true").lower() == "true",
+}
+
+# 共享狀態配置（多工作進程部署時，所有進程必須指向同一個數據庫文件）
+STATE_CONFIG = {
+    # SQLite 數據庫路徑: 保存任務狀態、緩存、限流計數和轉錄歷史
+    "db_path": os.environ.get("SHARED_STATE_DB",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared_state.db")),
+    # 等待其他進程釋放寫鎖的秒數
+    "busy_timeout": float(os.environ.get("SHARED_STATE_BUSY_TIMEOUT", "30")),
+}
+
+# OpenAI 客戶端配置（每個 API 密鑰一個客戶端，各自維護長連接）
+OPENAI_CLIENT_CONFIG = {
+    "base_url": os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    # 最多緩存的 API 密鑰客戶端數量，超出時淘汰最久未使用的客戶端
+    "pool_size": int(os.environ.get("OPENAI_CLIENT_POOL_SIZE", "32")),
+    # 每個客戶端保持的最大長連接數
+    "max_connections": int(os.environ.get("OPENAI_CLIENT_MAX_CONNECTIONS", "8")),
+    "connect_timeout": float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "10")),
+    "timeout": float(os.environ.get("OPENAI_TIMEOUT", "600")),
+}
+
+# 轉錄歷史配置（按會議/會話 ID 分開保存，並按時間和數量淘汰）
+HISTORY_CONFIG = {
+    # 會話最後一次寫入後保留的秒數
+    "ttl": float(os.environ.get("TRANSCRIPT_HISTORY_TTL", "86400")),
+    # 每個會話最多保留的轉錄條數
+    "max_entries_per_session": int(os.environ.get("TRANSCRIPT_HISTORY_MAX_ENTRIES", "500")),
+    # 最多保留的會話數量，超出時淘汰最久未更新的會話
+    "max_sessions": int(os.environ.get("TRANSCRIPT_HISTORY_MAX_SESSIONS", "1000")),
+    # 兩次淘汰檢查之間的最小間隔（秒）
+    "evict_interval": float(os.environ.get("TRANSCRIPT_HISTORY_EVICT_INTERVAL", "60")),
+}
+
+# 會議記錄導出配置
+EXPORT_CONFIG = {
+    # 默認導出格式: "json", "json.gz", "json.zst", "jsonl", "md"
+    "format": os.environ.get("EXPORT_FORMAT", "json"),
+    # gzip/zstd 壓縮級別
+    "compression_level": int(os.environ.get("EXPORT_COMPRESSION_LEVEL", "6")),
+    # 後台導出線程數
+    "workers": int(os.environ.get("EXPORT_WORKERS", "2")),
+    # 會議記錄查詢 API 的訪問令牌（請求頭 X-Archive-Token），為空時這些端點一律拒絕訪問
+    "api_token": os.environ.get("ARCHIVE_API_TOKEN", ""),
+}
+
+# 會議向量搜索配置（本地計算，不依賴外部服務）
+VECTOR_INDEX_CONFIG = {
+    # 哈希向量維度，越大衝突越少，但索引佔用空間越大（每段 2 字節 x 維度）
+    "dim": int(os.environ.get("VECTOR_INDEX_DIM", "2048")),
+    # 字符 n-gram 範圍
+    "ngram_range": (2, 3),
+    # 每個段落的最大字符數
+    "passage_chars": int(os.environ.get("VECTOR_INDEX_PASSAGE_CHARS", "300")),
+    # 搜索時每次從內存映射矩陣讀取的行數
+    "search_block_rows": 65536,
+}
+
+# 轉錄壓縮配置（生成摘要前在本地移除口頭禪、重複和分段重疊，縮短提示詞）
+COMPACTION_CONFIG = {
+    "enabled": os.environ.get("TRANSCRIPT_COMPACTION", "true").lower() == "true",
+    # 移除語氣詞和口頭禪
+    "remove_fillers": True,
+    # 任何位置都可以移除的語氣詞（只用作語氣詞、不會出現在詞語中的字）
+    "interjections": ["嗯", "呃", "欸", "誒", "呣"],
+    # 也是詞語一部分的語氣詞（金額、額度），只在單獨成句時移除；粵語的「唔」是否定詞（唔好、唔係），不作為語氣詞
+    "clause_interjections": ["額", "额"],
+    # 只在單獨成句（後接標點或重複出現）時移除的口頭禪，如「那個，」「就是就是」
+    "discourse_fillers": ["那個", "那个", "這個", "这个", "就是", "然後呢", "然后呢"],
+    "english_fillers": ["um", "umm", "uh", "uhm", "erm"],
+    # 合併連續重複的詞組和句子
+    "collapse_repeats": True,
+    # 可合併的重複詞組的最大字符數（連續出現三次或以上才合併，「研究研究」等疊詞保留）
+    "max_repeat_unit_chars": 8,
+    # 與上一句完全相同的句子會被移除，短於此字符數的句子（如「同意。」「好。」）一律保留
+    "min_repeat_sentence_chars": 5,
+    # 移除分段開頭與上一分段結尾重複的文字
+    "dedupe_overlaps": True,
+    "min_overlap_chars": 6,
+    "max_overlap_chars": 200,
+}
+
+# 相同請求合併配置（同時進行的相同轉錄/摘要請求只調用一次上游 API，共享結果）
+SINGLE_FLIGHT_CONFIG = {
+    # 執行請求的進程持有租約的最長秒數，超時（例如進程崩潰）後由其他進程接手
+    "lease_ttl": float(os.environ.get("SINGLE_FLIGHT_LEASE_TTL", "900")),
+    # 完成的結果繼續提供給重複請求（例如重試、重複點擊）的秒數
+    "result_ttl": float(os.environ.get("SINGLE_FLIGHT_RESULT_TTL", "60")),
+    # 等待其他進程結果時的輪詢間隔（秒）
+    "poll_interval": float(os.environ.get("SINGLE_FLIGHT_POLL_INTERVAL", "0.5")),
+}
+
+# Gradio 多用戶配置（每個瀏覽器會話有獨立的會議狀態，耗時工作在工作線程池中執行）
+GRADIO_CONFIG = {
+    # 同時處理的事件數，超出的請求在隊列中等待
+    "concurrency_limit": int(os.environ.get("GRADIO_CONCURRENCY_LIMIT", "32")),
+    # 隊列最大長度，超出時新請求會被拒絕
+    "max_queue_size": int(os.environ.get("GRADIO_MAX_QUEUE_SIZE", "200")),
+    # 同時進行的轉錄數
+    "transcription_workers": int(os.environ.get("GRADIO_TRANSCRIPTION_WORKERS", "4")),
+    # 同時進行的摘要生成數
+    "summary_workers": int(os.environ.get("GRADIO_SUMMARY_WORKERS", "8")),
+    # 瀏覽器會話關閉後保留會話狀態的秒數
+    "session_ttl": int(os.environ.get("GRADIO_SESSION_TTL", "3600")),
+    # 流式顯示摘要時兩次界面更新之間的最小間隔（秒）
+    "stream_interval": float(os.environ.get("GRADIO_STREAM_INTERVAL", "0.2")),
+}
+
+# 臨時空間配置（上傳文件、音頻分段和錄音都保存在這個目錄下，可以指向 tmpfs）
+SCRATCH_CONFIG = {
+    "root": os.environ.get("SCRATCH_ROOT", os.path.join(tempfile.gettempdir(), "ai_meeting_scratch")),
+    # 臨時空間總配額（MB），超出時新請求等待空間釋放，0 表示不限制
+    "quota_mb": int(os.environ.get("SCRATCH_QUOTA_MB", "2048")),
+    # 等待空間釋放的最長秒數，超時後請求失敗
+    "wait_timeout": float(os.environ.get("SCRATCH_WAIT_TIMEOUT", "30")),
+    # 超過此秒數的臨時目錄會被清理，即使所屬進程仍在運行
+    "max_age": float(os.environ.get("SCRATCH_MAX_AGE", "21600")),
+    # 清理過期和無主臨時目錄的間隔（秒），0 表示不自動清理
+    "janitor_interval": float(os.environ.get("SCRATCH_JANITOR_INTERVAL", "300")),
+}
+
+# API 密鑰配額配置（每個 API 密鑰一組令牌桶，用量保存在共享狀態數據庫中，重啟後不會重置）
+QUOTA_CONFIG = {
+    "enabled": os.environ.get("QUOTA_ENABLED", "true").lower() == "true",
+    # 每個 API 密鑰每分鐘的請求數
+    "requests_per_minute": float(os.environ.get("QUOTA_REQUESTS_PER_MINUTE", "30")),
+    # 每個 API 密鑰每小時可轉錄的音頻秒數
+    "audio_seconds_per_hour": float(os.environ.get("QUOTA_AUDIO_SECONDS_PER_HOUR", "14400")),
+    # 每個 API 密鑰每小時的摘要 token 數
+    "summary_tokens_per_hour": float(os.environ.get("QUOTA_SUMMARY_TOKENS_PER_HOUR", "500000")),
+    # 從錄音生成摘要時，按每秒錄音的轉錄 token 數預估摘要用量
+    "tokens_per_audio_second": float(os.environ.get("QUOTA_TOKENS_PER_AUDIO_SECOND", "4")),
+    # 每次摘要預留的輸出 token 數
+    "summary_output_tokens": int(os.environ.get("QUOTA_SUMMARY_OUTPUT_TOKENS", "1500")),
+}
+
+# 入口准入控制配置（按預估工作量接收請求，已承諾的工作無法在 SLO 內完成時拒絕新請求）
+ADMISSION_CONFIG = {
+    "enabled": os.environ.get("ADMISSION_ENABLED", "true").lower() == "true",
+    # 接受的請求應在此秒數內完成
+    "slo_seconds": float(os.environ.get("ADMISSION_SLO_SECONDS", "120")),
+    # 可以並行處理的工作量（同時進行的轉錄/摘要請求數）
+    "capacity": float(os.environ.get("ADMISSION_CAPACITY", "8")),
+    # 超出容量時請求最多等待的秒數，之後返回 503
+    "defer_timeout": float(os.environ.get("ADMISSION_DEFER_TIMEOUT", "5")),
+    "poll_interval": float(os.environ.get("ADMISSION_POLL_INTERVAL", "0.5")),
+    # 每個請求的最小工作量（秒）
+    "base_cost": float(os.environ.get("ADMISSION_BASE_COST", "1")),
+    # 只知道上傳大小時，按每秒錄音的字節數估算時長（128 kbps）
+    "upload_bytes_per_audio_second": float(os.environ.get("ADMISSION_UPLOAD_BYTES_PER_SECOND", "16000")),
+    # 工作記錄的最長保留秒數，防止崩潰的工作進程永久佔用容量
+    "work_ttl": float(os.environ.get("ADMISSION_WORK_TTL", "1800")),
+}
+
+# 任務調度配置（轉錄和摘要任務在調度器中排隊，按策略選擇下一個執行的任務）
+SCHEDULER_CONFIG = {
+    # 調度策略: "sjf"（短任務優先，等待越久優先級越高）、"wfq"（按 API 密鑰加權公平排隊）或 "fifo"
+    "policy": os.environ.get("SCHEDULER_POLICY", "sjf"),
+    # 每個工作進程同時執行的轉錄和摘要任務數
+    "transcription_concurrency": int(os.environ.get("SCHEDULER_TRANSCRIPTION_CONCURRENCY", "4")),
+    "summary_concurrency": int(os.environ.get("SCHEDULER_SUMMARY_CONCURRENCY", "8")),
+    # 短任務優先的老化時間: 任務每等待此秒數，其有效成本按原成本的倍數下降（等待 N 倍此時間後為原成本的 1/(N+1)），避免長任務一直被插隊
+    "aging_seconds": float(os.environ.get("SCHEDULER_AGING_SECONDS", "30")),
+    # 公平排隊的 API 密鑰權重（JSON，鍵為密鑰的哈希標識），未列出的密鑰權重為 1
+    "weights": json.loads(os.environ.get("SCHEDULER_WEIGHTS", "{}")),
+}
+
+# 音頻處理進程池配置（分段、哈希和預檢等 CPU 密集的音頻處理在獨立進程中執行，只傳遞文件路徑）
+AUDIO_POOL_CONFIG = {
+    "enabled": os.environ.get("AUDIO_POOL_ENABLED", "true").lower() == "true",
+    # 進程數，0 表示使用 CPU 核心數
+    "workers": int(os.environ.get("AUDIO_POOL_WORKERS", "0")),
+}
+
+# 就緒檢查配置（/ready 在預熱完成、依賴可用後才返回 200，Cloud Run 的啟動探針應指向 /ready）
+READINESS_CONFIG = {
+    # 服務啟動時在後台預熱連接池和進程池、探測模型提供者並預加載 Ollama 模型
+    "warm_on_startup": os.environ.get("READINESS_WARM_ON_STARTUP", "true").lower() == "true",
+    # 必須通過的檢查，以逗號分隔；留空表示所有已配置的檢查
+    "required": [name.strip() for name in os.environ.get("READINESS_REQUIRED", "").split(",") if name.strip()],
+    # 單次檢查的最長秒數（加載本地模型可能需要較長時間）
+    "timeout": float(os.environ.get("READINESS_TIMEOUT", "120")),
+    # 未就緒時重新檢查的間隔秒數
+    "retry_interval": float(os.environ.get("READINESS_RETRY_INTERVAL", "10")),
+    # 就緒後重新探測的間隔秒數（同時保持連接和模型處於預熱狀態）
+    "recheck_interval": float(os.environ.get("READINESS_RECHECK_INTERVAL", "300")),
+    # Ollama 模型預加載後在內存中保留的時間
+    "ollama_keep_alive": os.environ.get("READINESS_OLLAMA_KEEP_ALIVE", "30m"),
+}
+
+# 請求性能分析配置（默認關閉，關閉時幾乎沒有開銷）
+PROFILING_CONFIG = {
+    # 管理員令牌：請求頭 X-Profile 等於此值時分析該請求，留空表示不接受請求頭觸發
+    "admin_token": os.environ.get("PROFILING_ADMIN_TOKEN", ""),
+    # 隨機分析的請求比例（0-1），0 表示不隨機分析
+    "sample_rate": float(os.environ.get("PROFILING_SAMPLE_RATE", "0")),
+    # 分析方式: "sample"（定時採樣所有線程的調用棧，輸出火焰圖格式）或 "cprofile"（確定性分析處理請求的線程，輸出 pstats 格式）
+    # cProfile 只能分析啟用它的線程，交給線程池、調度線程和音頻進程池的工作不會出現在結果中，分析 API 請求時應使用 "sample"
+    "mode": os.environ.get("PROFILING_MODE", "sample"),
+    # 採樣間隔（秒）
+    "interval": float(os.environ.get("PROFILING_INTERVAL", "0.005")),
+    # 分析結果目錄
+    "dir": os.environ.get("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "ai_meeting_profiles")),
+    # 最多保留的分析文件數，超出時刪除最舊的
+    "max_files": int(os.environ.get("PROFILING_MAX_FILES", "200")),
+    # 同時分析的請求數上限，超出的請求不分析
+    "max_concurrent": int(os.environ.get("PROFILING_MAX_CONCURRENT", "1")),
+}
+
+# 內存用量統計配置（按請求和處理階段記錄 RSS 變化和峰值，用於確定容器的內存限制）
+MEMORY_CONFIG = {
+    "enabled": os.environ.get("MEMORY_ACCOUNTING", "true").lower() == "true",
+    # 使用 tracemalloc 記錄 Python 內存分配（可列出分配最多的代碼位置，但會使處理變慢，默認關閉）
+    "tracemalloc": os.environ.get("MEMORY_TRACEMALLOC", "false").lower() == "true",
+    # tracemalloc 為每次分配記錄的調用棧深度
+    "tracemalloc_frames": int(os.environ.get("MEMORY_TRACEMALLOC_FRAMES", "1")),
+    # 峰值 RSS 增長超過此值（MB）的請求才寫入日誌，0 表示全部寫入
+    "log_threshold_mb": float(os.environ.get("MEMORY_LOG_THRESHOLD_MB", "0")),
+    # /debug/memory 保留的最近請求數
+    "history": int(os.environ.get("MEMORY_HISTORY", "50")),
+    # 訪問 /debug/memory 需要在 X-Admin-Token 請求頭中提供的令牌，留空表示不開放該端點
+    "admin_token": os.environ.get("MEMORY_DEBUG_TOKEN", os.environ.get("PROFILING_ADMIN_TOKEN", "")),
 }
@@ -3,12 +3,17 @@ Audio recorder module for the meeting recorder application.
 """
 
 import os
-import tempfile
+import sys
 import pyaudio
 import wave
 import threading
 from typing import Optional, List, Dict, Any, Tuple
 
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.scratch import get_scratch_space
+from utils.memory import memory_stage
+
 # Constants for audio recording
 SAMPLE_RATE = 16000
 CHANNELS = 1
@@ -25,6 +30,8 @@ class AudioRecorder:
         self.record_thread = None
         self.p = pyaudio.PyAudio()
         self.stream = None
+        # Scratch directory holding this recorder's recordings, created on first use
+        self.scratch_dir = None
     
     def start_recording(self) -> str:
         """Start recording audio."""
@@ -68,15 +75,19 @@ class AudioRecorder:
         if self.record_thread:
             self.record_thread.join(timeout=2.0)
         
-        # Save the recorded audio to a temporary file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_filename = temp_file.name
-            
+        # Save the recorded audio to the recorder's scratch directory; it is removed by cleanup()
+        if self.scratch_dir is None or not os.path.isdir(self.scratch_dir):
+            self.scratch_dir = get_scratch_space().mkdtemp("recording")
+        temp_filename = os.path.join(self.scratch_dir, f"recording_{len(os.listdir(self.scratch_dir)) + 1}.wav")
+        
+        # Write the buffers one by one instead of joining them into a second copy of the recording
+        with memory_stage("save_recording"):
             wf = wave.open(temp_filename, "wb")
             wf.setnchannels(CHANNELS)
             wf.setsampwidth(self.p.get_sample_size(FORMAT))
             wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(b"".join(self.audio_data))
+            for data in self.audio_data:
+                wf.writeframesraw(data)
             wf.close()
         
         return temp_filename, "錄音已停止。正在處理音頻..."
@@ -85,3 +96,6 @@ class AudioRecorder:
         """Clean up resources when the recorder is no longer needed."""
         if self.p:
             self.p.terminate()
+        if self.scratch_dir is not None:
+            get_scratch_space().release(self.scratch_dir)
+            self.scratch_dir = None
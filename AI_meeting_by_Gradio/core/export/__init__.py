@@ -1 +1,3 @@
 from .exporter import Exporter
+from .archive import MeetingArchive
+from .vector_index import MeetingVectorIndex
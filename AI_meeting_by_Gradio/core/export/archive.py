@@ -0,0 +1,357 @@
+"""
+Searchable meeting archive for the meeting recorder application.
+
+Every exported meeting is also written into a SQLite database with an FTS5
+index over title, participants, transcript and summary, so past meetings can
+be listed, searched and fetched without scanning the export files.
+
+FTS5's default tokenizer treats a run of CJK characters as one token, which
+makes Chinese text unsearchable by word. Indexed text is therefore segmented
+into single CJK characters, and queries are turned into phrase queries over
+the same segmentation, so any Chinese substring can be found.
+
+Meetings with a structured summary also get their action items and decisions
+written into indexed tables, so "open items owned by X due this week" is a
+local query instead of a model call over every summary.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_CHAR = re.compile(f"([{_CJK}])")
+_CJK_SPACING = re.compile(f"\\s*([{_CJK}])\\s*")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    participants TEXT NOT NULL,
+    date TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    transcriptions TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    export_path TEXT
+);
+CREATE INDEX IF NOT EXISTS meetings_created_at ON meetings (created_at DESC);
+CREATE INDEX IF NOT EXISTS meetings_export_path ON meetings (export_path);
+CREATE VIRTUAL TABLE IF NOT EXISTS meetings_fts USING fts5(
+    title, participants, transcript, summary,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS action_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    meeting_id INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    owner TEXT,
+    owner_norm TEXT,
+    due_date TEXT,
+    status TEXT NOT NULL,
+    due_text TEXT
+);
+CREATE INDEX IF NOT EXISTS action_items_meeting ON action_items (meeting_id);
+CREATE INDEX IF NOT EXISTS action_items_owner ON action_items (owner_norm, status, due_date);
+CREATE INDEX IF NOT EXISTS action_items_status ON action_items (status, due_date);
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    meeting_id INTEGER NOT NULL,
+    decision TEXT NOT NULL,
+    context TEXT
+);
+CREATE INDEX IF NOT EXISTS decisions_meeting ON decisions (meeting_id);
+"""
+
+
+def segment_text(text: str) -> str:
+    """Split CJK runs into single-character tokens for indexing."""
+    return _CJK_CHAR.sub(r" \1 ", text or "")
+
+
+def desegment_text(text: str) -> str:
+    """Undo `segment_text` spacing for display."""
+    return _CJK_SPACING.sub(r"\1", text).replace("][", "").strip()
+
+
+def _normalize_owner(owner: Optional[str]) -> Optional[str]:
+    """Lowercase an owner name and drop its whitespace, for matching."""
+    return re.sub(r"\s+", "", owner).lower() if owner else None
+
+
+def _split_due(item: Dict[str, Any]) -> tuple:
+    """(due_date, due_text) of an action item; only YYYY-MM-DD dates go in due_date, which is compared as text."""
+    due_date, due_text = item.get("due_date"), item.get("due_text")
+    if due_date and not _ISO_DATE.match(due_date):
+        return None, due_text or due_date
+    return due_date or None, due_text
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free-text user input into an FTS5 MATCH expression.
+
+    Every whitespace-separated term must match; each term is quoted as a
+    phrase over its segmented tokens, so FTS syntax in the input is inert.
+    """
+    phrases = []
+    for term in query.split():
+        tokens = segment_text(term).split()
+        if tokens:
+            phrases.append('"' + " ".join(token.replace('"', '""') for token in tokens) + '"')
+    return " AND ".join(phrases)
+
+
+class MeetingArchive:
+    """SQLite/FTS5 store of exported meetings."""
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the archive.
+
+        Args:
+            db_path: Path of the SQLite database
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # Archives created before structured summaries
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(meetings)")}
+        if "structured_summary" not in columns:
+            try:
+                conn.execute("ALTER TABLE meetings ADD COLUMN structured_summary TEXT")
+            except sqlite3.OperationalError:
+                # Another process added it first
+                pass
+        # Archives that stored unparsed due dates (e.g. 下週五) in due_date, which broke the date range queries
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(action_items)")}
+        if "due_text" not in columns:
+            try:
+                conn.execute("ALTER TABLE action_items ADD COLUMN due_text TEXT")
+            except sqlite3.OperationalError:
+                pass
+            conn.execute(
+                "UPDATE action_items SET due_text = due_date, due_date = NULL "
+                "WHERE due_date IS NOT NULL AND due_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add_meeting(self, meeting_title: str, participants: List[str], date: str, transcriptions: List[Dict[str, str]],
+                    summary: str, export_path: Optional[str] = None, created_at: Optional[float] = None,
+                    structured_summary: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Add a meeting to the archive, indexing the action items and decisions of its structured summary.
+
+        Returns:
+            int: ID of the new meeting
+        """
+        transcript = "\n".join(t.get("text", "") for t in transcriptions)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO meetings (title, participants, date, created_at, transcriptions, summary, export_path, "
+                "structured_summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (meeting_title, json.dumps(participants, ensure_ascii=False), date, created_at or time.time(),
+                 json.dumps(transcriptions, ensure_ascii=False), summary or "", export_path,
+                 json.dumps(structured_summary, ensure_ascii=False) if structured_summary else None)
+            )
+            meeting_id = cursor.lastrowid
+            conn.execute(
+                "INSERT INTO meetings_fts (rowid, title, participants, transcript, summary) VALUES (?, ?, ?, ?, ?)",
+                (meeting_id, segment_text(meeting_title), segment_text(" ".join(participants)),
+                 segment_text(transcript), segment_text(summary))
+            )
+            if structured_summary:
+                conn.executemany(
+                    "INSERT INTO action_items (meeting_id, task, owner, owner_norm, due_date, due_text, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(meeting_id, item["task"], item.get("owner"), _normalize_owner(item.get("owner")),
+                      *_split_due(item), item.get("status") or "open")
+                     for item in structured_summary.get("action_items", [])]
+                )
+                conn.executemany(
+                    "INSERT INTO decisions (meeting_id, decision, context) VALUES (?, ?, ?)",
+                    [(meeting_id, item["decision"], item.get("context")) for item in structured_summary.get("decisions", [])]
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return meeting_id
+
+    def has_export(self, export_path: str) -> bool:
+        """Check whether an export file is already archived."""
+        row = self._conn().execute("SELECT 1 FROM meetings WHERE export_path = ?", (export_path,)).fetchone()
+        return row is not None
+
+    def meeting_ids(self) -> List[int]:
+        """List the IDs of all archived meetings."""
+        return [row[0] for row in self._conn().execute("SELECT id FROM meetings ORDER BY id")]
+
+    def get_meeting(self, meeting_id: int) -> Optional[Dict[str, Any]]:
+        """Get a full meeting record, in the same layout as the JSON export, or None."""
+        row = self._conn().execute("SELECT * FROM meetings WHERE id = ?", (meeting_id,)).fetchone()
+        if row is None:
+            return None
+        record = self._row_to_item(row)
+        record["transcriptions"] = json.loads(row["transcriptions"])
+        record["summary"] = row["summary"]
+        record["structured_summary"] = json.loads(row["structured_summary"]) if row["structured_summary"] else None
+        return record
+
+    def list_meetings(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """List meetings, newest first."""
+        page, page_size = max(page, 1), max(min(page_size, 100), 1)
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM meetings").fetchone()[0]
+        rows = conn.execute(
+            "SELECT id, title, participants, date, created_at, export_path FROM meetings "
+            "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (page_size, (page - 1) * page_size)
+        ).fetchall()
+        return {"items": [self._row_to_item(row) for row in rows], "total": total, "page": page, "page_size": page_size}
+
+    def search_meetings(self, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Full-text search over title, participants, transcript and summary, best matches first."""
+        page, page_size = max(page, 1), max(min(page_size, 100), 1)
+        match = build_match_query(query)
+        if not match:
+            return {"items": [], "total": 0, "page": page, "page_size": page_size}
+
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM meetings_fts WHERE meetings_fts MATCH ?", (match,)).fetchone()[0]
+        rows = conn.execute(
+            "SELECT m.id, m.title, m.participants, m.date, m.created_at, m.export_path, "
+            "snippet(meetings_fts, -1, '[', ']', '…', 24) AS snippet "
+            "FROM meetings_fts JOIN meetings m ON m.id = meetings_fts.rowid "
+            "WHERE meetings_fts MATCH ? ORDER BY bm25(meetings_fts, 10.0, 5.0, 1.0, 2.0) LIMIT ? OFFSET ?",
+            (match, page_size, (page - 1) * page_size)
+        ).fetchall()
+        items = []
+        for row in rows:
+            item = self._row_to_item(row)
+            item["snippet"] = desegment_text(row["snippet"])
+            items.append(item)
+        return {"items": items, "total": total, "page": page, "page_size": page_size}
+
+    def query_action_items(self, owner: Optional[str] = None, status: Optional[str] = None,
+                           due_before: Optional[str] = None, due_after: Optional[str] = None,
+                           meeting_id: Optional[int] = None, page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """
+        Query action items of structured summaries, earliest due date first (items without one last).
+
+        Items whose due date is not a calendar date (due_text only) never match a due date range.
+
+        Args:
+            owner: Case-insensitive substring of the owner name
+            status: "open" or "done"
+            due_before: Latest due date, inclusive (YYYY-MM-DD)
+            due_after: Earliest due date, inclusive (YYYY-MM-DD)
+            meeting_id: Only items of this meeting
+        """
+        page, page_size = max(page, 1), max(min(page_size, 200), 1)
+        conditions, params = [], []
+        if owner:
+            conditions.append("instr(a.owner_norm, ?) > 0")
+            params.append(_normalize_owner(owner))
+        if status:
+            conditions.append("a.status = ?")
+            params.append(status)
+        if due_before:
+            conditions.append("a.due_date <= ?")
+            params.append(due_before)
+        if due_after:
+            conditions.append("a.due_date >= ?")
+            params.append(due_after)
+        if meeting_id is not None:
+            conditions.append("a.meeting_id = ?")
+            params.append(meeting_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM action_items a {where}", params).fetchone()[0]
+        rows = conn.execute(
+            "SELECT a.meeting_id, a.task, a.owner, a.due_date, a.due_text, a.status, m.title, m.date FROM action_items a "
+            f"JOIN meetings m ON m.id = a.meeting_id {where} "
+            "ORDER BY a.due_date IS NULL, a.due_date, m.created_at DESC, a.id LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        items = [
+            {"meeting_id": row["meeting_id"], "meeting_title": row["title"], "meeting_date": row["date"], "task": row["task"],
+             "owner": row["owner"], "due_date": row["due_date"], "due_text": row["due_text"], "status": row["status"]}
+            for row in rows
+        ]
+        return {"items": items, "total": total, "page": page, "page_size": page_size}
+
+    def query_decisions(self, query: Optional[str] = None, meeting_id: Optional[int] = None,
+                        page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """Query decisions of structured summaries, newest meeting first, optionally by substring or meeting."""
+        page, page_size = max(page, 1), max(min(page_size, 200), 1)
+        conditions, params = [], []
+        if query:
+            conditions.append("(instr(lower(d.decision), ?) > 0 OR instr(lower(coalesce(d.context, '')), ?) > 0)")
+            params += [query.lower(), query.lower()]
+        if meeting_id is not None:
+            conditions.append("d.meeting_id = ?")
+            params.append(meeting_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM decisions d {where}", params).fetchone()[0]
+        rows = conn.execute(
+            "SELECT d.meeting_id, d.decision, d.context, m.title, m.date FROM decisions d "
+            f"JOIN meetings m ON m.id = d.meeting_id {where} "
+            "ORDER BY m.created_at DESC, d.id LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        items = [
+            {"meeting_id": row["meeting_id"], "meeting_title": row["title"], "meeting_date": row["date"],
+             "decision": row["decision"], "context": row["context"]}
+            for row in rows
+        ]
+        return {"items": items, "total": total, "page": page, "page_size": page_size}
+
+    def delete_meeting(self, meeting_id: int) -> bool:
+        """Delete a meeting from the archive. Returns True if it existed."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM meetings_fts WHERE rowid = ?", (meeting_id,))
+            conn.execute("DELETE FROM action_items WHERE meeting_id = ?", (meeting_id,))
+            conn.execute("DELETE FROM decisions WHERE meeting_id = ?", (meeting_id,))
+            deleted = conn.execute("DELETE FROM meetings WHERE id = ?", (meeting_id,)).rowcount
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return deleted == 1
+
+    @staticmethod
+    def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a row to a meeting list item."""
+        return {
+            "id": row["id"],
+            "meeting_title": row["title"],
+            "participants": json.loads(row["participants"]),
+            "date": row["date"],
+            "created_at": row["created_at"],
+            "export_path": row["export_path"],
+        }
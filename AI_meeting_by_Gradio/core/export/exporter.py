@@ -3,14 +3,27 @@ Export module for the meeting recorder application.
 """
 
 import os
-import json
+import re
+import sys
+import glob
+import uuid
 import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, Dict, Any, List
 
+from .archive import MeetingArchive
+from .vector_index import MeetingVectorIndex
+from .writers import EXPORT_FORMATS, write_export, read_export, format_for_path
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import EXPORT_CONFIG
+from utils.memory import memory_stage
+
 class Exporter:
     """Class to handle meeting record export functionality."""
     
-    def __init__(self, exports_dir: str = None):
+    def __init__(self, exports_dir: str = None, export_format: str = None):
         """Initialize the exporter."""
         if exports_dir is None:
             # Default exports directory is 'exports' in the same directory as this file
@@ -18,44 +31,198 @@ class Exporter:
         else:
             self.exports_dir = exports_dir
         
+        self.export_format = export_format or EXPORT_CONFIG["format"]
+        if self.export_format not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的導出格式: {self.export_format}")
+        
         # Create the exports directory if it doesn't exist
         os.makedirs(self.exports_dir, exist_ok=True)
+        self._open_indexes()
+        
+        # Exports are written on this pool so callers can keep them off the request thread
+        self._executor = ThreadPoolExecutor(max_workers=EXPORT_CONFIG["workers"], thread_name_prefix="exporter")
     
-    def export_meeting(self, meeting_title: str, participants: List[str], transcriptions: List[Dict[str, str]], summary: str) -> str:
+    def export_meeting(self, meeting_title: str, participants: List[str], transcriptions: List[Dict[str, str]], summary: str,
+                       export_format: str = None, structured_summary: Optional[Dict[str, Any]] = None) -> str:
         """
-        Export meeting record to a JSON file.
+        Export meeting record to a file and add it to the searchable archive.
+        
+        The file is streamed segment by segment to a temporary file and renamed
+        into place when complete.
         
         Args:
             meeting_title: Title of the meeting
             participants: List of participant names
             transcriptions: List of transcription records
             summary: Meeting summary
-            
+            export_format: One of "json", "json.gz", "json.zst", "jsonl", "md" (default from EXPORT_CONFIG)
+            structured_summary: Validated structured summary, stored in the JSON formats and indexed in the archive
+        
         Returns:
             str: Status message
         """
         if not transcriptions:
             return "沒有會議記錄可以導出。"
         
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{meeting_title.replace(' ', '_')}_{timestamp}.json"
+        export_format = export_format or self.export_format
+        if export_format not in EXPORT_FORMATS:
+            return f"導出失敗: 不支持的導出格式 {export_format}"
+        
+        now = datetime.datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        # Workers can export the same title in the same second; the random suffix keeps the rename from replacing another export
+        filename = f"{self._safe_filename(meeting_title)}_{timestamp}_{uuid.uuid4().hex[:8]}{EXPORT_FORMATS[export_format][0]}"
         filepath = os.path.join(self.exports_dir, filename)
         
-        data = {
+        header = {
             "meeting_title": meeting_title,
             "participants": participants,
-            "date": datetime.datetime.now().strftime("%Y-%m-%d"),
-            "transcriptions": transcriptions,
-            "summary": summary
+            "date": now.strftime("%Y-%m-%d"),
         }
+        if structured_summary:
+            header["structured_summary"] = structured_summary
         
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            return f"會議記錄已導出至 {filepath}"
+            with memory_stage("export"):
+                write_export(filepath, export_format, header, transcriptions, summary, EXPORT_CONFIG["compression_level"])
         except Exception as e:
             return f"導出失敗: {str(e)}"
+        
+        # The export file is the record of truth; an indexing failure must not fail the export
+        self._index_meeting(meeting_title, participants, header["date"], transcriptions, summary, filepath, now.timestamp(),
+                            structured_summary)
+        
+        return f"會議記錄已導出至 {filepath}"
+    
+    def export_meeting_async(self, meeting_title: str, participants: List[str], transcriptions: List[Dict[str, str]], summary: str,
+                             export_format: str = None, structured_summary: Optional[Dict[str, Any]] = None) -> Future:
+        """Run `export_meeting` on the exporter's background pool and return a Future of its status message."""
+        return self._executor.submit(self.export_meeting, meeting_title, participants, list(transcriptions), summary, export_format,
+                                     structured_summary)
+    
+    def get_export_file(self, meeting_id: int, export_format: str = None) -> Optional[str]:
+        """
+        Get the export file of an archived meeting in the given format, writing it from the archive if needed.
+        
+        Args:
+            meeting_id: ID of the archived meeting
+            export_format: Requested format (default: the format the meeting was exported in)
+        
+        Returns:
+            Optional[str]: Path to the file, or None if the meeting does not exist
+        """
+        meeting = self.archive.get_meeting(meeting_id)
+        if meeting is None:
+            return None
+        
+        export_path = meeting["export_path"]
+        if export_path and os.path.exists(export_path):
+            if export_format is None or format_for_path(export_path) == export_format:
+                return export_path
+            name = os.path.basename(export_path)[:-len(EXPORT_FORMATS[format_for_path(export_path)][0])]
+        else:
+            name = f"{self._safe_filename(meeting['meeting_title'])}_{meeting_id}"
+        
+        export_format = export_format or self.export_format
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的導出格式: {export_format}")
+        # Files written from the archive go to a cache subdirectory, so `import_exports` never takes them for new meetings
+        os.makedirs(self.derived_dir, exist_ok=True)
+        filepath = os.path.join(self.derived_dir, name + EXPORT_FORMATS[export_format][0])
+        if not os.path.exists(filepath):
+            header = {
+                "meeting_title": meeting["meeting_title"],
+                "participants": meeting["participants"],
+                "date": meeting["date"],
+            }
+            if meeting["structured_summary"]:
+                header["structured_summary"] = meeting["structured_summary"]
+            write_export(filepath, export_format, header, meeting["transcriptions"], meeting["summary"],
+                         EXPORT_CONFIG["compression_level"])
+        return filepath
+    
+    def get_export_file_async(self, meeting_id: int, export_format: str = None) -> Future:
+        """Run `get_export_file` on the exporter's background pool."""
+        return self._executor.submit(self.get_export_file, meeting_id, export_format)
+    
+    def import_exports(self) -> int:
+        """
+        Add export files that are not in the archive yet, e.g. files written before the archive existed.
+        
+        Only the exports directory itself is scanned; files in `derived_dir` are copies of archived meetings.
+        
+        Returns:
+            int: Number of meetings imported
+        """
+        imported = 0
+        patterns = [f"*{EXPORT_FORMATS[f][0]}" for f in ("json", "json.gz", "json.zst", "jsonl")]
+        filepaths = sorted(set(p for pattern in patterns for p in glob.glob(os.path.join(self.exports_dir, pattern))))
+        for filepath in filepaths:
+            if self.archive.has_export(filepath):
+                continue
+            try:
+                data = read_export(filepath)
+            except Exception as e:
+                print(f"Error importing export {filepath}: {str(e)}")
+                continue
+            self._index_meeting(
+                data.get("meeting_title", ""), data.get("participants", []), data.get("date", ""),
+                data.get("transcriptions", []), data.get("summary", ""), filepath, os.path.getmtime(filepath),
+                data.get("structured_summary")
+            )
+            imported += 1
+        
+        # Meetings archived before the vector index existed
+        for meeting_id in self.archive.meeting_ids():
+            if not self.vector_index.has_meeting(meeting_id):
+                meeting = self.archive.get_meeting(meeting_id)
+                self.vector_index.add_meeting(
+                    meeting_id, meeting["meeting_title"],
+                    "\n".join(t.get("text", "") for t in meeting["transcriptions"]), meeting["summary"]
+                )
+        return imported
+    
+    def import_exports_async(self) -> Future:
+        """Run `import_exports` on the exporter's background pool and return a Future of the imported count."""
+        return self._executor.submit(self.import_exports)
+    
+    def list_meetings(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """List archived meetings, newest first."""
+        return self.archive.list_meetings(page, page_size)
+    
+    def search_meetings(self, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Search archived meetings by title, participants, transcript and summary."""
+        return self.archive.search_meetings(query, page, page_size)
+    
+    def get_meeting(self, meeting_id: int) -> Optional[Dict[str, Any]]:
+        """Get an archived meeting record, or None if it does not exist."""
+        return self.archive.get_meeting(meeting_id)
+    
+    def query_action_items(self, owner: str = None, status: str = None, due_before: str = None, due_after: str = None,
+                           meeting_id: int = None, page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """Query the action items of structured summaries by owner, status, due date range or meeting."""
+        return self.archive.query_action_items(owner, status, due_before, due_after, meeting_id, page, page_size)
+    
+    def query_decisions(self, query: str = None, meeting_id: int = None, page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """Query the decisions of structured summaries by substring or meeting."""
+        return self.archive.query_decisions(query, meeting_id, page, page_size)
+    
+    def semantic_search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the meetings most similar to a free-text query using the local vector index.
+        
+        Returns:
+            List of meeting list items with "score", "field" and "snippet", best first
+        """
+        results = []
+        for hit in self.vector_index.search(query, k):
+            meeting = self.archive.get_meeting(hit["meeting_id"])
+            if meeting is None:
+                continue
+            del meeting["transcriptions"], meeting["summary"], meeting["structured_summary"]
+            meeting.update(score=hit["score"], field=hit["field"], snippet=hit["snippet"])
+            results.append(meeting)
+        return results
     
     def get_exports_dir(self) -> str:
         """Get the exports directory path."""
@@ -65,3 +232,35 @@ class Exporter:
         """Set the exports directory path."""
         self.exports_dir = exports_dir
         os.makedirs(self.exports_dir, exist_ok=True)
+        self._open_indexes()
+    
+    @property
+    def derived_dir(self) -> str:
+        """Directory for export files written from the archive in another format."""
+        return os.path.join(self.exports_dir, "formats")
+    
+    def _open_indexes(self) -> None:
+        """Open the archive and vector index of the exports directory."""
+        db_path = os.path.join(self.exports_dir, "meetings.db")
+        self.archive = MeetingArchive(db_path)
+        self.vector_index = MeetingVectorIndex(os.path.join(self.exports_dir, "vector_index"), db_path)
+    
+    def _index_meeting(self, meeting_title: str, participants: List[str], date: str, transcriptions: List[Dict[str, str]],
+                       summary: str, export_path: str, created_at: float,
+                       structured_summary: Optional[Dict[str, Any]] = None) -> None:
+        """Add an exported meeting to the archive and the vector index, logging failures."""
+        try:
+            meeting_id = self.archive.add_meeting(
+                meeting_title, participants, date, transcriptions, summary,
+                export_path=export_path, created_at=created_at, structured_summary=structured_summary
+            )
+            self.vector_index.add_meeting(
+                meeting_id, meeting_title, "\n".join(t.get("text", "") for t in transcriptions), summary
+            )
+        except Exception as e:
+            print(f"Error indexing meeting: {str(e)}")
+    
+    @staticmethod
+    def _safe_filename(meeting_title: str) -> str:
+        """Turn a meeting title into a file name component."""
+        return re.sub(r'[\s\\/:*?"<>|]+', "_", meeting_title).strip("_.") or "meeting"
@@ -0,0 +1,259 @@
+"""
+Local vector search over exported meetings.
+
+Meetings are split into passages, and every passage is embedded as a hashed
+character n-gram vector (log term frequency, L2-normalised) computed with
+NumPy. Vectors are appended to a float16 matrix on disk that is searched
+through a memory map, and passage metadata lives next to the meeting archive
+in SQLite. Queries are weighted by inverse document frequency, so rare
+n-grams count more than common ones. No external service is involved.
+"""
+
+import os
+import re
+import zlib
+import fcntl
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 添加項目根目錄到 Python 路徑
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import VECTOR_INDEX_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vector_passages (
+    row INTEGER PRIMARY KEY,
+    meeting_id INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vector_passages_meeting ON vector_passages (meeting_id);
+"""
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;\n])|(?<=\.)\s")
+
+
+def split_passages(text: str, max_chars: int) -> List[str]:
+    """Split text into passages of at most about `max_chars` characters, on sentence boundaries where possible."""
+    passages, current = [], ""
+    for sentence in _SENTENCE_END.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+class HashingVectorizer:
+    """Character n-gram vectorizer using the hashing trick."""
+
+    def __init__(self, dim: int, ngram_range: Tuple[int, int]):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _ngrams(self, text: str) -> Iterator[str]:
+        """Yield the character n-grams of every word of the normalised text."""
+        low, high = self.ngram_range
+        for word in _NON_WORD.sub(" ", text.lower()).split():
+            if len(word) < low:
+                yield word
+                continue
+            for n in range(low, high + 1):
+                for i in range(len(word) - n + 1):
+                    yield word[i:i + n]
+
+    def transform(self, text: str) -> np.ndarray:
+        """Embed text as an L2-normalised float32 vector (all zeros if it has no n-grams)."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram in self._ngrams(text):
+            h = zlib.crc32(gram.encode("utf-8"))
+            # The top bit picks a sign so that colliding n-grams tend to cancel instead of adding up
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class MeetingVectorIndex:
+    """Incrementally updated, memory-mapped vector index of meeting passages."""
+
+    def __init__(self, index_dir: str, db_path: str):
+        """
+        Initialize the index.
+
+        Args:
+            index_dir: Directory of the vector matrix and document-frequency files
+            db_path: SQLite database holding the passage metadata (the meeting archive database)
+        """
+        self.index_dir = index_dir
+        self.db_path = db_path
+        self.dim = VECTOR_INDEX_CONFIG["dim"]
+        self.passage_chars = VECTOR_INDEX_CONFIG["passage_chars"]
+        self.vectorizer = HashingVectorizer(self.dim, VECTOR_INDEX_CONFIG["ngram_range"])
+
+        os.makedirs(index_dir, exist_ok=True)
+        self.matrix_path = os.path.join(index_dir, "vectors.f16")
+        self.df_path = os.path.join(index_dir, "df.npy")
+        self.lock_path = os.path.join(index_dir, ".lock")
+
+        self._local = threading.local()
+        self._matrix = None
+        self._matrix_rows = 0
+        self._matrix_lock = threading.Lock()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """Serialise writers across threads and processes."""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _row_count(self) -> int:
+        """Number of passages with committed metadata."""
+        return self._conn().execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vector_passages").fetchone()[0]
+
+    def _load_df(self) -> np.ndarray:
+        """Load the per-bucket document frequencies."""
+        if os.path.exists(self.df_path):
+            return np.load(self.df_path)
+        return np.zeros(self.dim, dtype=np.int64)
+
+    def add_meeting(self, meeting_id: int, meeting_title: str, transcript: str, summary: str) -> int:
+        """
+        Index a meeting's title, summary and transcript.
+
+        Returns:
+            int: Number of passages added
+        """
+        passages = [("title", meeting_title)] if meeting_title else []
+        passages += [("summary", p) for p in split_passages(summary, self.passage_chars)]
+        passages += [("transcript", p) for p in split_passages(transcript, self.passage_chars)]
+        if not passages:
+            return 0
+
+        vectors = np.stack([self.vectorizer.transform(text) for _, text in passages]).astype(np.float16)
+
+        with self._write_lock():
+            start = self._row_count()
+            # Drop vectors of an earlier write that crashed before its metadata was committed
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(start * self.dim * 2)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            df = self._load_df()
+            df += np.count_nonzero(vectors, axis=0)
+            temp_df = self.df_path + ".tmp.npy"
+            np.save(temp_df, df)
+            os.replace(temp_df, self.df_path)
+
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO vector_passages (row, meeting_id, field, text) VALUES (?, ?, ?, ?)",
+                    [(start + i, meeting_id, field, text) for i, (field, text) in enumerate(passages)]
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return len(passages)
+
+    def has_meeting(self, meeting_id: int) -> bool:
+        """Check whether a meeting is indexed."""
+        row = self._conn().execute("SELECT 1 FROM vector_passages WHERE meeting_id = ? LIMIT 1", (meeting_id,)).fetchone()
+        return row is not None
+
+    def _get_matrix(self, rows: int) -> Optional[np.memmap]:
+        """Memory-map the first `rows` vectors, remapping only when the index has grown."""
+        with self._matrix_lock:
+            if self._matrix is None or self._matrix_rows != rows:
+                if rows == 0 or not os.path.exists(self.matrix_path):
+                    return None
+                rows = min(rows, os.path.getsize(self.matrix_path) // (self.dim * 2))
+                self._matrix = np.memmap(self.matrix_path, dtype=np.float16, mode="r", shape=(rows, self.dim))
+                self._matrix_rows = rows
+            return self._matrix
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the meetings whose passages best match the query.
+
+        Args:
+            query: Free-text query
+            k: Number of meetings to return
+
+        Returns:
+            List of {"meeting_id", "score", "field", "snippet"}, best first, one entry per meeting
+        """
+        rows = self._row_count()
+        matrix = self._get_matrix(rows)
+        query_vector = self.vectorizer.transform(query)
+        if matrix is None or not query_vector.any():
+            return []
+
+        # Weight the query by inverse document frequency so rare n-grams dominate
+        df = self._load_df().astype(np.float32)
+        idf = np.log((1.0 + matrix.shape[0]) / (1.0 + df)) + 1.0
+        weighted = (query_vector * idf).astype(np.float32)
+
+        # Over-fetch passages since several may belong to the same meeting
+        fetch = min(matrix.shape[0], k * 8)
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        block = VECTOR_INDEX_CONFIG["search_block_rows"]
+        for offset in range(0, matrix.shape[0], block):
+            scores = np.asarray(matrix[offset:offset + block], dtype=np.float32) @ weighted
+            top = np.argpartition(-scores, min(fetch, len(scores)) - 1)[:fetch]
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top + offset])
+        order = np.argsort(-best_scores)
+
+        results, seen = [], set()
+        conn = self._conn()
+        for i in order:
+            if best_scores[i] <= 0:
+                break
+            passage = conn.execute(
+                "SELECT meeting_id, field, text FROM vector_passages WHERE row = ?", (int(best_rows[i]),)
+            ).fetchone()
+            if passage is None or passage[0] in seen:
+                continue
+            seen.add(passage[0])
+            results.append({"meeting_id": passage[0], "score": float(best_scores[i]), "field": passage[1], "snippet": passage[2]})
+            if len(results) >= k:
+                break
+        return results
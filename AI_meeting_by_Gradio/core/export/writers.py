@@ -0,0 +1,172 @@
+"""
+Export file writers for the meeting recorder application.
+
+Writers stream the meeting record segment by segment instead of building the
+whole document in memory, and always write to a temporary file in the target
+directory that is renamed into place only once it is complete, so a crash
+mid-write never leaves a truncated export behind.
+"""
+
+import os
+import io
+import json
+import gzip
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, TextIO
+
+# Export format -> (file extension, media type)
+EXPORT_FORMATS = {
+    "json": (".json", "application/json"),
+    "json.gz": (".json.gz", "application/gzip"),
+    "json.zst": (".json.zst", "application/zstd"),
+    "jsonl": (".jsonl", "application/x-ndjson"),
+    "md": (".md", "text/markdown; charset=utf-8"),
+}
+
+
+@contextmanager
+def atomic_write(filepath: str) -> Iterator[io.BufferedWriter]:
+    """
+    Open a binary file that only appears at `filepath` once the block completes.
+
+    The data is written to a temporary file in the same directory, fsynced and
+    renamed over the target; on error the temporary file is removed.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filepath)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextmanager
+def _open_text(raw: io.BufferedWriter, export_format: str, compression_level: int) -> Iterator[TextIO]:
+    """Wrap the raw file in the compressor of the format and a UTF-8 text layer."""
+    if export_format == "json.gz":
+        stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=compression_level)
+    elif export_format == "json.zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("json.zst 格式需要安裝 zstandard 套件")
+        stream = zstandard.ZstdCompressor(level=compression_level).stream_writer(raw, closefd=False)
+    else:
+        stream = raw
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="\n", write_through=False)
+    try:
+        yield text
+        text.flush()
+    finally:
+        # Detach rather than close the text layer so `raw` stays open for the fsync,
+        # then close the compressor so it writes its trailer
+        text.detach()
+        if stream is not raw:
+            stream.close()
+
+
+def _write_json(f: TextIO, header: Dict[str, Any], transcriptions: Iterable[Dict[str, str]], summary: str) -> None:
+    """Write the JSON export layout, one transcription segment per line."""
+    f.write("{\n")
+    for key, value in header.items():
+        f.write(f"{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+    f.write('"transcriptions": [')
+    for index, segment in enumerate(transcriptions):
+        f.write(",\n" if index else "\n")
+        f.write(json.dumps(segment, ensure_ascii=False))
+    f.write(f'\n],\n"summary": {json.dumps(summary, ensure_ascii=False)}\n}}\n')
+
+
+def _write_jsonl(f: TextIO, header: Dict[str, Any], transcriptions: Iterable[Dict[str, str]], summary: str) -> None:
+    """Write a meeting line, one line per transcription segment and a summary line."""
+    f.write(json.dumps({"type": "meeting", **header}, ensure_ascii=False) + "\n")
+    for index, segment in enumerate(transcriptions):
+        f.write(json.dumps({"type": "segment", "index": index, **segment}, ensure_ascii=False) + "\n")
+    f.write(json.dumps({"type": "summary", "summary": summary}, ensure_ascii=False) + "\n")
+
+
+def _write_markdown(f: TextIO, header: Dict[str, Any], transcriptions: Iterable[Dict[str, str]], summary: str) -> None:
+    """Write a human-readable Markdown document."""
+    f.write(f"# {header['meeting_title']}\n\n")
+    f.write(f"- 日期: {header['date']}\n")
+    if header["participants"]:
+        f.write(f"- 參與者: {', '.join(header['participants'])}\n")
+    f.write(f"\n## 會議摘要\n\n{summary}\n")
+    action_items = (header.get("structured_summary") or {}).get("action_items")
+    if action_items:
+        f.write("\n## 行動項目\n\n| 任務 | 負責人 | 截止日期 | 狀態 |\n| --- | --- | --- | --- |\n")
+        for item in action_items:
+            cells = [item["task"], item.get("owner") or "", item.get("due_date") or item.get("due_text") or "", "已完成" if item.get("status") == "done" else "進行中"]
+            f.write("| " + " | ".join(cell.replace("|", "\\|") for cell in cells) + " |\n")
+    f.write("\n## 轉錄內容\n")
+    for segment in transcriptions:
+        f.write(f"\n### {segment.get('timestamp', '')}\n\n{segment.get('text', '')}\n")
+
+
+def write_export(filepath: str, export_format: str, header: Dict[str, Any], transcriptions: Iterable[Dict[str, str]],
+                 summary: str, compression_level: int = 6) -> None:
+    """
+    Stream a meeting record to `filepath` atomically.
+
+    Args:
+        filepath: Target file path
+        export_format: One of EXPORT_FORMATS
+        header: Meeting fields written before the transcriptions (meeting_title, participants, date and
+            optionally structured_summary)
+        transcriptions: Transcription segments, consumed lazily
+        summary: Meeting summary
+        compression_level: Level for the compressed formats
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的導出格式: {export_format}")
+
+    writer = {"jsonl": _write_jsonl, "md": _write_markdown}.get(export_format, _write_json)
+    with atomic_write(filepath) as raw:
+        with _open_text(raw, export_format, compression_level) as f:
+            writer(f, header, transcriptions, summary)
+
+
+def read_export(filepath: str) -> Dict[str, Any]:
+    """Read a JSON, compressed JSON or JSONL export back into the JSON export layout."""
+    export_format = format_for_path(filepath)
+    if export_format == "json.gz":
+        with gzip.open(filepath, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    if export_format == "json.zst":
+        import zstandard
+        with open(filepath, "rb") as raw:
+            with zstandard.ZstdDecompressor().stream_reader(raw) as stream:
+                return json.load(io.TextIOWrapper(stream, encoding="utf-8"))
+    if export_format == "jsonl":
+        data = {"transcriptions": []}
+        with open(filepath, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                record_type = record.pop("type", None)
+                if record_type == "segment":
+                    record.pop("index", None)
+                    data["transcriptions"].append(record)
+                else:
+                    data.update(record)
+        return data
+    if export_format == "json":
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    raise ValueError(f"無法讀取該格式的導出文件: {filepath}")
+
+
+def format_for_path(filepath: str) -> str:
+    """Get the export format of a file from its extension (longest match first)."""
+    for export_format, (extension, _) in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[1][0])):
+        if filepath.endswith(extension):
+            return export_format
+    raise ValueError(f"無法識別導出文件格式: {filepath}")
+
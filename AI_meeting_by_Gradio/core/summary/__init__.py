@@ -1 +1,6 @@
 from .generator import SummaryGenerator
+from .compactor import TranscriptCompactor, estimate_tokens
+from .structured import (
+    STRUCTURED_SUMMARY_SCHEMA, StructuredSummaryError, parse_structured_summary,
+    render_structured_summary, validate_structured_summary,
+)
@@ -0,0 +1,152 @@
+"""
+Transcript compaction for the meeting recorder application.
+
+Speech-to-text output of spoken Mandarin is full of fillers (嗯, 呃, 那個, 就是),
+stuttered repetitions, hallucinated repeated sentences and text duplicated at
+the seams of audio chunks. None of it helps the summary model, so it is removed
+locally before the transcript is put into the prompt. Every rule is
+conservative: words that carry meaning in context (那個方案, 就是說) are kept.
+"""
+
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import COMPACTION_CONFIG
+
+_CJK = "\u3400-\u9fff\uf900-\ufaff"
+_CJK_CHAR = re.compile(f"[{_CJK}]")
+_PUNCT = "，,、。．.！!？?；;：:…~～"
+_CLAUSE_START = f"(?:^|(?<=[{_PUNCT}\\s]))"
+_SENTENCE = re.compile(f"[^。！？!?\\n]+[。！？!?]*")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens of a text without a tokenizer.
+
+    CJK characters are counted as one token each and other text as one token
+    per four characters, which is close to the GPT tokenizers for mixed
+    Chinese/English meeting transcripts.
+    """
+    cjk = len(_CJK_CHAR.findall(text))
+    other = len(_CJK_CHAR.sub("", text).strip())
+    return cjk + (other + 3) // 4
+
+
+class TranscriptCompactor:
+    """Removes disfluencies, repetitions and seam overlaps from transcripts."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the compactor.
+
+        Args:
+            config: Compaction settings (default: COMPACTION_CONFIG)
+        """
+        self.config = dict(COMPACTION_CONFIG, **(config or {}))
+
+        interjections = "|".join(map(re.escape, self.config["interjections"]))
+        discourse = "|".join(map(re.escape, self.config["discourse_fillers"] + self.config["clause_interjections"]))
+        english = "|".join(map(re.escape, self.config["english_fillers"]))
+        # Interjections (嗯, 呃) carry no meaning anywhere, together with the punctuation after them
+        self._interjection = re.compile(f"(?:{interjections})+[{_PUNCT}]?\\s*") if interjections else None
+        # Discourse fillers (那個, 就是) and interjections that are also parts of words (額 as in 金額, 額外)
+        # only when they stand alone as a clause, e.g. "那個，我們…", "額，" or "就是就是"
+        self._discourse = re.compile(
+            f"{_CLAUSE_START}(?:{discourse})(?:(?:{discourse})*[{_PUNCT}]\\s*|(?=(?:{discourse})))"
+        ) if discourse else None
+        self._english = re.compile(f"\\b(?:{english})\\b[{_PUNCT}]?\\s*", re.IGNORECASE) if english else None
+        max_unit = self.config["max_repeat_unit_chars"]
+        # Stuttered phrases such as "我們我們我們", only when said three or more times: single
+        # characters and ABAB reduplication (謝謝, 研究研究, 一個一個) are normal Chinese
+        self._cjk_repeat = re.compile(f"([{_CJK}]{{2,{max_unit}}})(?:[{_PUNCT}\\s]*\\1){{2,}}")
+        # Repeated English phrases ("I think I think") collapse at once, but a single word only when said
+        # three or more times, since "that that" or "had had" can be grammatical; numbers are never touched
+        word = r"[A-Za-z]+(?:'[A-Za-z]+)?"
+        self._latin_repeat = re.compile(f"\\b({word}(?:\\s+{word}){{1,3}})(?:[\\s,]+\\1\\b)+", re.IGNORECASE)
+        self._latin_word_repeat = re.compile(f"\\b({word})(?:[\\s,]+\\1\\b){{2,}}", re.IGNORECASE)
+
+    def compact(self, text: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Compact a transcript.
+
+        Args:
+            text: Transcript text; newlines separate transcription segments
+
+        Returns:
+            Tuple of the compacted text and stats
+            {"original_tokens", "compacted_tokens", "saved_tokens", "saved_ratio"}
+        """
+        original_tokens = estimate_tokens(text)
+        compacted = text
+        if self.config["enabled"] and text:
+            segments = [line.strip() for line in text.split("\n")]
+            if self.config["dedupe_overlaps"]:
+                segments = self._dedupe_overlaps(segments)
+            segments = [self._compact_segment(segment) for segment in segments]
+            compacted = "\n".join(segment for segment in segments if segment)
+
+        compacted_tokens = estimate_tokens(compacted)
+        saved = original_tokens - compacted_tokens
+        return compacted, {
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "saved_tokens": saved,
+            "saved_ratio": saved / original_tokens if original_tokens else 0.0,
+        }
+
+    def _compact_segment(self, segment: str) -> str:
+        """Apply the filler and repetition rules to one segment."""
+        if self.config["remove_fillers"]:
+            for pattern in (self._interjection, self._discourse, self._english):
+                if pattern is not None:
+                    segment = pattern.sub("", segment)
+        if self.config["collapse_repeats"]:
+            segment = self._cjk_repeat.sub(r"\1", segment)
+            segment = self._latin_repeat.sub(r"\1", segment)
+            segment = self._latin_word_repeat.sub(r"\1", segment)
+            segment = self._drop_repeated_sentences(segment)
+        # Punctuation left dangling by removed words
+        segment = re.sub(f"^[{_PUNCT}\\s]+", "", segment)
+        segment = re.sub(f"([，,、])[{_PUNCT}\\s]*(?=[，,、。！？!?])", "", segment)
+        return re.sub(r"[ \t]{2,}", " ", segment).strip()
+
+    @staticmethod
+    def _normalize(sentence: str) -> str:
+        """Comparison key of a sentence: lowercase without punctuation or whitespace."""
+        return re.sub(f"[{_PUNCT}\\s]", "", sentence).lower()
+
+    def _drop_repeated_sentences(self, segment: str) -> str:
+        """
+        Drop sentences that repeat the sentence right before them, e.g. looping recognizer output.
+
+        Short sentences are always kept: two people answering 同意 or 好 in turn are not a loop.
+        """
+        min_chars = self.config["min_repeat_sentence_chars"]
+        kept, previous = [], None
+        for sentence in _SENTENCE.findall(segment):
+            key = self._normalize(sentence)
+            if len(key) >= min_chars and key == previous:
+                continue
+            kept.append(sentence)
+            previous = key
+        return "".join(kept)
+
+    def _dedupe_overlaps(self, segments: List[str]) -> List[str]:
+        """Remove text at the start of a segment that repeats the end of the previous segment."""
+        min_chars = self.config["min_overlap_chars"]
+        max_chars = self.config["max_overlap_chars"]
+        result = []
+        for segment in segments:
+            previous = next((s for s in reversed(result) if s), "")
+            limit = min(len(previous), len(segment), max_chars)
+            for size in range(limit, min_chars - 1, -1):
+                if previous.endswith(segment[:size]):
+                    segment = segment[size:].lstrip(_PUNCT + " ")
+                    break
+            result.append(segment)
+        return result
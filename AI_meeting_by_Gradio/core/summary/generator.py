@@ -3,13 +3,55 @@ Summary generator module for the meeting recorder application.
 """
 
 import os
-import openai
+import json
+import hashlib
 import requests
 import sys
 
 # 添加項目根目錄到 Python 路徑
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import SUMMARY_CONFIG
 from utils.config import Config
+from utils.openai_client import get_default_client
+from utils.state_store import get_state_store
+from utils.single_flight import SingleFlight
+from utils.quota import key_id
+from .compactor import TranscriptCompactor, estimate_tokens
+from .router import ProviderRouter
+from .structured import STRUCTURED_SYSTEM_PROMPT, StructuredSummaryError, parse_structured_summary, render_structured_summary
+
+# 改進的系統提示詞
+SUMMARY_SYSTEM_PROMPT = """你是一位專業的會議摘要專家，擅長將冗長的會議記錄轉化為清晰、結構化且信息豐富的摘要。
+你的任務是分析會議轉錄內容，提取關鍵信息，並生成一份全面的會議摘要報告。
+
+請嚴格按照以下結構輸出摘要：
+
+1. 會議標題：[提供簡潔明確的會議標題，如果已提供則使用]
+
+2. 日期：[如果在轉錄中提到日期，請提取；否則可以省略]
+
+3. 參與者：[列出所有參與會議的人員，如有提供]
+
+4. 摘要：[用3-5個段落概述會議的主要內容和目的，突出最重要的討論要點]
+
+5. 關鍵點：[以項目符號列出5-8個會議中討論的最重要觀點或信息]
+
+6. 行動項目：[以項目符號列出會議中確定的所有需要採取的行動，包括負責人和截止日期（如有提及）]
+
+7. 決策：[以項目符號列出會議中做出的所有決定]
+
+請使用繁體中文輸出，保持專業、簡潔的語言風格。確保摘要能夠讓未參加會議的人清楚了解會議內容和結果。
+如果某個部分在會議記錄中沒有相關信息，可以省略該部分，但不要編造信息。"""
+
+
+class SummaryError(Exception):
+    """摘要生成失敗，錯誤信息即返回給用戶的提示。"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        # 提供者返回的 HTTP 狀態碼（如有），路由器據此區分提供者故障和請求本身的錯誤（例如無效的 API 密鑰）
+        self.status_code = status_code
+
 
 class SummaryGenerator:
     """摘要生成器類，可以使用多種模型生成會議摘要。"""
@@ -19,168 +61,408 @@ class SummaryGenerator:
         self.config = Config()
         self.api_key_set = self._force_set_api_key()
         self.last_summary = ""
+        # 增量摘要的狀態（上一次的摘要和轉錄游標）保存在共享狀態存儲中
+        self.state_store = get_state_store()
+        # 生成摘要前在本地壓縮轉錄（移除口頭禪、重複和分段重疊）
+        self.compactor = TranscriptCompactor()
+        self.last_compaction = None
+        # 按轉錄長度、近期延遲、排隊請求數和健康狀態在 OpenAI 和 Ollama 之間選擇
+        self.router = ProviderRouter()
+        # 同時進行的相同摘要請求（相同提示詞和模型）只調用一次模型
+        self.flights = SingleFlight("summary")
 
     def _force_set_api_key(self):
-        """設置 OpenAI API 密鑰。"""
+        """檢查是否設置了服務器默認的 OpenAI API 密鑰。"""
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
-            print("警告: 未設置 OPENAI_API_KEY 環境變量，摘要生成功能將無法使用")
+            print("警告: 未設置 OPENAI_API_KEY 環境變量，未提供客戶端的摘要請求將無法執行")
             return False
-        openai.api_key = api_key
         return True
 
-    def generate_summary(self, transcript, meeting_title=None, participants=None):
+    def generate_summary(self, transcript, meeting_title=None, participants=None, client=None):
         """
         根據會議轉錄生成摘要。
-        
+
         參數:
             transcript (str): 會議轉錄文本。
             meeting_title (str, optional): 會議標題。
             participants (list, optional): 參與者列表。
-            
+            client (OpenAIClient, optional): 綁定調用者 API 密鑰的客戶端，未提供時使用服務器默認密鑰。
+
         返回:
             str: 生成的摘要。
         """
-        # 檢查是否使用 Ollama 本地模型
-        use_ollama = hasattr(self.config, 'use_local_model') and self.config.use_local_model
-        
-        if use_ollama:
-            return self._generate_summary_ollama(transcript, meeting_title, participants)
-        else:
-            return self._generate_summary_openai(transcript, meeting_title, participants)
+        try:
+            summary = self._complete(self._build_user_prompt(transcript, meeting_title, participants), client)
+        except SummaryError as e:
+            return str(e)
+        self.last_summary = self._clean_summary(summary)
+        return self.last_summary
+
+    def generate_structured_summary(self, transcript, meeting_title=None, participants=None, client=None, summary=None):
+        """
+        以結構化模式生成摘要：模型輸出符合 STRUCTURED_SUMMARY_SCHEMA 的 JSON，驗證後返回。
+
+        提供 summary（已生成的文字摘要）時，只把該摘要轉換為結構化格式，提示詞遠小於整份轉錄。
+
+        參數:
+            transcript (str): 會議轉錄文本，提供 summary 時可為 None。
+            meeting_title (str, optional): 會議標題。
+            participants (list, optional): 參與者列表。
+            client (OpenAIClient, optional): 綁定調用者 API 密鑰的客戶端。
+            summary (str, optional): 已生成的文字摘要。
 
-    def _generate_summary_openai(self, transcript, meeting_title=None, participants=None):
-        """使用 OpenAI API 生成摘要。"""
-        if not self.api_key_set:
-            return "錯誤: 未設置 OpenAI API 密鑰，無法生成摘要。請在環境變量或 .env 文件中設置 OPENAI_API_KEY。"
-            
+        返回:
+            tuple: (文字摘要, 結構化摘要)；失敗時為 (錯誤信息, None)。
+        """
+        if summary is not None:
+            user_prompt = f"請把以下會議摘要轉換為結構化格式：\n\n{summary}"
+        else:
+            user_prompt = self._build_user_prompt(transcript, meeting_title, participants)
         try:
-            # 從配置中獲取模型和溫度
-            model = self.config.get_openai_config().get("summary_model", "gpt-4")
-            temperature = 0.5  # 降低溫度以獲得更一致的輸出
-            
-            # 改進的系統提示詞
-            system_prompt = """你是一位專業的會議摘要專家，擅長將冗長的會議記錄轉化為清晰、結構化且信息豐富的摘要。
-你的任務是分析會議轉錄內容，提取關鍵信息，並生成一份全面的會議摘要報告。
+            structured = parse_structured_summary(
+                self._complete(user_prompt, client, system_prompt=STRUCTURED_SYSTEM_PROMPT, json_mode=True)
+            )
+        except SummaryError as e:
+            return str(e), None
+        except StructuredSummaryError as e:
+            return f"模型輸出的結構化摘要無效: {str(e)}", None
+        if meeting_title:
+            structured["title"] = meeting_title
+        if summary is None:
+            self.last_summary = render_structured_summary(structured, participants)
+            return self.last_summary, structured
+        return summary, structured
 
-請嚴格按照以下結構輸出摘要：
+    def generate_incremental_summary(self, transcript, session_id, meeting_title=None, participants=None, client=None):
+        """
+        為不斷增長的會議轉錄（長會議或實時會議）增量更新摘要。
 
-1. 會議標題：[提供簡潔明確的會議標題，如果已提供則使用]
+        只把上一次之後新增的轉錄片段連同上一次的摘要發送給模型，而不是每次都處理整份轉錄；
+        每隔 SUMMARY_CONFIG["incremental_full_every"] 次更新做一次完整的重新摘要，以限制累積偏差。
+        如果轉錄不是在上一次的基礎上追加的（例如被修改過），也會做完整摘要。
 
-2. 日期：[如果在轉錄中提到日期，請提取；否則可以省略]
+        參數:
+            transcript (str): 目前為止的完整會議轉錄文本。
+            session_id (str): 會議/會話 ID，用於保存上一次的摘要和轉錄游標；狀態按 API 密鑰分開保存，
+                不同調用者使用相同的 ID 不會讀取或覆蓋彼此的摘要。
+            meeting_title (str, optional): 會議標題。
+            participants (list, optional): 參與者列表。
+            client (OpenAIClient, optional): 綁定調用者 API 密鑰的客戶端。
 
-3. 參與者：[列出所有參與會議的人員，如有提供]
+        返回:
+            str: 更新後的摘要。
+        """
+        state, updates, user_prompt = self._plan_incremental(transcript, self._rolling_key(session_id, client), meeting_title, participants)
+        if user_prompt is None:
+            return state["summary"]
 
-4. 摘要：[用3-5個段落概述會議的主要內容和目的，突出最重要的討論要點]
+        try:
+            summary = self._clean_summary(self._complete(user_prompt, client))
+        except SummaryError as e:
+            return str(e)
 
-5. 關鍵點：[以項目符號列出5-8個會議中討論的最重要觀點或信息]
+        self._save_incremental(self._rolling_key(session_id, client), transcript, summary, updates)
+        return summary
 
-6. 行動項目：[以項目符號列出會議中確定的所有需要採取的行動，包括負責人和截止日期（如有提及）]
+    def generate_summary_stream(self, transcript, meeting_title=None, participants=None, client=None):
+        """
+        逐步生成摘要，模型每輸出一段文字就 yield 一次目前為止的摘要。
 
-7. 決策：[以項目符號列出會議中做出的所有決定]
+        參數與 generate_summary 相同；失敗時 yield 錯誤信息。
+        """
+        summary = ""
+        try:
+            for summary in self._stream(self._build_user_prompt(transcript, meeting_title, participants), client):
+                yield summary
+        except SummaryError as e:
+            yield str(e)
+            return
+        self.last_summary = self._clean_summary(summary)
+        yield self.last_summary
 
-請使用繁體中文輸出，保持專業、簡潔的語言風格。確保摘要能夠讓未參加會議的人清楚了解會議內容和結果。
-如果某個部分在會議記錄中沒有相關信息，可以省略該部分，但不要編造信息。"""
-            
-            # 添加會議標題和參與者信息到提示中
-            user_prompt = f"請根據以下會議轉錄內容，生成一份專業的會議摘要：\n\n"
-            
-            if meeting_title:
-                user_prompt += f"會議標題: {meeting_title}\n"
-                
-            if participants and len(participants) > 0:
-                user_prompt += f"參與者: {', '.join(participants)}\n"
-                
-            user_prompt += f"\n會議轉錄內容:\n{transcript}\n\n請提供一份結構化的會議摘要，包含上述要求的所有部分。特別注意識別關鍵討論點、行動項目和決策。"
-            
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=temperature,
-                max_tokens=4000
-            )
-            
-            summary = response.choices[0].message.content
-            self.last_summary = self._clean_summary(summary)
-            return self.last_summary
-            
-        except Exception as e:
-            return f"生成摘要時發生錯誤: {str(e)}"
+    def generate_incremental_summary_stream(self, transcript, session_id, meeting_title=None, participants=None, client=None):
+        """
+        逐步增量更新摘要，模型每輸出一段文字就 yield 一次目前為止的摘要。
 
-    def _generate_summary_ollama(self, transcript, meeting_title=None, participants=None):
-        """使用 Ollama API 生成摘要。"""
+        參數與 generate_incremental_summary 相同；失敗時 yield 錯誤信息，且不更新增量摘要狀態。
+        """
+        state, updates, user_prompt = self._plan_incremental(transcript, self._rolling_key(session_id, client), meeting_title, participants)
+        if user_prompt is None:
+            yield state["summary"]
+            return
+
+        summary = ""
         try:
-            # 從配置中獲取 Ollama 設置
-            ollama_url = self.config.ollama_url
-            model = self.config.gemma_model
-            temperature = 0.5  # 降低溫度以獲得更一致的輸出
-            
-            # 改進的系統提示詞
-            system_prompt = """你是一位專業的會議摘要專家，擅長將冗長的會議記錄轉化為清晰、結構化且信息豐富的摘要。
-你的任務是分析會議轉錄內容，提取關鍵信息，並生成一份全面的會議摘要報告。
+            for summary in self._stream(user_prompt, client):
+                yield summary
+        except SummaryError as e:
+            yield str(e)
+            return
+        summary = self._clean_summary(summary)
+        self._save_incremental(self._rolling_key(session_id, client), transcript, summary, updates)
+        yield summary
 
-請嚴格按照以下結構輸出摘要：
+    @staticmethod
+    def _tenant(client):
+        """客戶端所屬 API 密鑰的標識（不含密鑰本身），沒有客戶端時為 None。"""
+        return key_id(client.api_key) if client is not None else None
 
-1. 會議標題：[提供簡潔明確的會議標題，如果已提供則使用]
+    def _rolling_key(self, session_id, client=None):
+        """增量摘要狀態的鍵：API 密鑰標識 + 會話 ID。"""
+        return f"{self._tenant(client)}:{session_id}"
 
-2. 日期：[如果在轉錄中提到日期，請提取；否則可以省略]
+    def _plan_incremental(self, transcript, key, meeting_title=None, participants=None):
+        """
+        決定增量摘要的下一步，key 為 _rolling_key 返回的狀態鍵。
 
-3. 參與者：[列出所有參與會議的人員，如有提供]
+        返回:
+            tuple: (上一次的狀態, 本次之後的增量更新次數, 用戶提示詞)；沒有新增內容時提示詞為 None。
+        """
+        state = self.state_store.get("rolling_summaries", key)
+        if state and (len(transcript) < state["cursor"] or self._prefix_hash(transcript, state["cursor"]) != state["prefix_hash"]):
+            state = None
 
-4. 摘要：[用3-5個段落概述會議的主要內容和目的，突出最重要的討論要點]
+        new_text = transcript[state["cursor"]:] if state else transcript
+        if state and not new_text.strip():
+            return state, state["updates"], None
 
-5. 關鍵點：[以項目符號列出5-8個會議中討論的最重要觀點或信息]
+        full = state is None or state["updates"] + 1 >= SUMMARY_CONFIG["incremental_full_every"]
+        if full:
+            return state, 0, self._build_user_prompt(transcript, meeting_title, participants)
+        return state, state["updates"] + 1, self._build_update_prompt(state["summary"], new_text, meeting_title, participants)
 
-6. 行動項目：[以項目符號列出會議中確定的所有需要採取的行動，包括負責人和截止日期（如有提及）]
+    def _save_incremental(self, key, transcript, summary, updates):
+        """保存增量摘要的狀態（摘要、轉錄游標和增量更新次數）。"""
+        self.state_store.set("rolling_summaries", key, {
+            "summary": summary,
+            "cursor": len(transcript),
+            "prefix_hash": self._prefix_hash(transcript, len(transcript)),
+            "updates": updates,
+        }, ttl=SUMMARY_CONFIG["incremental_state_ttl"])
+        self.last_summary = summary
 
-7. 決策：[以項目符號列出會議中做出的所有決定]
+    def reset_incremental_summary(self, session_id, client=None):
+        """清除會話（屬於 client 的 API 密鑰）的增量摘要狀態，下一次更新將做完整摘要。"""
+        self.state_store.delete("rolling_summaries", self._rolling_key(session_id, client))
 
-請使用繁體中文輸出，保持專業、簡潔的語言風格。確保摘要能夠讓未參加會議的人清楚了解會議內容和結果。
-如果某個部分在會議記錄中沒有相關信息，可以省略該部分，但不要編造信息。"""
-            
-            # 添加會議標題和參與者信息到提示中
-            user_prompt = f"請根據以下會議轉錄內容，生成一份專業的會議摘要：\n\n"
-            
-            if meeting_title:
-                user_prompt += f"會議標題: {meeting_title}\n"
-                
-            if participants and len(participants) > 0:
-                user_prompt += f"參與者: {', '.join(participants)}\n"
-                
-            user_prompt += f"\n會議轉錄內容:\n{transcript}\n\n請提供一份結構化的會議摘要，包含上述要求的所有部分。特別注意識別關鍵討論點、行動項目和決策。"
-            
-            # 構建請求
-            payload = {
-                "model": model,
-                "prompt": user_prompt,
-                "system": system_prompt,
-                "temperature": temperature,
-                "stream": False
-            }
-            
+    def _build_user_prompt(self, transcript, meeting_title=None, participants=None):
+        """構建完整摘要的用戶提示詞。"""
+        transcript = self._compact(transcript)
+        # 添加會議標題和參與者信息到提示中
+        user_prompt = f"請根據以下會議轉錄內容，生成一份專業的會議摘要：\n\n"
+
+        if meeting_title:
+            user_prompt += f"會議標題: {meeting_title}\n"
+
+        if participants and len(participants) > 0:
+            user_prompt += f"參與者: {', '.join(participants)}\n"
+
+        user_prompt += f"\n會議轉錄內容:\n{transcript}\n\n請提供一份結構化的會議摘要，包含上述要求的所有部分。特別注意識別關鍵討論點、行動項目和決策。"
+        return user_prompt
+
+    def _build_update_prompt(self, previous_summary, new_text, meeting_title=None, participants=None):
+        """構建增量更新摘要的用戶提示詞。"""
+        new_text = self._compact(new_text)
+        user_prompt = f"以下是一場進行中會議目前為止的摘要，以及之後新增的會議轉錄內容。請將新增內容整合進摘要，輸出更新後的完整摘要：\n\n"
+
+        if meeting_title:
+            user_prompt += f"會議標題: {meeting_title}\n"
+
+        if participants and len(participants) > 0:
+            user_prompt += f"參與者: {', '.join(participants)}\n"
+
+        user_prompt += f"\n目前的摘要:\n{previous_summary}\n\n新增的會議轉錄內容:\n{new_text}\n\n"
+        user_prompt += "請保留目前摘要中仍然成立的內容，補充新的討論點、行動項目和決策，並修正被新內容推翻的部分。輸出格式與目前的摘要相同。"
+        return user_prompt
+
+    def _complete(self, user_prompt, client=None, system_prompt=SUMMARY_SYSTEM_PROMPT, json_mode=False):
+        """合併同時進行的相同請求後完成提示詞，失敗時拋出 SummaryError。json_mode 要求模型只輸出 JSON。"""
+        if client is None:
+            client = get_default_client()
+        # 只合併同一 API 密鑰的請求（沒有密鑰的請求只能使用本地模型），否則無效或超出配額的密鑰也能拿到別人付費的摘要
+        tenant = self._tenant(client)
+        key = hashlib.sha256(
+            f"{tenant}:{self.router.config['provider']}:{self.config.summary_model}:{self.config.gemma_model}:{json_mode}:{system_prompt}:{user_prompt}".encode("utf-8")
+        ).hexdigest()
+        return self.flights.do(key, self._complete_routed, user_prompt, client, system_prompt, json_mode)
+
+    def _complete_routed(self, user_prompt, client=None, system_prompt=SUMMARY_SYSTEM_PROMPT, json_mode=False):
+        """
+        使用路由器選擇的模型提供者完成提示詞，失敗時依次改用下一個提供者。
+
+        所有提供者都失敗時拋出 SummaryError，錯誤信息包含每個提供者的錯誤。
+        """
+        if client is None:
+            client = get_default_client()
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+
+        errors = []
+        for provider in self.router.candidates(prompt_tokens, openai_available=client is not None):
+            if provider == "openai" and client is None:
+                errors.append("錯誤: 未設置 OpenAI API 密鑰，無法生成摘要。請在環境變量或 .env 文件中設置 OPENAI_API_KEY。")
+                continue
+            try:
+                with self.router.track(provider, prompt_tokens):
+                    if provider == "ollama":
+                        return self._complete_ollama(system_prompt, user_prompt, json_mode)
+                    return self._complete_openai(system_prompt, user_prompt, client, json_mode)
+            except SummaryError as e:
+                print(f"使用 {provider} 生成摘要失敗: {str(e)}")
+                errors.append(str(e))
+        raise SummaryError("\n".join(errors))
+
+    def _stream(self, user_prompt, client=None):
+        """
+        以流式輸出完成提示詞，每收到一段文字就 yield 一次目前為止的全部輸出。
+
+        提供者在輸出任何文字之前失敗時改用下一個提供者；已經開始輸出後失敗則拋出 SummaryError。
+        流式請求無法與其他請求共享結果，因此不做相同請求合併。
+        """
+        if client is None:
+            client = get_default_client()
+        prompt_tokens = estimate_tokens(SUMMARY_SYSTEM_PROMPT) + estimate_tokens(user_prompt)
+
+        errors = []
+        for provider in self.router.candidates(prompt_tokens, openai_available=client is not None):
+            if provider == "openai" and client is None:
+                errors.append("錯誤: 未設置 OpenAI API 密鑰，無法生成摘要。請在環境變量或 .env 文件中設置 OPENAI_API_KEY。")
+                continue
+            output = ""
+            try:
+                with self.router.track(provider, prompt_tokens):
+                    if provider == "ollama":
+                        deltas = self._stream_ollama(SUMMARY_SYSTEM_PROMPT, user_prompt)
+                    else:
+                        deltas = self._stream_openai(SUMMARY_SYSTEM_PROMPT, user_prompt, client)
+                    for delta in deltas:
+                        output += delta
+                        yield output
+                return
+            except SummaryError as e:
+                if output:
+                    raise
+                print(f"使用 {provider} 生成摘要失敗: {str(e)}")
+                errors.append(str(e))
+        raise SummaryError("\n".join(errors))
+
+    def _openai_request(self, system_prompt, user_prompt, json_mode=False):
+        """OpenAI 聊天請求的參數。"""
+        request = {
+            # 從配置中獲取模型
+            "model": self.config.get_openai_config()["summary_model"],
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.5,  # 降低溫度以獲得更一致的輸出
+            "max_tokens": 4000
+        }
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        return request
+
+    def _ollama_payload(self, system_prompt, user_prompt, stream, json_mode=False):
+        """Ollama 生成請求的內容。"""
+        payload = {
+            # 從配置中獲取 Ollama 設置
+            "model": self.config.gemma_model,
+            "prompt": user_prompt,
+            "system": system_prompt,
+            "temperature": 0.5,  # 降低溫度以獲得更一致的輸出
+            "stream": stream
+        }
+        if json_mode:
+            payload["format"] = "json"
+        return payload
+
+    def _complete_openai(self, system_prompt, user_prompt, client=None, json_mode=False):
+        """使用 OpenAI API 完成提示詞。"""
+        if client is None:
+            client = get_default_client()
+        if client is None:
+            raise SummaryError("錯誤: 未設置 OpenAI API 密鑰，無法生成摘要。請在環境變量或 .env 文件中設置 OPENAI_API_KEY。")
+
+        try:
+            return client.chat_completion(**self._openai_request(system_prompt, user_prompt, json_mode))
+        except Exception as e:
+            raise SummaryError(f"生成摘要時發生錯誤: {str(e)}", getattr(e, "status_code", None)) from e
+
+    def _stream_openai(self, system_prompt, user_prompt, client):
+        """使用 OpenAI API 流式完成提示詞，yield 每段新輸出的文字。"""
+        try:
+            yield from client.chat_completion_stream(**self._openai_request(system_prompt, user_prompt))
+        except Exception as e:
+            raise SummaryError(f"生成摘要時發生錯誤: {str(e)}", getattr(e, "status_code", None)) from e
+
+    def _complete_ollama(self, system_prompt, user_prompt, json_mode=False):
+        """使用 Ollama API 完成提示詞。"""
+        try:
             # 發送請求
-            response = requests.post(ollama_url, json=payload)
-            
-            if response.status_code == 200:
-                result = response.json()
-                summary = result.get("response", "")
-                self.last_summary = self._clean_summary(summary)
-                return self.last_summary
-            else:
-                return f"Ollama API 返回錯誤: {response.status_code} - {response.text}"
-                
+            response = requests.post(
+                self.config.ollama_url,
+                json=self._ollama_payload(system_prompt, user_prompt, stream=False, json_mode=json_mode),
+                timeout=SUMMARY_CONFIG["request_timeout"]
+            )
         except Exception as e:
-            return f"使用 Ollama 生成摘要時發生錯誤: {str(e)}"
+            raise SummaryError(f"使用 Ollama 生成摘要時發生錯誤: {str(e)}", getattr(e, "status_code", None)) from e
+
+        if response.status_code == 200:
+            return response.json().get("response", "")
+        raise SummaryError(f"Ollama API 返回錯誤: {response.status_code} - {response.text}", response.status_code)
+
+    def _stream_ollama(self, system_prompt, user_prompt):
+        """使用 Ollama API 流式完成提示詞，yield 每段新輸出的文字。"""
+        try:
+            response = requests.post(
+                self.config.ollama_url,
+                json=self._ollama_payload(system_prompt, user_prompt, stream=True),
+                timeout=SUMMARY_CONFIG["request_timeout"],
+                stream=True
+            )
+        except Exception as e:
+            raise SummaryError(f"使用 Ollama 生成摘要時發生錯誤: {str(e)}", getattr(e, "status_code", None)) from e
+
+        with response:
+            if response.status_code != 200:
+                raise SummaryError(f"Ollama API 返回錯誤: {response.status_code} - {response.text}", response.status_code)
+            try:
+                # 每行一個 JSON 對象，最後一行 done 為 true
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+            except Exception as e:
+                raise SummaryError(f"使用 Ollama 生成摘要時發生錯誤: {str(e)}", getattr(e, "status_code", None)) from e
+
+    def _compact(self, transcript):
+        """壓縮轉錄文本，並記錄節省的 token 數量。"""
+        compacted, stats = self.compactor.compact(transcript)
+        self.last_compaction = stats
+        if stats["saved_tokens"] > 0:
+            print(f"轉錄壓縮: {stats['original_tokens']} -> {stats['compacted_tokens']} tokens "
+                  f"(節省 {stats['saved_tokens']}, {stats['saved_ratio']:.1%})")
+        return compacted
+
+    def get_compaction_stats(self):
+        """獲取最近一次轉錄壓縮的統計（original_tokens, compacted_tokens, saved_tokens, saved_ratio）。"""
+        return self.last_compaction
+
+    @staticmethod
+    def _prefix_hash(transcript, length):
+        """計算轉錄前 length 個字符的哈希，用於判斷新轉錄是否在上一次的基礎上追加。"""
+        return hashlib.sha256(transcript[:length].encode("utf-8")).hexdigest()
 
     def _clean_summary(self, summary):
         """清理摘要文本。"""
         # 移除多餘的空行
         summary = "\n".join([line for line in summary.split("\n") if line.strip()])
         return summary
-        
+
     def get_summary(self):
         """獲取最近生成的摘要。"""
         return self.last_summary
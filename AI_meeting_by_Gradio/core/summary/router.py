@@ -0,0 +1,154 @@
+"""
+Summary provider routing for the meeting recorder application.
+
+Picks OpenAI or the local Ollama model for each summary request. In "auto"
+mode providers are ranked by predicted latency: an exponentially weighted
+moving average of observed seconds per 1000 prompt tokens, scaled by the
+prompt size and by the number of requests already queued on the provider.
+Providers that fail with a server error, rate limiting, a timeout or a
+connection error are skipped for a cooldown period; errors caused by the
+request itself (e.g. one tenant's invalid API key) do not count against the
+provider. A request that fails on one provider is retried on the next. Latency, health and in-flight
+requests are kept in the shared state store so every worker process routes
+on the same view.
+"""
+
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import SUMMARY_CONFIG
+from utils.state_store import get_state_store
+
+PROVIDERS = ("openai", "ollama")
+
+# Errors without a status code that mean the provider could not be reached or dropped the response
+_UNREACHABLE = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider itself is failing (5xx, 429, timeout or connection error).
+
+    Other errors, e.g. a 401 for one tenant's invalid API key or a 400 for a
+    malformed request, are about the request and must not take the provider
+    out of rotation for every tenant.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, _UNREACHABLE) or isinstance(error.__cause__, _UNREACHABLE)
+
+
+class ProviderRouter:
+    """Latency-aware router between the summary providers."""
+
+    NAMESPACE = "summary_providers"
+    INFLIGHT_NAMESPACE = "summary_inflight"
+
+    def __init__(self, store=None, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the router.
+
+        Args:
+            store: Shared state store (default: the process-wide store)
+            config: Routing settings (default: SUMMARY_CONFIG)
+        """
+        self.store = store or get_state_store()
+        self.config = dict(SUMMARY_CONFIG, **(config or {}))
+        if self.config["provider"] not in PROVIDERS + ("auto",):
+            raise ValueError(f"不支持的摘要提供者: {self.config['provider']}，可選: openai、ollama、auto")
+
+    def _state(self, provider: str) -> Dict[str, Any]:
+        """Latency and health state of a provider."""
+        state = self.store.get(self.NAMESPACE, provider) or {}
+        state.setdefault("seconds_per_ktoken", self.config[f"{provider}_seconds_per_ktoken"])
+        state.setdefault("unhealthy_until", 0)
+        return state
+
+    def inflight(self, provider: str) -> int:
+        """Number of requests currently running on a provider, across all processes."""
+        prefix = f"{provider}:"
+        return sum(1 for key in self.store.keys(self.INFLIGHT_NAMESPACE) if key.startswith(prefix))
+
+    def is_healthy(self, provider: str) -> bool:
+        """Whether a provider is outside its failure cooldown."""
+        return self._state(provider)["unhealthy_until"] <= time.time()
+
+    def estimate_latency(self, provider: str, prompt_tokens: int) -> float:
+        """Predicted seconds to summarize a prompt on a provider, including requests queued ahead of it."""
+        unit = self._state(provider)["seconds_per_ktoken"] * max(prompt_tokens, 1000) / 1000
+        queued = self.inflight(provider) // self.config[f"{provider}_concurrency"]
+        return unit * (1 + queued)
+
+    def candidates(self, prompt_tokens: int, openai_available: bool = True) -> List[str]:
+        """
+        Providers to try for a request, in order.
+
+        Args:
+            prompt_tokens: Estimated prompt size
+            openai_available: Whether an OpenAI API key is available for the request
+
+        Returns:
+            List of provider names; the first is the preferred provider
+        """
+        mode = self.config["provider"]
+        if mode == "auto":
+            usable = [p for p in PROVIDERS if p != "openai" or openai_available]
+            # Prompts longer than the local model's context window only go to Ollama as a last resort
+            fits = [p for p in usable if p != "ollama" or prompt_tokens <= self.config["ollama_max_prompt_tokens"]]
+            ranked = sorted(fits, key=lambda p: (not self.is_healthy(p), self.estimate_latency(p, prompt_tokens)))
+            ordered = ranked + [p for p in PROVIDERS if p not in ranked]
+        else:
+            others = [p for p in PROVIDERS if p != mode] if self.config["failover"] else []
+            ordered = [mode] + sorted(others, key=lambda p: not self.is_healthy(p))
+        return ordered if self.config["failover"] else ordered[:1]
+
+    @contextmanager
+    def track(self, provider: str, prompt_tokens: int) -> Iterator[None]:
+        """Count a request as in flight on a provider and record its latency, or its failure if the provider is at fault."""
+        key = f"{provider}:{uuid.uuid4().hex}"
+        # The TTL releases the slot of a worker that dies mid-request
+        self.store.set(self.INFLIGHT_NAMESPACE, key, time.time(), ttl=self.config["request_timeout"])
+        start = time.time()
+        try:
+            yield
+        except Exception as e:
+            if is_provider_failure(e):
+                self.record_failure(provider)
+            raise
+        else:
+            self.record_success(provider, time.time() - start, prompt_tokens)
+        finally:
+            self.store.delete(self.INFLIGHT_NAMESPACE, key)
+
+    def record_success(self, provider: str, seconds: float, prompt_tokens: int) -> None:
+        """Fold an observed latency into the provider's moving average and mark it healthy."""
+        state = self._state(provider)
+        alpha = self.config["latency_ewma_alpha"]
+        sample = seconds * 1000 / max(prompt_tokens, 1000)
+        state["seconds_per_ktoken"] = alpha * sample + (1 - alpha) * state["seconds_per_ktoken"]
+        state["unhealthy_until"] = 0
+        state["last_latency"] = seconds
+        self.store.set(self.NAMESPACE, provider, state)
+
+    def record_failure(self, provider: str) -> None:
+        """Take a provider out of rotation for the cooldown period."""
+        state = self._state(provider)
+        state["unhealthy_until"] = time.time() + self.config["provider_cooldown"]
+        state["failures"] = state.get("failures", 0) + 1
+        self.store.set(self.NAMESPACE, provider, state)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Routing state of every provider."""
+        return {
+            provider: dict(self._state(provider), healthy=self.is_healthy(provider), inflight=self.inflight(provider))
+            for provider in PROVIDERS
+        }
@@ -0,0 +1,211 @@
+"""
+Structured meeting summaries for the meeting recorder application.
+
+In structured mode the model answers with a JSON object instead of prose:
+title, summary, key points, action items (task, owner, due date, status) and
+decisions. The output is validated and normalized against STRUCTURED_SUMMARY_SCHEMA
+here, without a JSON Schema library, so exports can store it and the archive
+can index action items and decisions for local queries.
+"""
+
+import re
+import json
+import datetime
+from typing import Any, Dict, List, Optional
+
+# JSON Schema of a structured summary, also sent to the model as the output contract
+STRUCTURED_SUMMARY_SCHEMA = {
+    "type": "object",
+    "required": ["title", "summary", "key_points", "action_items", "decisions"],
+    "properties": {
+        "title": {"type": "string"},
+        "summary": {"type": "string"},
+        "key_points": {"type": "array", "items": {"type": "string"}},
+        "action_items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["task"],
+                "properties": {
+                    "task": {"type": "string"},
+                    "owner": {"type": ["string", "null"]},
+                    "due_date": {"type": ["string", "null"], "description": "YYYY-MM-DD，未提及時為 null"},
+                    "status": {"type": "string", "enum": ["open", "done"]},
+                },
+            },
+        },
+        "decisions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["decision"],
+                "properties": {
+                    "decision": {"type": "string"},
+                    "context": {"type": ["string", "null"]},
+                },
+            },
+        },
+    },
+}
+
+STRUCTURED_SYSTEM_PROMPT = f"""你是一位專業的會議摘要專家，擅長從會議記錄中提取結構化信息。
+請只輸出一個符合以下 JSON Schema 的 JSON 對象，不要輸出任何其他文字或 Markdown 標記：
+
+{json.dumps(STRUCTURED_SUMMARY_SCHEMA, ensure_ascii=False, indent=2)}
+
+要求：
+- title: 簡潔明確的會議標題，如果已提供則使用
+- summary: 用 1-3 個段落概述會議的主要內容和目的
+- key_points: 5-8 個會議中討論的最重要觀點
+- action_items: 會議中確定的所有行動項目；owner 為負責人姓名，due_date 為 YYYY-MM-DD 格式的截止日期，未提及時為 null；status 在會議中已完成時為 "done"，否則為 "open"
+- decisions: 會議中做出的所有決定，context 為簡短的背景說明（可為 null）
+
+請使用繁體中文，不要編造會議記錄中沒有的信息；沒有相關內容的列表輸出空數組。"""
+
+_DATE = re.compile(r"^\s*(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?\s*$")
+
+
+class StructuredSummaryError(ValueError):
+    """模型輸出的結構化摘要無效。"""
+
+
+def _extract_json(text: str) -> Any:
+    """Parse the JSON object of a model answer, tolerating Markdown fences and text around it."""
+    text = (text or "").strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        raise StructuredSummaryError("模型輸出中沒有 JSON 對象")
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise StructuredSummaryError(f"模型輸出的 JSON 無法解析: {e}")
+
+
+def _optional_text(value: Any) -> Optional[str]:
+    """A stripped string, or None for empty values."""
+    if value is None:
+        return None
+    if not isinstance(value, (str, int, float)):
+        raise StructuredSummaryError(f"應為字符串: {value!r}")
+    value = str(value).strip()
+    return value or None
+
+
+def _normalize_date(value: Optional[str]) -> Optional[str]:
+    """Normalize a due date to YYYY-MM-DD, or None if it is not a calendar date (e.g. 下週五)."""
+    match = _DATE.match(value) if value else None
+    if match:
+        try:
+            return datetime.date(*map(int, match.groups())).isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def _list(data: Dict[str, Any], field: str) -> List[Any]:
+    """A required array field."""
+    items = data[field]
+    if not isinstance(items, list):
+        raise StructuredSummaryError(f"{field} 應為數組")
+    return items
+
+
+def _text_list(data: Dict[str, Any], field: str) -> List[str]:
+    """A list of non-empty strings."""
+    return [text for text in (_optional_text(item) for item in _list(data, field)) if text]
+
+
+def _object_list(data: Dict[str, Any], field: str, required: str) -> List[Dict[str, Any]]:
+    """A list of objects that all have a non-empty `required` field."""
+    items = _list(data, field)
+    for item in items:
+        if not isinstance(item, dict):
+            raise StructuredSummaryError(f"{field} 的元素應為對象: {item!r}")
+        if not _optional_text(item.get(required)):
+            raise StructuredSummaryError(f"{field} 的元素缺少 {required}: {item!r}")
+    return items
+
+
+def _action_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize an action item; a due date that is not a calendar date is kept in due_text instead of due_date."""
+    due = _optional_text(item.get("due_date"))
+    due_date = _normalize_date(due)
+    return {
+        "task": _optional_text(item["task"]),
+        "owner": _optional_text(item.get("owner")),
+        "due_date": due_date,
+        # Normalized summaries read back from exports already have the unparsed text here
+        "due_text": (due if due_date is None else None) or _optional_text(item.get("due_text")),
+        "status": "done" if str(item.get("status", "")).strip().lower() == "done" else "open",
+    }
+
+
+def validate_structured_summary(data: Any) -> Dict[str, Any]:
+    """
+    Validate a structured summary against STRUCTURED_SUMMARY_SCHEMA and normalize it.
+
+    Every required field must be present and every list item must be an object
+    with its required field. Due dates become YYYY-MM-DD; a due date that is not
+    a calendar date (e.g. 下週五) is kept as written in due_text, with due_date
+    None. Unknown fields are dropped.
+
+    Raises:
+        StructuredSummaryError: If the data does not match the schema
+    """
+    if not isinstance(data, dict):
+        raise StructuredSummaryError("結構化摘要應為 JSON 對象")
+    missing = [field for field in STRUCTURED_SUMMARY_SCHEMA["required"] if field not in data]
+    if missing:
+        raise StructuredSummaryError(f"結構化摘要缺少字段: {', '.join(missing)}")
+    action_items = [_action_item(item) for item in _object_list(data, "action_items", "task")]
+    decisions = [
+        {"decision": _optional_text(item["decision"]), "context": _optional_text(item.get("context"))}
+        for item in _object_list(data, "decisions", "decision")
+    ]
+    return {
+        "title": _optional_text(data.get("title")) or "",
+        "summary": _optional_text(data.get("summary")) or "",
+        "key_points": _text_list(data, "key_points"),
+        "action_items": action_items,
+        "decisions": decisions,
+    }
+
+
+def parse_structured_summary(text: str) -> Dict[str, Any]:
+    """Parse and validate a model answer in structured mode."""
+    return validate_structured_summary(_extract_json(text))
+
+
+def render_structured_summary(data: Dict[str, Any], participants: Optional[List[str]] = None) -> str:
+    """Render a structured summary in the sectioned text layout of the free-text summaries."""
+    lines = []
+    if data["title"]:
+        lines.append(f"會議標題：{data['title']}")
+    if participants:
+        lines.append(f"參與者：{', '.join(participants)}")
+    if data["summary"]:
+        lines.append(f"摘要：\n{data['summary']}")
+    if data["key_points"]:
+        lines.append("關鍵點：\n" + "\n".join(f"- {point}" for point in data["key_points"]))
+    if data["action_items"]:
+        items = []
+        for item in data["action_items"]:
+            details = []
+            if item["owner"]:
+                details.append(f"負責人: {item['owner']}")
+            if item["due_date"] or item.get("due_text"):
+                details.append(f"截止: {item['due_date'] or item['due_text']}")
+            if item["status"] == "done":
+                details.append("已完成")
+            details = "，".join(details)
+            items.append(f"- {item['task']}" + (f"（{details}）" if details else ""))
+        lines.append("行動項目：\n" + "\n".join(items))
+    if data["decisions"]:
+        lines.append("決策：\n" + "\n".join(
+            f"- {item['decision']}" + (f"（{item['context']}）" if item["context"] else "") for item in data["decisions"]
+        ))
+    return "\n".join(lines)
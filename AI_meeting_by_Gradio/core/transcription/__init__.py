@@ -1 +1,3 @@
 from .transcriber import Transcriber
+from .history import TranscriptHistory
+from .engines import TranscriptionEngine, TranscriptionError, get_engine
@@ -0,0 +1,204 @@
+"""
+Transcription engines for the meeting recorder application.
+
+An engine turns one audio file into text. The "openai" engine calls the
+Whisper API with the caller's client; the "local" engine runs a quantized
+Whisper model (faster-whisper, CTranslate2 int8) on the CPU of this node in a
+process pool sized to the available cores, so transcription keeps working when
+the upstream API is slow, saturated or unreachable. The "auto" engine uses the
+API and falls back to the local engine when the API call fails.
+"""
+
+import os
+import sys
+import threading
+import importlib.util
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import TRANSCRIPTION_CONFIG
+from utils.audio_pool import warm_up_workers
+
+
+class TranscriptionError(Exception):
+    """轉錄失敗，錯誤信息即返回給用戶的提示。"""
+
+
+class TranscriptionEngine(ABC):
+    """Base class of the transcription engines."""
+
+    name = ""
+
+    @abstractmethod
+    def transcribe(self, audio_path: str, model: str, language: Optional[str] = None, client=None) -> str:
+        """
+        Transcribe an audio file.
+
+        Args:
+            audio_path: Path to the audio file
+            model: Model name of the API engine (ignored by local engines)
+            language: Language code, or None for auto-detection
+            client: OpenAIClient bound to the caller's API key, used by API engines
+
+        Returns:
+            str: Transcript text
+        """
+
+
+class OpenAIEngine(TranscriptionEngine):
+    """Whisper API transcription."""
+
+    name = "openai"
+
+    def transcribe(self, audio_path: str, model: str, language: Optional[str] = None, client=None) -> str:
+        if client is None:
+            raise TranscriptionError("錯誤: 未設置 OpenAI API 密鑰，無法進行轉錄。請在環境變量或 .env 文件中設置 OPENAI_API_KEY。")
+        return client.transcribe(audio_path, model=model, language=language, response_format="text")
+
+
+# Model of the local worker process, loaded once by the pool initializer
+_local_model = None
+
+
+def _init_local_worker(model_size: str, compute_type: str, cpu_threads: int) -> None:
+    """Load the local Whisper model in a pool worker."""
+    global _local_model
+    from faster_whisper import WhisperModel
+    _local_model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _local_transcribe(audio_path: str, language: Optional[str], beam_size: int) -> str:
+    """Transcribe a file with the worker's model (runs in the pool worker)."""
+    segments, _ = _local_model.transcribe(audio_path, language=language, beam_size=beam_size, vad_filter=True)
+    return "".join(segment.text for segment in segments).strip()
+
+
+class LocalWhisperEngine(TranscriptionEngine):
+    """CPU transcription with faster-whisper in a process pool."""
+
+    name = "local"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the engine; the worker processes are started on first use.
+
+        Args:
+            config: Transcription settings (default: TRANSCRIPTION_CONFIG)
+        """
+        self.available = importlib.util.find_spec("faster_whisper") is not None
+        if not self.available:
+            print("警告: 未安裝 faster-whisper 套件，本地轉錄將無法執行")
+        self.config = dict(TRANSCRIPTION_CONFIG, **(config or {}))
+        self.cpu_threads = self.config["local_cpu_threads"]
+        # Workers x threads per worker should not exceed the cores of the node
+        self.workers = self.config["local_workers"] or max(1, (os.cpu_count() or 1) // self.cpu_threads)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use."""
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_local_worker,
+                    initargs=(self.config["local_model"], self.config["local_compute_type"], self.cpu_threads),
+                )
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next job starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def transcribe(self, audio_path: str, model: str, language: Optional[str] = None, client=None) -> str:
+        if not self.available:
+            raise TranscriptionError("錯誤: 本地轉錄需要安裝 faster-whisper 套件 (pip install faster-whisper)")
+        executor = self._get_executor()
+        future = executor.submit(_local_transcribe, audio_path, language, self.config["local_beam_size"])
+        try:
+            return future.result(timeout=self.config["local_timeout"])
+        except TimeoutError:
+            # A job already running cannot be stopped; a queued one is dropped
+            future.cancel()
+            raise TranscriptionError(f"本地轉錄超時（超過 {self.config['local_timeout']:.0f} 秒）")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next job starts a fresh pool
+            self._reset(executor)
+            raise TranscriptionError("本地轉錄進程異常退出（可能是內存不足），請稍後重試")
+
+    def warm_up(self, timeout: float = 600) -> int:
+        """Start every worker now, loading the model in each; returns the number of workers."""
+        if not self.available:
+            raise TranscriptionError("錯誤: 本地轉錄需要安裝 faster-whisper 套件 (pip install faster-whisper)")
+        return warm_up_workers(self._get_executor(), self.workers, timeout)
+
+    def shutdown(self) -> None:
+        """Stop the worker pool."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+class AutoEngine(TranscriptionEngine):
+    """Whisper API first, local CPU transcription when the API fails or no API key is available."""
+
+    name = "auto"
+
+    def __init__(self):
+        self.api = OpenAIEngine()
+        self._local = None
+
+    @property
+    def local(self) -> LocalWhisperEngine:
+        if self._local is None:
+            self._local = get_local_engine()
+        return self._local
+
+    def transcribe(self, audio_path: str, model: str, language: Optional[str] = None, client=None) -> str:
+        if client is not None:
+            try:
+                return self.api.transcribe(audio_path, model, language, client)
+            except Exception as e:
+                print(f"OpenAI 轉錄失敗，改用本地轉錄: {str(e)}")
+        return self.local.transcribe(audio_path, model, language)
+
+
+_local_engine = None
+_local_engine_lock = threading.Lock()
+
+
+def get_local_engine() -> LocalWhisperEngine:
+    """Get the process-wide local engine, so all transcribers share one worker pool."""
+    global _local_engine
+    with _local_engine_lock:
+        if _local_engine is None:
+            _local_engine = LocalWhisperEngine()
+        return _local_engine
+
+
+def get_engine(name: str = None) -> TranscriptionEngine:
+    """
+    Get a transcription engine by name.
+
+    Args:
+        name: "openai", "local" or "auto" (default: TRANSCRIPTION_CONFIG["engine"])
+    """
+    name = name or TRANSCRIPTION_CONFIG["engine"]
+    if name == "openai":
+        return OpenAIEngine()
+    if name == "local":
+        return get_local_engine()
+    if name == "auto":
+        return AutoEngine()
+    raise ValueError(f"不支持的轉錄引擎: {name}，可選: openai、local、auto")
@@ -0,0 +1,82 @@
+"""
+Transcript history for the meeting recorder application.
+
+History is kept per meeting/session id in the shared state store, so an
+export only contains the transcriptions of its own meeting. Sessions expire
+after a period without new transcriptions, and both the number of entries per
+session and the number of sessions are capped, so a long-running server keeps
+a bounded amount of history.
+"""
+
+import os
+import sys
+import time
+import datetime
+import threading
+from typing import Dict, List
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import HISTORY_CONFIG
+from utils.state_store import SharedStateStore, get_state_store
+
+
+class TranscriptHistory:
+    """Transcript history keyed by meeting/session id, with TTL and size-based eviction."""
+
+    NAMESPACE = "transcriptions"
+
+    def __init__(self, store: SharedStateStore = None, ttl: float = None, max_entries: int = None, max_sessions: int = None):
+        """
+        Initialize the history.
+
+        Args:
+            store: Shared state store (default: the process-wide store)
+            ttl: Seconds a session is kept after its last transcription
+            max_entries: Maximum transcriptions kept per session
+            max_sessions: Maximum sessions kept; the least recently updated are evicted first
+        """
+        self.store = store or get_state_store()
+        self.ttl = ttl if ttl is not None else HISTORY_CONFIG["ttl"]
+        self.max_entries = max_entries if max_entries is not None else HISTORY_CONFIG["max_entries_per_session"]
+        self.max_sessions = max_sessions if max_sessions is not None else HISTORY_CONFIG["max_sessions"]
+        self.evict_interval = HISTORY_CONFIG["evict_interval"]
+        self._last_evict = 0.0
+        self._evict_lock = threading.Lock()
+
+    def add(self, session_id: str, text: str) -> None:
+        """Add a transcription to a session."""
+        self.store.append(self.NAMESPACE, session_id, {
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "text": text
+        }, max_items=self.max_entries)
+        self._maybe_evict()
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        """Get the transcriptions of a session, oldest first."""
+        updated_at = self.store.list_updated_at(self.NAMESPACE, session_id)
+        if updated_at is None:
+            return []
+        if self.ttl and updated_at < time.time() - self.ttl:
+            self.store.clear_list(self.NAMESPACE, session_id)
+            return []
+        return self.store.get_list(self.NAMESPACE, session_id)
+
+    def clear(self, session_id: str) -> None:
+        """Remove all transcriptions of a session."""
+        self.store.clear_list(self.NAMESPACE, session_id)
+
+    def evict(self) -> int:
+        """Drop expired sessions and sessions beyond the size limit. Returns how many were dropped."""
+        return self.store.evict_lists(self.NAMESPACE, max_age=self.ttl or None, max_keys=self.max_sessions or None)
+
+    def _maybe_evict(self) -> None:
+        """Run eviction at most once per `evict_interval` seconds in this process."""
+        now = time.time()
+        if now - self._last_evict < self.evict_interval:
+            return
+        with self._evict_lock:
+            if now - self._last_evict < self.evict_interval:
+                return
+            self._last_evict = now
+        self.evict()
@@ -1,43 +1,66 @@
 import os
-import openai
-import datetime
 import sys
 from pathlib import Path
 
 # 添加項目根目錄到 Python 路徑
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import TRANSCRIPTION_CONFIG
 from utils.config import Config
+from utils.openai_client import get_default_client
+from utils.state_store import get_state_store
+from utils.single_flight import SingleFlight
+from utils.audio_utils import chunk_count, get_audio_duration, split_audio_file, combine_transcriptions, hash_file
+from utils.scratch import get_scratch_space
+from utils.audio_pool import get_audio_pool
+from utils.quota import key_id
+from core.transcription.history import TranscriptHistory
+from core.transcription.engines import TranscriptionError, get_engine
 
 class Transcriber:
-    """音頻轉錄器類，使用 OpenAI Whisper API 將音頻轉換為文本。"""
+    """音頻轉錄器類，使用 OpenAI Whisper API 或本機 CPU 模型將音頻轉換為文本。"""
+
+    # 長錄音各分段的轉錄結果（檢查點）保存在共享狀態存儲的這個命名空間中
+    CHECKPOINT_NAMESPACE = "transcription_chunks"
 
     def __init__(self):
         """初始化轉錄器。"""
         self.config = Config()
         self.api_key_set = self._force_set_api_key()
-        self.transcriptions = []
+        # 轉錄歷史按會議/會話 ID 保存在共享狀態存儲中，多個工作進程看到的是同一份記錄
+        self.history = TranscriptHistory()
+        self.default_session_id = "default"
+        # 轉錄引擎由 TRANSCRIPTION_CONFIG["engine"] 選擇
+        self.engine = get_engine(self.config.get_openai_config()["transcription_engine"])
+        self.state_store = get_state_store()
+        # 同時進行的相同轉錄請求（相同文件內容和參數）只轉錄一次
+        self.flights = SingleFlight("transcription")
 
     def _force_set_api_key(self):
-        """設置 OpenAI API 密鑰。"""
+        """檢查是否設置了服務器默認的 OpenAI API 密鑰。"""
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
-            print("警告: 未設置 OPENAI_API_KEY 環境變量，轉錄功能將無法使用")
+            print("警告: 未設置 OPENAI_API_KEY 環境變量，未提供客戶端的轉錄請求將無法執行")
             return False
-        openai.api_key = api_key
         return True
 
-    def transcribe_audio(self, audio_path):
+    def transcribe_audio(self, audio_path, client=None, session_id=None, on_chunk=None):
         """
         將音頻文件轉錄為文本。
         
         參數:
             audio_path (str): 音頻文件的路徑。
+            client (OpenAIClient, optional): 綁定調用者 API 密鑰的客戶端，未提供時使用服務器默認密鑰。
+            session_id (str, optional): 會議/會話 ID，轉錄結果保存到該會話的歷史記錄中。
+            on_chunk (callable, optional): 每個分段轉錄完成時調用 on_chunk(分段序號, 分段總數, 分段文本)，用於逐步顯示結果。
             
         返回:
             str: 轉錄的文本。
+
+        異常:
+            TranscriptionError: 轉錄失敗，錯誤信息即返回給用戶的提示；失敗的結果不會保存到會話歷史中。
         """
-        if not self.api_key_set:
-            return "錯誤: 未設置 OpenAI API 密鑰，無法進行轉錄。請在環境變量或 .env 文件中設置 OPENAI_API_KEY。"
+        if client is None:
+            client = get_default_client()
             
         try:
             # 獲取配置
@@ -46,48 +69,116 @@ class Transcriber:
             
             # 檢查文件是否存在
             if not os.path.exists(audio_path):
-                return f"錯誤: 音頻文件不存在: {audio_path}"
-            
-            # 讀取音頻文件
-            audio_file = open(audio_path, "rb")
-            
-            # 調用 OpenAI API 進行轉錄
-            transcription_params = {
-                "model": model,
-                "file": audio_file,
-                "response_format": "text"
-            }
-            
-            # 添加語言參數
-            if language != "auto":
-                transcription_params["language"] = language
+                raise TranscriptionError(f"錯誤: 音頻文件不存在: {audio_path}")
             
-            # 執行轉錄
-            transcript = openai.Audio.transcribe(**transcription_params)
+            # 使用配置的引擎進行轉錄（自動檢測語言時不傳語言參數）
+            language = language if language != "auto" else None
+            # 哈希和分段等 CPU 密集的音頻處理在音頻進程池中執行，只傳遞文件路徑
+            file_hash = get_audio_pool().run(hash_file, audio_path)
+            transcript = self.flights.do(
+                # 只合併同一 API 密鑰的請求，否則無效或超出配額的密鑰也能拿到別人付費的結果
+                f"{file_hash}:{self._tenant(client)}:{self.engine.name}:{model}:{language}",
+                self._transcribe_chunked,
+                audio_path,
+                model,
+                language,
+                client,
+                file_hash,
+                on_chunk
+            )
             
             # 保存轉錄結果
-            self.add_transcription(transcript)
+            self.add_transcription(transcript, session_id)
             
             return transcript
                 
+        except TranscriptionError:
+            raise
         except Exception as e:
-            return f"轉錄過程中發生錯誤: {str(e)}"
+            raise TranscriptionError(f"轉錄過程中發生錯誤: {str(e)}") from e
             
-    def add_transcription(self, text):
-        """添加轉錄結果到歷史記錄。"""
-        self.transcriptions.append({
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "text": text
-        })
+    def _transcribe_chunked(self, audio_path, model, language, client, file_hash=None, on_chunk=None):
+        """
+        轉錄音頻，長錄音按 TRANSCRIPTION_CONFIG["chunk_duration"] 分段轉錄。
+
+        每個分段完成後立即按「文件內容哈希 + API 密鑰 + 轉錄參數 + 分段序號」保存到共享狀態存儲中，
+        其他 API 密鑰的調用者不會得到由別人付費的分段。
+        某個分段失敗時其餘分段照常轉錄，之後重試（或重啟後的任務）只會轉錄缺失的分段，
+        再通過 combine_transcriptions 合併。相鄰分段重疊 TRANSCRIPTION_CONFIG["chunk_overlap"] 秒，
+        合併時對齊重疊部分的文字，邊界上的詞句既不會丟失也不會重複。
+        """
+        def report(index, total, text):
+            if on_chunk is not None:
+                on_chunk(index, total, text)
+
+        chunk_duration = TRANSCRIPTION_CONFIG["chunk_duration"]
+        overlap = TRANSCRIPTION_CONFIG["chunk_overlap"]
+        duration = get_audio_duration(audio_path)
+        if duration <= chunk_duration:
+            transcript = self.engine.transcribe(audio_path, model=model, language=language, client=client)
+            report(0, 1, transcript)
+            return transcript
+
+        job = f"{file_hash or get_audio_pool().run(hash_file, audio_path)}:{self._tenant(client)}:{self.engine.name}:{model}:{language}:{chunk_duration}:{overlap:g}"
+        num_chunks = chunk_count(duration, chunk_duration, overlap)
+        texts = [self.state_store.get(self.CHECKPOINT_NAMESPACE, f"{job}:{i}") for i in range(num_chunks)]
+        if all(text is not None for text in texts):
+            for i, text in enumerate(texts):
+                report(i, num_chunks, text)
+            return combine_transcriptions(texts, overlap)
+
+        # 分段目錄由當前進程創建和釋放，分段文件不受進程池中工作進程退出的影響
+        scratch = get_scratch_space()
+        chunk_dir = scratch.mkdtemp("chunks")
+        failed, last_error = 0, None
+        try:
+            chunk_files = get_audio_pool().run(split_audio_file, audio_path, chunk_duration, chunk_dir, overlap)
+            if len(chunk_files) != num_chunks:
+                # 無法分段時整個文件作為一個分段轉錄
+                transcript = self.engine.transcribe(audio_path, model=model, language=language, client=client)
+                report(0, 1, transcript)
+                return transcript
+
+            for i, chunk_file in enumerate(chunk_files):
+                if texts[i] is not None:
+                    report(i, num_chunks, texts[i])
+                    continue
+                try:
+                    texts[i] = self.engine.transcribe(chunk_file, model=model, language=language, client=client)
+                except TranscriptionError:
+                    raise
+                except Exception as e:
+                    print(f"分段 {i + 1}/{num_chunks} 轉錄失敗: {str(e)}")
+                    failed, last_error = failed + 1, e
+                    continue
+                self.state_store.set(self.CHECKPOINT_NAMESPACE, f"{job}:{i}", texts[i], ttl=TRANSCRIPTION_CONFIG["checkpoint_ttl"])
+                report(i, num_chunks, texts[i])
+        finally:
+            scratch.release(chunk_dir)
+
+        if failed:
+            raise TranscriptionError(
+                f"轉錄過程中發生錯誤: {failed}/{num_chunks} 個分段轉錄失敗（已完成的分段已保存，重試時只會轉錄失敗的分段）: {str(last_error)}"
+            )
+        return combine_transcriptions(texts, overlap)
+
+    @staticmethod
+    def _tenant(client):
+        """客戶端所屬 API 密鑰的標識（不含密鑰本身），沒有客戶端時為 None。"""
+        return key_id(client.api_key) if client is not None else None
+
+    def add_transcription(self, text, session_id=None):
+        """添加轉錄結果到會話的歷史記錄。"""
+        self.history.add(session_id or self.default_session_id, text)
         
-    def get_all_transcriptions(self):
-        """獲取所有轉錄結果。"""
-        return self.transcriptions
+    def get_all_transcriptions(self, session_id=None):
+        """獲取會話的所有轉錄結果。"""
+        return self.history.get(session_id or self.default_session_id)
         
-    def get_combined_text(self):
-        """獲取所有轉錄結果合併為一個文本。"""
-        return "\n".join([t["text"] for t in self.transcriptions])
+    def get_combined_text(self, session_id=None):
+        """獲取會話的所有轉錄結果合併為一個文本。"""
+        return "\n".join([t["text"] for t in self.get_all_transcriptions(session_id)])
         
-    def clear_transcriptions(self):
-        """清空轉錄歷史記錄。"""
-        self.transcriptions = []
+    def clear_transcriptions(self, session_id=None):
+        """清空會話的轉錄歷史記錄。"""
+        self.history.clear(session_id or self.default_session_id)
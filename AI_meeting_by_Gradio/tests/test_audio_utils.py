@@ -0,0 +1,83 @@
+"""
+Behavior tests for splitting recordings into chunks and stitching their transcriptions.
+"""
+
+import os
+import sys
+import wave
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.audio_utils import chunk_count, get_audio_duration, split_audio_file, stitch_transcriptions
+
+RATE = 8000
+
+
+def write_wav(path, seconds):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(b"\0\0" * int(seconds * RATE))
+    return str(path)
+
+
+def test_short_remainder_is_folded_into_the_previous_chunk(tmp_path):
+    audio = write_wav(tmp_path / "meeting.wav", 21)
+    out = tmp_path / "chunks"
+    out.mkdir()
+    chunks = split_audio_file(audio, max_duration=10, output_dir=str(out), overlap=3)
+    assert [round(get_audio_duration(chunk), 2) for chunk in chunks] == [13, 11]
+    assert chunk_count(21, 10, 3) == len(chunks)
+
+
+def test_long_remainder_keeps_its_own_chunk(tmp_path):
+    audio = write_wav(tmp_path / "meeting.wav", 25)
+    out = tmp_path / "chunks"
+    out.mkdir()
+    chunks = split_audio_file(audio, max_duration=10, output_dir=str(out), overlap=3)
+    assert [round(get_audio_duration(chunk), 2) for chunk in chunks] == [13, 13, 5]
+    assert chunk_count(25, 10, 3) == len(chunks)
+
+
+def test_chunk_count():
+    assert chunk_count(9, 10, 3) == 1
+    assert chunk_count(12, 10, 3) == 1
+    assert chunk_count(14, 10, 3) == 2
+    assert chunk_count(21, 10, 0) == 3
+
+
+def test_stitch_keeps_overlapping_words_once():
+    previous = "今天先討論第三季度的市場計劃，我們下週五之前完成預算審"
+    following = "前完成預算審核，然後再開會討論人手安排。"
+    assert stitch_transcriptions(previous, following, overlap=3, min_match=4) == (
+        "今天先討論第三季度的市場計劃，我們下週五之前完成預算審核，然後再開會討論人手安排。"
+    )
+
+
+def test_stitch_ignores_case_and_punctuation():
+    previous = "Let's review the budget for the next quarter before Friday"
+    following = "next Quarter, before Friday. Then we meet again."
+    assert stitch_transcriptions(previous, following, overlap=3) == (
+        "Let's review the budget for the next quarter before Friday. Then we meet again."
+    )
+
+
+def test_stitch_does_not_search_text_spoken_before_the_overlap():
+    previous = "首先確認預算審核時間表" + "接下來請各部門負責人依次匯報本月的工作進展和遇到的困難以及需要協調的事項" + "最後是預算審核"
+    following = "預算審核時間表已經發出，請大家查收。"
+    assert stitch_transcriptions(previous, following, overlap=3, min_match=4) == (
+        previous + "時間表已經發出，請大家查收。"
+    )
+
+
+def test_stitch_prefers_the_match_nearest_the_seam():
+    previous = "預算審核由財務部負責，然後預算審核"
+    following = "預算審核結果下週公佈"
+    assert stitch_transcriptions(previous, following, overlap=3, min_match=4) == (
+        previous + "結果下週公佈"
+    )
+
+
+def test_stitch_without_common_text_returns_none():
+    assert stitch_transcriptions("今天的會議到此結束", "下一個議題是招聘計劃", overlap=3) is None
@@ -0,0 +1,87 @@
+"""
+Behavior tests for the transcript compactor.
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.summary.compactor import TranscriptCompactor
+
+
+@pytest.fixture
+def compact():
+    compactor = TranscriptCompactor({"enabled": True})
+    return lambda text: compactor.compact(text)[0]
+
+
+@pytest.mark.parametrize("text", [
+    "這次預算金額是一百萬，額外費用另計。",
+    "討論額度問題",
+    "唔好再改了，唔係我的意思。",
+])
+def test_interjection_characters_inside_words_are_kept(compact, text):
+    assert compact(text) == text
+
+
+def test_standalone_interjections_are_removed(compact):
+    assert compact("嗯，我們開始吧。") == "我們開始吧。"
+    assert compact("額，這個方案可以。") == "這個方案可以。"
+    assert compact("我覺得呃可以") == "我覺得可以"
+
+
+def test_discourse_fillers_are_removed_only_as_a_clause(compact):
+    assert compact("那個，我們下週再談。") == "我們下週再談。"
+    assert compact("那個方案不錯。") == "那個方案不錯。"
+
+
+@pytest.mark.parametrize("text", [
+    "價格是 100 100 元",
+    "1 1 2 3 3",
+    "I think that that is wrong",
+    "He had had enough.",
+])
+def test_meaningful_repeats_are_kept(compact, text):
+    assert compact(text) == text
+
+
+def test_stuttered_repeats_are_collapsed(compact):
+    assert compact("I think I think we should ship.") == "I think we should ship."
+    assert compact("the the the plan is fine") == "the plan is fine"
+    assert compact("我們我們我們明天開會") == "我們明天開會"
+
+
+@pytest.mark.parametrize("text", [
+    "謝謝大家，我們看看。",
+    "大家一個一個來發言",
+    "我們研究研究再說",
+    "就是說，就是說這個不行",
+])
+def test_reduplication_is_kept(compact, text):
+    assert compact(text) == text
+
+
+def test_repeated_sentences_are_dropped(compact):
+    assert compact("會議開始了。會議開始了。請大家發言。") == "會議開始了。請大家發言。"
+
+
+@pytest.mark.parametrize("text", [
+    "王經理同意嗎？同意。李經理呢？同意。",
+    "同意。同意。",
+    "好。好。對。對。",
+    "會議開始了。請大家發言。會議開始了。",
+])
+def test_short_or_non_adjacent_repeated_sentences_are_kept(compact, text):
+    assert compact(text) == text
+
+
+def test_segment_overlap_is_removed(compact):
+    assert compact("我們需要在週五之前完成\n週五之前完成測試工作") == "我們需要在週五之前完成\n測試工作"
+
+
+def test_disabled_compactor_returns_text_unchanged():
+    text = "嗯，那個，我們我們開始。"
+    assert TranscriptCompactor({"enabled": False}).compact(text)[0] == text
@@ -0,0 +1,169 @@
+"""
+Work-aware admission control for the meeting recorder application.
+
+Every accepted request registers its estimated work in seconds (from the
+audio duration and transcript length) in the shared state store, so all
+worker processes see the total committed work. A new request is admitted only
+if the committed work, drained at the configured capacity, plus its own work
+still finishes within the latency SLO; otherwise it waits briefly for room and
+is then rejected with a retry hint. Rejecting early keeps the latency of the
+accepted requests stable under bursts instead of letting every request time
+out.
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import contextvars
+from typing import Any, Dict, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ADMISSION_CONFIG, PREFLIGHT_CONFIG, QUOTA_CONFIG, SUMMARY_CONFIG, TRANSCRIPTION_CONFIG
+from utils.state_store import SharedStateStore, get_state_store
+
+
+class Overloaded(Exception):
+    """服務繁忙，無法在 SLO 內完成新請求，錯誤信息即返回給用戶的提示。"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"服務繁忙，請在 {int(retry_after) + 1} 秒後重試")
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """The registered work of one admitted request, held until the request finishes."""
+
+    def __init__(self, controller: "AdmissionController", key: str, cost: float):
+        self.controller = controller
+        self.key = key
+        self.cost = cost
+
+    def refine(self, cost: float) -> None:
+        """Replace the ingress estimate with a better one, e.g. once the audio duration is known."""
+        self.cost = cost
+        self.controller._register(self.key, cost)
+
+    def release(self) -> None:
+        """Remove the request's work from the committed work."""
+        self.controller.store.delete(self.controller.NAMESPACE, self.key)
+
+
+# Ticket of the request being handled, so handlers can refine its cost
+current_ticket: contextvars.ContextVar = contextvars.ContextVar("admission_ticket", default=None)
+
+
+def refine_current_cost(cost: float) -> None:
+    """Update the estimated work of the current request, if it went through admission control."""
+    ticket = current_ticket.get()
+    if ticket is not None:
+        ticket.refine(cost)
+
+
+class AdmissionController:
+    """Admits requests while the committed work can finish within the SLO."""
+
+    NAMESPACE = "admission_work"
+
+    def __init__(self, store: SharedStateStore = None, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the controller.
+
+        Args:
+            store: Shared state store (default: the process-wide store)
+            config: Admission settings (default: ADMISSION_CONFIG)
+        """
+        self.store = store or get_state_store()
+        self.config = dict(ADMISSION_CONFIG, **(config or {}))
+
+    def estimate_cost(self, audio_seconds: float = 0, prompt_tokens: int = 0, summary: bool = False) -> float:
+        """
+        Estimate the work of a request in seconds.
+
+        Args:
+            audio_seconds: Seconds of audio to transcribe
+            prompt_tokens: Tokens of the transcript to summarize
+            summary: Whether the request also summarizes; without prompt_tokens the
+                transcript length is estimated from the audio duration
+        """
+        cost = self.config["base_cost"]
+        if audio_seconds:
+            local = TRANSCRIPTION_CONFIG["engine"] == "local"
+            cost += audio_seconds * PREFLIGHT_CONFIG["local_realtime_factor" if local else "openai_realtime_factor"]
+        if summary and not prompt_tokens:
+            prompt_tokens = audio_seconds * QUOTA_CONFIG["tokens_per_audio_second"]
+        if prompt_tokens:
+            provider = SUMMARY_CONFIG["provider"] if SUMMARY_CONFIG["provider"] != "auto" else "openai"
+            cost += prompt_tokens / 1000 * SUMMARY_CONFIG[f"{provider}_seconds_per_ktoken"]
+        return cost
+
+    def _register(self, key: str, cost: float) -> None:
+        """Store the work of an admitted request; the TTL releases it if the worker dies."""
+        self.store.set(self.NAMESPACE, key, {"cost": cost, "started_at": time.time()}, ttl=self.config["work_ttl"])
+
+    def outstanding(self) -> float:
+        """Estimated seconds of committed work that has not finished yet, across all processes."""
+        now = time.time()
+        return sum(
+            # Work that has run longer than estimated still occupies capacity
+            max(work["cost"] - (now - work["started_at"]), self.config["base_cost"])
+            for work in self.store.items(self.NAMESPACE).values()
+        )
+
+    def try_admit(self, cost: float):
+        """
+        Admit a request if it can finish within the SLO.
+
+        Returns:
+            Tuple of the ticket (None if rejected) and the seconds until it may fit
+        """
+        if not self.config["enabled"]:
+            return AdmissionTicket(self, "", cost), 0.0
+        with self.store.transaction():
+            outstanding = self.outstanding()
+            predicted = outstanding / self.config["capacity"] + cost
+            # An idle server accepts any request, however long, so large jobs are never starved
+            if outstanding and predicted > self.config["slo_seconds"]:
+                return None, predicted - self.config["slo_seconds"]
+            key = uuid.uuid4().hex
+            self._register(key, cost)
+        return AdmissionTicket(self, key, cost), 0.0
+
+    async def admit(self, cost: float) -> AdmissionTicket:
+        """
+        Admit a request, waiting up to the defer timeout for committed work to drain.
+
+        Raises:
+            Overloaded: If the request still cannot finish within the SLO
+        """
+        deadline = time.time() + self.config["defer_timeout"]
+        while True:
+            ticket, retry_after = await asyncio.to_thread(self.try_admit, cost)
+            if ticket is not None:
+                return ticket
+            if time.time() + self.config["poll_interval"] > deadline:
+                raise Overloaded(retry_after)
+            await asyncio.sleep(self.config["poll_interval"])
+
+    def stats(self) -> Dict[str, float]:
+        """Committed work and predicted latency, for diagnostics."""
+        outstanding = self.outstanding()
+        return {
+            "requests": len(self.store.keys(self.NAMESPACE)),
+            "outstanding_seconds": outstanding,
+            "predicted_wait_seconds": outstanding / self.config["capacity"],
+            "slo_seconds": self.config["slo_seconds"],
+        }
+
+
+_admission_controller = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the process-wide admission controller."""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
@@ -0,0 +1,174 @@
+"""
+Process pool for CPU-bound audio work in the meeting recorder application.
+
+Hashing, splitting and preflighting audio files run in a pool of worker
+processes, so they use every core instead of competing for the GIL with
+request handling, and never stall the API's event loop. Jobs receive file
+paths and return paths or small values; audio data is read and written by
+the workers themselves and is never pickled between processes. With memory
+accounting enabled, each job reports the peak RSS of the worker that ran it.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import AUDIO_POOL_CONFIG
+from utils.memory import get_memory_tracker, memory_stage, peak_rss_bytes
+
+_MB = 1024 * 1024
+
+
+def _worker_pid(delay: float) -> int:
+    """No-op job that starts a worker process; the short sleep lets every worker take one."""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def warm_up_workers(executor: ProcessPoolExecutor, workers: int, timeout: float) -> int:
+    """
+    Start every worker of a process pool and wait until each has answered.
+
+    Workers still running their initializer (e.g. loading a model) take no jobs,
+    so no-op jobs are sent until every worker has run one or the timeout passes.
+
+    Returns:
+        int: The number of workers seen
+
+    Raises:
+        RuntimeError: If fewer workers than configured answered before the timeout
+    """
+    pids, deadline = set(), time.time() + timeout
+    while len(pids) < workers and time.time() < deadline:
+        pids.update(executor.map(_worker_pid, [0.05] * workers))
+    if len(pids) < workers:
+        raise RuntimeError(f"只有 {len(pids)}/{workers} 個工作進程在 {timeout:.0f} 秒內就緒")
+    return len(pids)
+
+
+def _measured_call(fn: Callable[..., Any], args: tuple, kwargs: dict) -> tuple:
+    """Run a job in a worker and return (result, worker peak RSS before, worker peak RSS after)."""
+    peak_before = peak_rss_bytes()
+    result = fn(*args, **kwargs)
+    return result, peak_before, peak_rss_bytes()
+
+
+class AudioProcessPool:
+    """Runs module-level audio functions in worker processes."""
+
+    def __init__(self, workers: Optional[int] = None, enabled: Optional[bool] = None):
+        """
+        Initialize the pool; the worker processes are started on first use.
+
+        Args:
+            workers: Number of worker processes (default from AUDIO_POOL_CONFIG, 0 = CPU count)
+            enabled: Whether to use worker processes at all; disabled pools run jobs in the calling thread
+        """
+        self.workers = (workers if workers is not None else AUDIO_POOL_CONFIG["workers"]) or os.cpu_count() or 1
+        self.enabled = enabled if enabled is not None else AUDIO_POOL_CONFIG["enabled"]
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use."""
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next job starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` in a worker process and wait for the result.
+
+        `fn` must be a module-level function and its arguments paths or other small values.
+        If a worker dies (e.g. killed for memory), the job is retried once on a fresh pool;
+        it is never run in the calling process, which the same job could take down.
+        """
+        if not self.enabled:
+            with memory_stage(fn.__name__):
+                return fn(*args, **kwargs)
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                started = time.perf_counter()
+                return self._unwrap(fn, started, executor.submit(_measured_call, fn, args, kwargs).result())
+            except BrokenProcessPool as e:
+                self._broken(fn, executor, attempt, e)
+
+    async def run_async(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Like `run`, but waits without blocking the event loop."""
+        if not self.enabled:
+            with memory_stage(fn.__name__):
+                return await asyncio.to_thread(fn, *args, **kwargs)
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                started = time.perf_counter()
+                return self._unwrap(fn, started, await asyncio.wrap_future(executor.submit(_measured_call, fn, args, kwargs)))
+            except BrokenProcessPool as e:
+                self._broken(fn, executor, attempt, e)
+
+    def _broken(self, fn: Callable[..., Any], executor: ProcessPoolExecutor, attempt: int, error: BrokenProcessPool) -> None:
+        """Restart a pool whose worker died; raise once the job has failed on a fresh pool as well."""
+        self._reset(executor)
+        if attempt:
+            raise RuntimeError(f"音頻處理進程異常退出（可能是內存不足），無法完成 {fn.__name__}") from error
+        # The pool may have broken on another job; retry this one once on a fresh pool
+        print(f"音頻處理進程異常退出，在新的進程池中重試 {fn.__name__}")
+
+    @staticmethod
+    def _unwrap(fn: Callable[..., Any], started: float, measured: tuple) -> Any:
+        """Record the worker's memory figures of a job and return its result."""
+        result, peak_before, peak_after = measured
+        get_memory_tracker().record({
+            "stage": fn.__name__,
+            "seconds": round(time.perf_counter() - started, 3),
+            "worker_peak_rss_mb": round(peak_after / _MB, 2),
+            "worker_peak_growth_mb": round((peak_after - peak_before) / _MB, 2),
+        })
+        return result
+
+    def warm_up(self, timeout: float = 60) -> int:
+        """Start every worker process now instead of on the first jobs; returns the number of workers."""
+        if not self.enabled:
+            return 0
+        return warm_up_workers(self._get_executor(), self.workers, timeout)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_audio_pool = None
+_audio_pool_lock = threading.Lock()
+
+
+def get_audio_pool() -> AudioProcessPool:
+    """Get the process-wide audio pool."""
+    global _audio_pool
+    with _audio_pool_lock:
+        if _audio_pool is None:
+            _audio_pool = AudioProcessPool()
+        return _audio_pool
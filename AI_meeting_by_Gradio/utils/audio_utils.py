@@ -3,9 +3,28 @@ Audio processing utilities for the meeting recorder application.
 """
 
 import os
-import tempfile
+import sys
+import math
+import array
+import struct
+import hashlib
 import wave
-from typing import List
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from .scratch import get_scratch_space
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PREFLIGHT_CONFIG, TRANSCRIPTION_CONFIG
+
+# Bytes read from the start of a file to sniff its container
+_HEADER_BYTES = 4096
+
+# Speech rates that bound the text searched at a seam: CJK characters and Latin letters or digits per second
+_STITCH_CJK_PER_SECOND = 6
+_STITCH_LETTERS_PER_SECOND = 15
+# Margin over those rates for fast speakers and words cut off at the edge of a chunk
+_STITCH_WINDOW_SLACK = 1.5
 
 def get_audio_duration(audio_file: str) -> float:
     """Get the duration of an audio file in seconds."""
@@ -19,22 +38,55 @@ def get_audio_duration(audio_file: str) -> float:
         print(f"Error getting audio duration: {str(e)}")
         return 0
 
-def split_audio_file(audio_file: str, max_duration: int = 600) -> List[str]:
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """Get the SHA-256 hex digest of a file's content, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_count(duration: float, max_duration: float, overlap: float = 0) -> int:
+    """
+    Get the number of chunks `split_audio_file` cuts a recording into.
+    
+    A final remainder no longer than `overlap` is already contained in the previous
+    chunk's overlap, so it is folded into that chunk instead of becoming a chunk of its own.
+    """
+    if duration <= max_duration:
+        return 1
+    num_chunks = math.ceil(duration / max_duration)
+    if duration - (num_chunks - 1) * max_duration <= overlap:
+        num_chunks -= 1
+    return num_chunks
+
+def split_audio_file(audio_file: str, max_duration: int = 600, output_dir: Optional[str] = None,
+                     overlap: float = 0) -> List[str]:
     """
     Split a large audio file into smaller chunks of specified maximum duration.
     
+    Chunk i starts at i * max_duration; every chunk but the last also contains the
+    first `overlap` seconds of the next one, so words spoken across a boundary are
+    complete in at least one chunk. A final remainder of at most `overlap` seconds
+    is folded into the last chunk (see `chunk_count`).
+    
     Args:
         audio_file: Path to the audio file to split
         max_duration: Maximum duration of each chunk in seconds (default: 10 minutes)
+        output_dir: Directory for the chunks, owned by the caller; pass one when splitting in
+            another process, so the chunks outlive that process
+        overlap: Seconds each chunk extends into the next one (default: no overlap)
         
     Returns:
-        List of paths to the split audio files
+        List of paths to the split audio files. Without `output_dir`, the chunks share one
+        scratch directory that the caller must release with `get_scratch_space().release(...)`.
     """
     # Check if audio_file is None or doesn't exist
     if audio_file is None or not os.path.exists(audio_file):
         print(f"Audio file is None or doesn't exist: {audio_file}")
         return []
     
+    temp_dir = None
     try:
         duration = get_audio_duration(audio_file)
         
@@ -43,7 +95,7 @@ def split_audio_file(audio_file: str, max_duration: int = 600) -> List[str]:
             return [audio_file]
         
         # Calculate number of chunks needed
-        num_chunks = int(duration / max_duration) + 1
+        num_chunks = chunk_count(duration, max_duration, overlap)
         chunk_files = []
         
         # Get audio properties
@@ -52,50 +104,475 @@ def split_audio_file(audio_file: str, max_duration: int = 600) -> List[str]:
             sample_width = wf.getsampwidth()
             framerate = wf.getframerate()
             
-        # Create a directory for the chunks if it doesn't exist
-        temp_dir = tempfile.mkdtemp()
+        # Create a scratch directory for the chunks unless the caller provided one; the caller releases it when done
+        if output_dir is None:
+            scratch = get_scratch_space()
+            temp_dir = scratch.mkdtemp("chunks")
+        chunk_dir = output_dir or temp_dir
         
-        # Split the audio file using wave module
-        for i in range(num_chunks):
-            start_time = i * max_duration
-            end_time = min((i + 1) * max_duration, duration)
-            chunk_duration = end_time - start_time
-            
-            # Create a temporary file for this chunk
-            chunk_file = os.path.join(temp_dir, f"chunk_{i}.wav")
-            chunk_files.append(chunk_file)
-            
-            # Use wave module to extract the chunk
-            with wave.open(audio_file, 'rb') as wf:
+        # Split the audio file using wave module, copying each chunk in blocks
+        block_frames = max(1, framerate * 10)
+        with wave.open(audio_file, 'rb') as wf:
+            for i in range(num_chunks):
+                start_time = i * max_duration
+                end_time = duration if i == num_chunks - 1 else min((i + 1) * max_duration + overlap, duration)
+                
+                # Create a temporary file for this chunk
+                chunk_file = os.path.join(chunk_dir, f"chunk_{i}.wav")
+                chunk_files.append(chunk_file)
+                
                 # Skip to the start position
                 wf.setpos(int(start_time * framerate))
-                
-                # Read the chunk data
-                chunk_frames = int(chunk_duration * framerate)
-                chunk_data = wf.readframes(chunk_frames)
+                remaining = int(end_time * framerate) - int(start_time * framerate)
                 
                 # Write the chunk to a new file
                 with wave.open(chunk_file, 'wb') as chunk_wf:
                     chunk_wf.setnchannels(channels)
                     chunk_wf.setsampwidth(sample_width)
                     chunk_wf.setframerate(framerate)
-                    chunk_wf.writeframes(chunk_data)
+                    while remaining > 0:
+                        chunk_data = wf.readframes(min(block_frames, remaining))
+                        if not chunk_data:
+                            break
+                        chunk_wf.writeframesraw(chunk_data)
+                        remaining -= len(chunk_data) // (channels * sample_width)
         
         return chunk_files
     except Exception as e:
         print(f"Error splitting audio file: {str(e)}")
+        if temp_dir is not None:
+            scratch.release(temp_dir)
         # Return the original file if there's an error
         return [audio_file] if audio_file else []
 
-def combine_transcriptions(transcriptions: List[str]) -> str:
+class AudioPreflightError(Exception):
+    """音頻預檢失敗，錯誤信息即返回給用戶的提示。"""
+
+def sniff_audio_format(header: bytes) -> Optional[str]:
+    """Identify the audio container from the first bytes of a file, regardless of its name or content type."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[4:8] == b"ftyp":
+        return "m4a"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+def _window_db(samples, full_scale: float, offset: float = 0.0) -> float:
+    """Loudness of a window of samples in dBFS."""
+    if not samples:
+        return float("-inf")
+    rms = math.sqrt(sum((x - offset) * (x - offset) for x in samples) / len(samples)) / full_scale
+    return 20 * math.log10(rms) if rms > 0 else float("-inf")
+
+def _probe_wav(f: BinaryIO, size: int) -> Dict[str, Any]:
+    """Read a WAV file's fmt chunk and measure the loudness of a few windows of its PCM data."""
+    fmt = None
+    f.seek(12)
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("no data chunk")
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            f.seek(chunk_size % 2, 1)
+        elif chunk_id == b"data":
+            data_offset = f.tell()
+            # Streaming writers leave the size at 0 or 0xFFFFFFFF
+            if chunk_size in (0, 0xFFFFFFFF):
+                chunk_size = size - data_offset
+            data_size = min(chunk_size, size - data_offset)
+            break
+        else:
+            f.seek(chunk_size + chunk_size % 2, 1)
+    if fmt is None or len(fmt) < 16:
+        raise ValueError("no fmt chunk")
+
+    tag, channels, rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == 0xFFFE and len(fmt) >= 26:
+        # WAVE_FORMAT_EXTENSIBLE: the real format is the start of the sub-format GUID
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    if not channels or not rate or not block_align:
+        raise ValueError("invalid fmt chunk")
+    frames = data_size // block_align
+    info = {"sample_rate": rate, "channels": channels, "duration": frames / rate, "loudest_window_db": None}
+
+    # Sample evenly spaced windows of integer or float PCM; other encodings are not measured
+    typecode = {(1, 8): "B", (1, 16): "h", (1, 32): "i", (3, 32): "f"}.get((tag, bits))
+    if typecode is None or frames == 0 or array.array(typecode).itemsize * 8 != bits:
+        return info
+    full_scale, offset = {"B": (128.0, 128.0), "h": (32768.0, 0.0), "i": (2147483648.0, 0.0), "f": (1.0, 0.0)}[typecode]
+    windows = max(1, PREFLIGHT_CONFIG["sample_windows"])
+    window_frames = min(frames, max(1, int(PREFLIGHT_CONFIG["window_seconds"] * rate)))
+    loudest = float("-inf")
+    for k in range(windows):
+        start = int((frames - window_frames) * (k + 0.5) / windows)
+        f.seek(data_offset + start * block_align)
+        data = f.read(window_frames * block_align)
+        samples = array.array(typecode)
+        samples.frombytes(data[:len(data) - len(data) % samples.itemsize])
+        if sys.byteorder == "big":
+            samples.byteswap()
+        loudest = max(loudest, _window_db(samples, full_scale, offset))
+    info["loudest_window_db"] = loudest
+    return info
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_BITRATES[(2, 3)] = _MP3_BITRATES[(2, 2)]
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+def _probe_mp3(f: BinaryIO, size: int) -> Dict[str, Any]:
+    """Read the first MPEG audio frame header, using the Xing/VBRI frame count when present."""
+    f.seek(0)
+    head = f.read(10)
+    offset = 0
+    if head[:3] == b"ID3" and len(head) == 10:
+        # ID3v2 tag size is a 28-bit syncsafe integer, plus an optional footer
+        tag_size = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+        offset = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    f.seek(offset)
+    buf = f.read(_HEADER_BYTES)
+    for i in range(len(buf) - 3):
+        if buf[i] != 0xFF or buf[i + 1] & 0xE0 != 0xE0:
+            continue
+        version = {3: 1, 2: 2, 0: 2.5}.get((buf[i + 1] >> 3) & 3)
+        layer = {3: 1, 2: 2, 1: 3}.get((buf[i + 1] >> 1) & 3)
+        bitrate_index, rate_index = buf[i + 2] >> 4, (buf[i + 2] >> 2) & 3
+        if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+        rate = _MP3_SAMPLE_RATES[version][rate_index]
+        channels = 1 if buf[i + 3] >> 6 == 3 else 2
+        samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+
+        # A VBR header in the first frame gives the exact frame count; otherwise assume constant bitrate
+        frame = buf[i:i + 200]
+        frames = None
+        for marker in (b"Xing", b"Info"):
+            pos = frame.find(marker)
+            if pos >= 0 and len(frame) >= pos + 12 and struct.unpack(">I", frame[pos + 4:pos + 8])[0] & 1:
+                frames = struct.unpack(">I", frame[pos + 8:pos + 12])[0]
+        if frame[36:40] == b"VBRI" and len(frame) >= 54:
+            frames = struct.unpack(">I", frame[50:54])[0]
+        if frames:
+            duration = frames * samples_per_frame / rate
+        else:
+            duration = (size - offset - i) * 8 / bitrate
+        return {"sample_rate": rate, "channels": channels, "duration": duration, "loudest_window_db": None}
+    raise ValueError("no MPEG audio frame")
+
+def _probe_flac(f: BinaryIO, size: int) -> Dict[str, Any]:
+    """Read the FLAC STREAMINFO block."""
+    f.seek(4)
+    block = f.read(4 + 34)
+    if len(block) < 38 or block[0] & 0x7F != 0:
+        raise ValueError("no STREAMINFO block")
+    info = block[4:]
+    rate = info[10] << 12 | info[11] << 4 | info[12] >> 4
+    channels = ((info[12] >> 1) & 7) + 1
+    total_samples = (info[13] & 0x0F) << 32 | struct.unpack(">I", info[14:18])[0]
+    if not rate:
+        raise ValueError("invalid STREAMINFO block")
+    # A total of 0 means the encoder did not know the length
+    duration = total_samples / rate if total_samples else None
+    return {"sample_rate": rate, "channels": channels, "duration": duration, "loudest_window_db": None}
+
+def _probe_ogg(f: BinaryIO, size: int) -> Dict[str, Any]:
+    """Read the Opus or Vorbis identification header and the granule position of the last page."""
+    f.seek(0)
+    page = f.read(_HEADER_BYTES)
+    segments = page[26]
+    packet = page[27 + segments:]
+    if packet[:8] == b"OpusHead":
+        channels = packet[9]
+        pre_skip = struct.unpack("<H", packet[10:12])[0]
+        rate = struct.unpack("<I", packet[12:16])[0] or 48000
+        # Opus granule positions always count 48 kHz samples
+        granule_rate = 48000
+    elif packet[:7] == b"\x01vorbis":
+        channels = packet[11]
+        rate = granule_rate = struct.unpack("<I", packet[12:16])[0]
+        pre_skip = 0
+    else:
+        raise ValueError("unsupported Ogg codec")
+    if not channels or not granule_rate:
+        raise ValueError("invalid identification header")
+
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    last_page = tail.rfind(b"OggS")
+    duration = None
+    if last_page >= 0 and len(tail) >= last_page + 14:
+        granule = struct.unpack("<q", tail[last_page + 6:last_page + 14])[0]
+        if granule > pre_skip:
+            duration = (granule - pre_skip) / granule_rate
+    return {"sample_rate": rate, "channels": channels, "duration": duration, "loudest_window_db": None}
+
+def _mp4_boxes(f: BinaryIO, start: int, end: int):
+    """Iterate the (type, payload start, end) of the MP4 boxes between two offsets."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        box_size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if box_size == 1:
+            box_size, header = struct.unpack(">Q", f.read(8))[0], 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < header:
+            raise ValueError("invalid box size")
+        yield box_type, pos + header, min(pos + box_size, end)
+        pos += box_size
+
+def _mp4_child(f: BinaryIO, start: int, end: int, box_type: bytes):
+    """Find the first child box of a type, or None."""
+    return next(((s, e) for t, s, e in _mp4_boxes(f, start, end) if t == box_type), None)
+
+def _probe_m4a(f: BinaryIO, size: int) -> Dict[str, Any]:
+    """Read the movie header and the first sound track's sample description of an MP4/M4A file."""
+    moov = _mp4_child(f, 0, size, b"moov")
+    if moov is None:
+        raise ValueError("no moov box")
+    mvhd = _mp4_child(f, *moov, b"mvhd")
+    if mvhd is None:
+        raise ValueError("no mvhd box")
+    f.seek(mvhd[0])
+    header = f.read(32)
+    if header[0] == 1:
+        timescale, length = struct.unpack(">IQ", header[20:32])
+    else:
+        timescale, length = struct.unpack(">II", header[12:20])
+    if not timescale:
+        raise ValueError("invalid mvhd box")
+    info = {"sample_rate": None, "channels": None, "duration": length / timescale, "loudest_window_db": None}
+
+    for box_type, start, end in _mp4_boxes(f, *moov):
+        if box_type != b"trak":
+            continue
+        mdia = _mp4_child(f, start, end, b"mdia")
+        hdlr = mdia and _mp4_child(f, *mdia, b"hdlr")
+        if not hdlr:
+            continue
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b"soun":
+            continue
+        minf = _mp4_child(f, *mdia, b"minf")
+        stbl = minf and _mp4_child(f, *minf, b"stbl")
+        stsd = stbl and _mp4_child(f, *stbl, b"stsd")
+        if stsd:
+            # Skip version/flags and entry count, then the sample entry's size and type
+            f.seek(stsd[0] + 16)
+            entry = f.read(28)
+            if len(entry) == 28:
+                info["channels"] = struct.unpack(">H", entry[16:18])[0]
+                info["sample_rate"] = struct.unpack(">I", entry[24:28])[0] >> 16
+        break
+    return info
+
+def _probe_webm(f: BinaryIO, size: int) -> Dict[str, Any]:
+    """Look for the Segment Info duration of a WebM file; browser recordings often have none."""
+    f.seek(0)
+    head = f.read(65536)
+    scale = 1000000
+    pos = head.find(b"\x2a\xd7\xb1")
+    if pos >= 0 and len(head) > pos + 4 and head[pos + 3] & 0x80:
+        length = head[pos + 3] & 0x7F
+        scale = int.from_bytes(head[pos + 4:pos + 4 + length], "big") or scale
+    duration = None
+    pos = head.find(b"\x44\x89")
+    if pos >= 0 and len(head) > pos + 3:
+        if head[pos + 2] == 0x88 and len(head) >= pos + 11:
+            duration = struct.unpack(">d", head[pos + 3:pos + 11])[0] * scale / 1e9
+        elif head[pos + 2] == 0x84 and len(head) >= pos + 7:
+            duration = struct.unpack(">f", head[pos + 3:pos + 7])[0] * scale / 1e9
+    return {"sample_rate": None, "channels": None, "duration": duration, "loudest_window_db": None}
+
+_PROBES = {
+    "wav": _probe_wav,
+    "mp3": _probe_mp3,
+    "flac": _probe_flac,
+    "ogg": _probe_ogg,
+    "m4a": _probe_m4a,
+    "webm": _probe_webm,
+}
+
+# Bytes per second assumed for files whose headers do not give a duration (128 kbps)
+_FALLBACK_BYTES_PER_SECOND = 16000
+
+def preflight_audio(audio_file: str, engine: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Check an audio file before it is transcribed, reading only its headers and a few sampled windows.
+    
+    Rejects files that are empty, not audio, corrupt, too short, too long or silent, and estimates
+    what transcribing the file will cost.
+    
+    Args:
+        audio_file: Path to the audio file
+        engine: Transcription engine the estimate is for (default: TRANSCRIPTION_CONFIG["engine"])
+        
+    Returns:
+        Dict with format, size_bytes, duration, duration_estimated, sample_rate, channels,
+        loudest_window_db (None when the encoding is not sampled), estimated_cost (USD)
+        and estimated_seconds
+        
+    Raises:
+        AudioPreflightError: If the file should not be transcribed
+    """
+    if not audio_file or not os.path.exists(audio_file):
+        raise AudioPreflightError("音頻文件不存在")
+    size = os.path.getsize(audio_file)
+    if size == 0:
+        raise AudioPreflightError("音頻文件為空")
+    
+    with open(audio_file, "rb") as f:
+        audio_format = sniff_audio_format(f.read(_HEADER_BYTES))
+        if audio_format is None:
+            raise AudioPreflightError("無法識別的音頻格式，請上傳 WAV、MP3、M4A、FLAC、OGG 或 WebM 文件")
+        try:
+            info = _PROBES[audio_format](f, size)
+        except (ValueError, IndexError, struct.error) as e:
+            raise AudioPreflightError(f"音頻文件已損壞，無法讀取 {audio_format.upper()} 文件頭") from e
+    
+    duration = info["duration"]
+    info.update(format=audio_format, size_bytes=size, duration_estimated=duration is None)
+    if duration is None:
+        duration = info["duration"] = size / _FALLBACK_BYTES_PER_SECOND
+    elif duration < PREFLIGHT_CONFIG["min_duration"]:
+        raise AudioPreflightError(f"錄音時長過短（{duration:.1f} 秒），可能是空錄音")
+    if PREFLIGHT_CONFIG["max_duration"] and duration > PREFLIGHT_CONFIG["max_duration"]:
+        raise AudioPreflightError(f"錄音時長 {duration / 60:.0f} 分鐘超過上限 {PREFLIGHT_CONFIG['max_duration'] / 60:.0f} 分鐘")
+    loudest = info["loudest_window_db"]
+    if loudest is not None and loudest < PREFLIGHT_CONFIG["silence_threshold_db"]:
+        raise AudioPreflightError("錄音中沒有檢測到聲音，請檢查麥克風是否正常")
+    
+    engine = engine or TRANSCRIPTION_CONFIG["engine"]
+    local = engine == "local"
+    info["estimated_cost"] = 0.0 if local else duration / 60 * PREFLIGHT_CONFIG["openai_cost_per_minute"]
+    info["estimated_seconds"] = duration * PREFLIGHT_CONFIG["local_realtime_factor" if local else "openai_realtime_factor"]
+    return info
+
+def _alignment_text(text: str) -> Tuple[str, List[int]]:
+    """Lowercased letters and digits of a text, with the index of each in the original text."""
+    chars, positions = [], []
+    for index, char in enumerate(text):
+        if char.isalnum():
+            chars.append(char.lower())
+            positions.append(index)
+    return "".join(chars), positions
+
+def _speech_window(text: str, seconds: float, min_chars: int, from_end: bool) -> int:
+    """Length of the part of `text`, at its end or its start, that can have been spoken in `seconds`."""
+    budget = seconds * _STITCH_WINDOW_SLACK
+    indices = range(len(text) - 1, -1, -1) if from_end else range(len(text))
+    length, seen = 0, 0
+    for index in indices:
+        char = text[index]
+        if char.isalnum():
+            budget -= 1 / (_STITCH_CJK_PER_SECOND if ord(char) >= 0x2E80 else _STITCH_LETTERS_PER_SECOND)
+            if budget < 0 and seen >= min_chars:
+                break
+            seen += 1
+        length += 1
+    return length
+
+def _seam_matches(tail: str, head: str, min_match: int) -> List[Tuple[int, int, int]]:
+    """Every maximal common run of `tail` and `head` of at least `min_match` characters, as (tail end, head end, size)."""
+    matches = []
+    runs = [0] * (len(head) + 1)
+    for i in range(1, len(tail) + 1):
+        previous_runs, runs = runs, [0] * (len(head) + 1)
+        for j in range(1, len(head) + 1):
+            if tail[i - 1] == head[j - 1]:
+                runs[j] = previous_runs[j - 1] + 1
+        for j in range(1, len(head) + 1):
+            # A run is maximal when it cannot be extended by the next character of both texts
+            extends = i < len(tail) and j < len(head) and tail[i] == head[j]
+            if runs[j] >= min_match and not extends:
+                matches.append((i, j, runs[j]))
+    return matches
+
+def stitch_transcriptions(previous: str, following: str, overlap: float,
+                          min_match: Optional[int] = None) -> Optional[str]:
+    """
+    Join two transcriptions of overlapping audio, keeping the overlapping words once.
+    
+    Only the text that can have been spoken during the overlap is searched: about
+    6 CJK characters or 15 letters per second, with some margin. In it, the end of
+    `previous` and the start of `following` are searched for common runs of letters
+    and digits, ignoring case, punctuation and whitespace, which the two chunks often
+    transcribe differently. The run nearest the seam (the end of `previous` and the
+    start of `following`) is chosen, the longer one on a tie, so a phrase repeated
+    earlier in the meeting is not mistaken for the overlap. The text is cut at the end
+    of that run: `previous` up to it, `following` after it. Words cut off at the edge
+    of a chunk fall outside the common run and are taken from the chunk that heard them whole.
+    
+    Args:
+        previous: Transcription of the earlier chunk
+        following: Transcription of the next chunk, whose first `overlap` seconds repeat
+            the end of the earlier chunk
+        overlap: Seconds of audio the two chunks share
+        min_match: Fewest common characters accepted as an alignment
+            (default: TRANSCRIPTION_CONFIG["stitch_min_match"])
+        
+    Returns:
+        The joined text, or None if the overlap could not be aligned
+    """
+    min_match = TRANSCRIPTION_CONFIG["stitch_min_match"] if min_match is None else min_match
+    previous = previous.rstrip()
+    following = following.lstrip()
+    min_match = max(1, min_match)
+    tail_start = len(previous) - _speech_window(previous, overlap, min_match, from_end=True)
+    tail, tail_positions = _alignment_text(previous[tail_start:])
+    head, head_positions = _alignment_text(following[:_speech_window(following, overlap, min_match, from_end=False)])
+    if not tail or not head:
+        return None
+    
+    matches = _seam_matches(tail, head, min_match)
+    if not matches:
+        return None
+    # Distance from the seam: characters of `previous` after the run plus characters of `following` before it
+    tail_end, head_end, _ = min(matches, key=lambda m: (len(tail) - m[0] + m[1] - m[2], -m[2]))
+    cut_previous = tail_start + tail_positions[tail_end - 1] + 1
+    cut_following = head_positions[head_end - 1] + 1
+    return previous[:cut_previous] + following[cut_following:]
+
+def combine_transcriptions(transcriptions: List[str], overlap: float = 0) -> str:
     """
     Combine multiple transcription segments into a single coherent text.
     
     Args:
         transcriptions: List of transcription segments
+        overlap: Seconds of audio adjacent segments share (see `split_audio_file`); with an
+            overlap, each seam is aligned with `stitch_transcriptions` so the shared words
+            appear once
         
     Returns:
         Combined transcription text
     """
-    # Simple concatenation with newlines between segments
-    return "\n".join(transcriptions)
+    if overlap <= 0:
+        # Simple concatenation with newlines between segments
+        return "\n".join(transcriptions)
+    
+    combined = ""
+    for text in transcriptions:
+        if not text.strip():
+            continue
+        if not combined:
+            combined = text.strip()
+            continue
+        # Seams that cannot be aligned (e.g. silence in the overlap) are joined with a newline
+        combined = stitch_transcriptions(combined, text, overlap) or f"{combined}\n{text.strip()}"
+    return combined
@@ -3,8 +3,13 @@ Configuration utility for the meeting recorder application.
 """
 
 import os
+import sys
 from typing import Dict, Any
 
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SUMMARY_CONFIG, TRANSCRIPTION_CONFIG
+
 class Config:
     """Configuration class for the meeting recorder application."""
     
@@ -16,16 +21,21 @@ class Config:
         self.chunk_size = 1024
         
         # OpenAI API settings
-        self.transcription_model = "whisper-1"
+        self.transcription_model = TRANSCRIPTION_CONFIG["model"]
+        self.transcription_engine = TRANSCRIPTION_CONFIG["engine"]
+        self.summary_model = SUMMARY_CONFIG["model"]
+        
+        # Summary provider: "openai", "ollama" or "auto" (see core/summary/router.py)
+        self.summary_provider = SUMMARY_CONFIG["provider"]
         
         # Local model settings for summary generation
-        self.gemma_model = "gemma3:12b"  # Updated to Gemma 3 12B model
+        self.gemma_model = SUMMARY_CONFIG["ollama_model"]
         self.gemma_temperature = 0.3
-        self.ollama_url = "http://localhost:11434/api/generate"
+        self.ollama_url = f"{SUMMARY_CONFIG['ollama_host'].rstrip('/')}/api/generate"
         
         # Application settings
         self.default_meeting_title = "未命名會議"
-        self.language = "zh"  # Chinese language
+        self.language = TRANSCRIPTION_CONFIG["language"]  # "zh" (Chinese) by default
         
         # Check if OpenAI API key is set in environment
         if "OPENAI_API_KEY" not in os.environ:
@@ -47,7 +57,9 @@ class Config:
     def get_openai_config(self) -> Dict[str, Any]:
         """Get OpenAI API configuration."""
         return {
-            "transcription_model": self.transcription_model
+            "transcription_model": self.transcription_model,
+            "transcription_engine": self.transcription_engine,
+            "summary_model": self.summary_model
         }
         
     def get_summary_config(self) -> Dict[str, Any]:
@@ -55,7 +67,8 @@ class Config:
         return {
             "model": self.gemma_model,
             "temperature": self.gemma_temperature,
-            "ollama_url": self.ollama_url
+            "ollama_url": self.ollama_url,
+            "provider": self.summary_provider
         }
     
     def get_model_config(self) -> Dict[str, Any]:
@@ -0,0 +1,236 @@
+"""
+Per-request, per-stage memory accounting for the meeting recorder application.
+
+A request is wrapped in `MemoryTracker.request`, and the stages that can hold
+large buffers (saving an upload, preflight, splitting, transcription,
+summary, recording and export) in `memory_stage`. Each stage records the
+change of the process's resident set size and how much it raised the
+process's peak RSS, which is what an OOM kill is about. The current request is
+carried in a context variable, so stages running in threads started with the
+request's context are attributed to it. Work in the audio process pool is
+measured inside the worker process and reported as that worker's peak.
+
+RSS is process-wide, so concurrent requests blur each other's numbers; the
+per-stage maxima over many requests are what to size memory limits from.
+With tracemalloc enabled, stages also record the peak of traced Python
+allocations and the tracker can list the top allocation sites, at a
+noticeable CPU cost.
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import MEMORY_CONFIG
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_MB = 1024 * 1024
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process, or 0 if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far, or 0 if it cannot be read."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryAccount:
+    """Memory figures of the stages of one request."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.time()
+        self.rss_start = rss_bytes()
+        self.peak_start = peak_rss_bytes()
+        self.stages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: Dict[str, Any]) -> None:
+        """Record a finished stage."""
+        with self._lock:
+            self.stages.append(stage)
+
+    def summary(self) -> Dict[str, Any]:
+        """The request's totals and its stages."""
+        with self._lock:
+            stages = list(self.stages)
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "seconds": round(time.time() - self.started_at, 3),
+            "rss_delta_mb": round((rss_bytes() - self.rss_start) / _MB, 2),
+            "peak_growth_mb": round((peak_rss_bytes() - self.peak_start) / _MB, 2),
+            "stages": stages,
+        }
+
+
+current_account: contextvars.ContextVar[Optional[MemoryAccount]] = contextvars.ContextVar("memory_account", default=None)
+
+
+class MemoryTracker:
+    """Aggregates stage and request memory figures of this process."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the tracker, starting tracemalloc if configured.
+
+        Args:
+            config: Memory accounting settings (default: MEMORY_CONFIG)
+        """
+        self.config = dict(MEMORY_CONFIG, **(config or {}))
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._requests = deque(maxlen=max(1, self.config["history"]))
+        if self.config["enabled"] and self.config["tracemalloc"] and not tracemalloc.is_tracing():
+            tracemalloc.start(self.config["tracemalloc_frames"])
+
+    @contextmanager
+    def request(self, label: str) -> Iterator[Optional[MemoryAccount]]:
+        """Account the stages run inside the block to one request, and log and keep its summary."""
+        if not self.config["enabled"]:
+            yield None
+            return
+        account = MemoryAccount(label)
+        token = current_account.set(account)
+        try:
+            yield account
+        finally:
+            current_account.reset(token)
+            summary = account.summary()
+            with self._lock:
+                self._requests.append(summary)
+            if summary["peak_growth_mb"] >= self.config["log_threshold_mb"]:
+                stages = "；".join(f"{stage['stage']} {self._format_stage(stage)}" for stage in summary["stages"])
+                print(f"內存: {label} 峰值 RSS 增長 {summary['peak_growth_mb']:.1f} MB，RSS 變化 {summary['rss_delta_mb']:+.1f} MB，"
+                      f"當前 RSS {rss_bytes() / _MB:.0f} MB；階段: {stages or '無'}")
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure a stage and record it in the current request, if any, and in the stage totals."""
+        if not self.config["enabled"]:
+            yield
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_start, peak_start, started = rss_bytes(), peak_rss_bytes(), time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = {
+                "stage": name,
+                "seconds": round(time.perf_counter() - started, 3),
+                "rss_delta_mb": round((rss_bytes() - rss_start) / _MB, 2),
+                "peak_growth_mb": round((peak_rss_bytes() - peak_start) / _MB, 2),
+            }
+            if tracing:
+                stage["traced_peak_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_start) / _MB, 2)
+            self.record(stage)
+
+    def record(self, stage: Dict[str, Any]) -> None:
+        """Record a measured stage in the current request, if any, and in the stage totals."""
+        account = current_account.get()
+        if account is not None:
+            account.add(stage)
+        elif max(stage.get("peak_growth_mb", 0), stage.get("worker_peak_growth_mb", 0)) >= self.config["log_threshold_mb"]:
+            # Stages outside an accounted request (e.g. in the Gradio app) are logged on their own
+            print(f"內存: 階段 {stage['stage']} {self._format_stage(stage)}，當前 RSS {rss_bytes() / _MB:.0f} MB")
+        with self._lock:
+            totals = self._stages.setdefault(stage["stage"], {"count": 0})
+            totals["count"] += 1
+            for key, value in stage.items():
+                if key.endswith("_mb"):
+                    totals[f"max_{key}"] = max(totals.get(f"max_{key}", value), value)
+
+    @staticmethod
+    def _format_stage(stage: Dict[str, Any]) -> str:
+        """One-line description of a stage's figures for the log."""
+        if "worker_peak_rss_mb" in stage:
+            return f"進程池峰值 RSS {stage['worker_peak_rss_mb']:.0f} MB（增長 {stage['worker_peak_growth_mb']:.1f} MB）"
+        text = f"峰值增長 {stage['peak_growth_mb']:.1f} MB，RSS 變化 {stage['rss_delta_mb']:+.1f} MB"
+        if "traced_peak_mb" in stage:
+            text += f"，Python 分配峰值 {stage['traced_peak_mb']:.1f} MB"
+        return text
+
+    def top_allocations(self, limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+        """The code locations holding the most traced memory, or None when tracemalloc is off."""
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        return [
+            {
+                "site": str(stat.traceback[0]),
+                "traceback": [str(frame) for frame in stat.traceback] if len(stat.traceback) > 1 else None,
+                "size_mb": round(stat.size / _MB, 3),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("traceback" if self.config["tracemalloc_frames"] > 1 else "lineno")[:limit]
+        ]
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        """Process memory, stage totals, recent requests and, with tracemalloc, the top allocation sites."""
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self._stages.items()}
+            requests = list(self._requests)
+        result = {
+            "pid": os.getpid(),
+            "rss_mb": round(rss_bytes() / _MB, 1),
+            "peak_rss_mb": round(peak_rss_bytes() / _MB, 1),
+            "stages": stages,
+            "recent_requests": sorted(requests, key=lambda r: r["peak_growth_mb"], reverse=True),
+            "tracemalloc": tracemalloc.is_tracing(),
+            "top_allocations": self.top_allocations(top),
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            result["traced_mb"] = round(current / _MB, 2)
+            result["traced_peak_mb"] = round(peak / _MB, 2)
+        return result
+
+
+_memory_tracker = None
+_memory_tracker_lock = threading.Lock()
+
+
+def get_memory_tracker() -> MemoryTracker:
+    """Get the process-wide memory tracker."""
+    global _memory_tracker
+    if _memory_tracker is not None:
+        return _memory_tracker
+    with _memory_tracker_lock:
+        if _memory_tracker is None:
+            _memory_tracker = MemoryTracker()
+        return _memory_tracker
+
+
+def memory_stage(name: str):
+    """Measure a stage with the process-wide tracker (see `MemoryTracker.stage`)."""
+    return get_memory_tracker().stage(name)
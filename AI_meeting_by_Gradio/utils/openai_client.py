@@ -0,0 +1,207 @@
+"""
+Per-API-key OpenAI clients for the meeting recorder application.
+
+Each client owns a `requests.Session` bound to one API key, so concurrent
+requests from different tenants never share credentials and repeated calls
+with the same key reuse keep-alive connections. Clients are kept in a bounded
+LRU pool and closed when evicted.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 添加項目根目錄到 Python 路徑
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import OPENAI_CLIENT_CONFIG
+
+
+class OpenAIError(Exception):
+    """Raised when the OpenAI API returns an error."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OpenAIClient:
+    """OpenAI REST client bound to a single API key."""
+
+    def __init__(self, api_key: str, base_url: str = None, timeout: float = None, max_connections: int = None):
+        """
+        Initialize the client.
+
+        Args:
+            api_key: OpenAI API key used for every request of this client
+            base_url: API base URL (default from OPENAI_CLIENT_CONFIG)
+            timeout: Read timeout in seconds
+            max_connections: Maximum keep-alive connections of this client
+        """
+        self.api_key = api_key
+        self.base_url = (base_url or OPENAI_CLIENT_CONFIG["base_url"]).rstrip("/")
+        self.timeout = timeout or OPENAI_CLIENT_CONFIG["timeout"]
+        max_connections = max_connections or OPENAI_CLIENT_CONFIG["max_connections"]
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _post(self, path: str, **kwargs) -> requests.Response:
+        """Send a POST request and raise OpenAIError on failure."""
+        response = self.session.post(
+            f"{self.base_url}{path}",
+            timeout=(OPENAI_CLIENT_CONFIG["connect_timeout"], self.timeout),
+            **kwargs
+        )
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = response.text
+            raise OpenAIError(f"OpenAI API 返回錯誤: {response.status_code} - {message}", response.status_code)
+        return response
+
+    def transcribe(self, audio_path: str, model: str, language: Optional[str] = None, response_format: str = "text") -> Any:
+        """
+        Transcribe an audio file with the Whisper API.
+
+        Args:
+            audio_path: Path to the audio file
+            model: Transcription model, e.g. "whisper-1"
+            language: Language code, or None for auto-detection
+            response_format: "text", "json", "verbose_json", ...
+
+        Returns:
+            The transcript text for "text", otherwise the decoded JSON response
+        """
+        data = {"model": model, "response_format": response_format}
+        if language:
+            data["language"] = language
+
+        with open(audio_path, "rb") as audio_file:
+            response = self._post(
+                "/audio/transcriptions",
+                data=data,
+                files={"file": (os.path.basename(audio_path), audio_file)}
+            )
+        return response.text if response_format == "text" else response.json()
+
+    def chat_completion(self, messages: List[Dict[str, str]], model: str, temperature: float = 0.5, max_tokens: int = None, **extra) -> str:
+        """
+        Create a chat completion and return the message content.
+
+        Args:
+            messages: Chat messages
+            model: Chat model, e.g. "gpt-4"
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens to generate
+            **extra: Additional request fields
+
+        Returns:
+            str: Content of the first choice
+        """
+        payload = {"model": model, "messages": messages, "temperature": temperature, **extra}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        response = self._post("/chat/completions", json=payload)
+        return response.json()["choices"][0]["message"]["content"]
+
+    def chat_completion_stream(self, messages: List[Dict[str, str]], model: str, temperature: float = 0.5,
+                               max_tokens: int = None, **extra) -> Iterator[str]:
+        """
+        Create a streamed chat completion and yield the content deltas as they arrive.
+
+        Takes the same arguments as `chat_completion`.
+        """
+        payload = {"model": model, "messages": messages, "temperature": temperature, "stream": True, **extra}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        response = self._post("/chat/completions", json=payload, stream=True)
+        # text/event-stream has no charset, which requests would otherwise decode as Latin-1
+        response.encoding = "utf-8"
+        with response:
+            # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def ping(self, model: str) -> None:
+        """Retrieve a model's metadata, opening a keep-alive connection; raises OpenAIError if it is unavailable."""
+        response = self.session.get(
+            f"{self.base_url}/models/{model}",
+            timeout=(OPENAI_CLIENT_CONFIG["connect_timeout"], self.timeout)
+        )
+        if response.status_code != 200:
+            raise OpenAIError(f"OpenAI API 返回錯誤: {response.status_code} - {response.text}", response.status_code)
+
+    def close(self) -> None:
+        """Close the client's connections."""
+        self.session.close()
+
+
+class OpenAIClientPool:
+    """Bounded LRU pool of OpenAI clients keyed by API key."""
+
+    def __init__(self, max_size: int = None):
+        """Initialize the pool."""
+        self.max_size = max_size or OPENAI_CLIENT_CONFIG["pool_size"]
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> OpenAIClient:
+        """Get the client for an API key, creating it (and evicting the least recently used one) if needed."""
+        evicted = None
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is not None:
+                self._clients.move_to_end(api_key)
+                return client
+            client = OpenAIClient(api_key)
+            self._clients[api_key] = client
+            if len(self._clients) > self.max_size:
+                _, evicted = self._clients.popitem(last=False)
+        if evicted is not None:
+            evicted.close()
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def close_all(self) -> None:
+        """Close and drop every client."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+_client_pool = OpenAIClientPool()
+
+
+def get_client_pool() -> OpenAIClientPool:
+    """Get the process-wide client pool."""
+    return _client_pool
+
+
+def get_default_client() -> Optional[OpenAIClient]:
+    """Get the client for the server's OPENAI_API_KEY, or None if it is not set."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    return _client_pool.get(api_key)
@@ -0,0 +1,243 @@
+"""
+On-demand request profiling for the meeting recorder application.
+
+Profiling is opt-in per request: an admin sends the configured token in the
+X-Profile header, or a configured fraction of requests is sampled at random.
+Requests that are not selected pay one comparison and one random number.
+
+The default "sample" mode records the call stacks of every thread at a fixed
+interval, because request handlers hand most of their work to scheduler and
+pool threads, and writes them as collapsed stacks (one `stack count` line per
+distinct stack, readable by flamegraph.pl and speedscope). The samples are
+wall-clock and include other requests running at the same time; idle worker
+threads show up waiting in `threading`. The "cprofile" mode runs cProfile on
+the thread that handles the request and writes a pstats file instead. cProfile
+only sees the thread that enabled it, so work the handler hands to
+`run_in_threadpool`, the scheduler threads or the exporter pool is missing and
+an async handler's profile shows mostly awaits; use it for handlers that do
+their work on their own thread. Neither mode sees the audio process pool,
+whose jobs run in other processes (see utils.memory for their figures).
+"""
+
+import os
+import sys
+import time
+import uuid
+import glob
+import hmac
+import random
+import cProfile
+import inspect
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PROFILING_CONFIG
+
+
+class StackSampler:
+    """Samples the call stacks of all threads on a background thread."""
+
+    def __init__(self, interval: float):
+        """
+        Initialize the sampler.
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the sample count of each collapsed stack."""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        """Record one sample of every other thread per interval."""
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    """Decides which requests to profile, profiles them and writes the results."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            config: Profiling settings (default: PROFILING_CONFIG)
+        """
+        self.config = dict(PROFILING_CONFIG, **(config or {}))
+        if self.config["mode"] not in ("sample", "cprofile"):
+            raise ValueError(f"不支持的分析方式: {self.config['mode']}，可選: sample、cprofile")
+        self._slots = threading.BoundedSemaphore(max(1, self.config["max_concurrent"]))
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any request can be profiled at all."""
+        return bool(self.config["admin_token"]) or self.config["sample_rate"] > 0
+
+    def should_profile(self, header: Optional[str] = None) -> bool:
+        """Whether to profile a request, given its X-Profile header."""
+        if header and self.config["admin_token"]:
+            return hmac.compare_digest(header.encode("utf-8"), self.config["admin_token"].encode("utf-8"))
+        return self.config["sample_rate"] > 0 and random.random() < self.config["sample_rate"]
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[Optional[str]]:
+        """
+        Profile the enclosed code and write the result.
+
+        In "cprofile" mode only the calling thread is profiled; work on other
+        threads or processes does not appear in the pstats file.
+
+        Yields:
+            The profile's file name, or None when the concurrent profile limit is reached
+        """
+        if not self._slots.acquire(blocking=False):
+            yield None
+            return
+        try:
+            name = f"{time.strftime('%Y%m%d_%H%M%S')}_{self._safe_label(label)}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+            started = time.perf_counter()
+            if self.config["mode"] == "cprofile":
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler is active on this thread
+                    profiler = None
+                try:
+                    yield f"{name}.prof" if profiler else None
+                finally:
+                    if profiler:
+                        profiler.disable()
+                        self._write(f"{name}.prof", profiler.dump_stats)
+            else:
+                sampler = StackSampler(self.config["interval"])
+                sampler.start()
+                try:
+                    yield f"{name}.folded"
+                finally:
+                    stacks = sampler.stop()
+                    elapsed = time.perf_counter() - started
+
+                    def write_folded(path):
+                        with open(path, "w", encoding="utf-8") as f:
+                            f.write(f"# {label} {elapsed:.3f}s {sampler.samples} samples every {self.config['interval']}s\n")
+                            for stack, count in stacks.most_common():
+                                f.write(f"{stack} {count}\n")
+                    self._write(f"{name}.folded", write_folded)
+        finally:
+            self._slots.release()
+
+    def _write(self, filename: str, write: Callable[[str], None]) -> None:
+        """Write a profile file and delete the oldest files beyond the limit, logging failures."""
+        directory = self.config["dir"]
+        try:
+            os.makedirs(directory, exist_ok=True)
+            write(os.path.join(directory, filename))
+            files = sorted(glob.glob(os.path.join(directory, "*.folded")) + glob.glob(os.path.join(directory, "*.prof")),
+                           key=os.path.getmtime)
+            for old in files[:max(0, len(files) - self.config["max_files"])]:
+                os.remove(old)
+        except OSError as e:
+            print(f"寫入性能分析文件失敗: {str(e)}")
+        else:
+            print(f"性能分析已寫入: {os.path.join(directory, filename)}")
+
+    @staticmethod
+    def _safe_label(label: str) -> str:
+        """Turn a request path or handler name into a file name component."""
+        return "".join(c if c.isalnum() else "_" for c in label).strip("_")[:60] or "request"
+
+
+def profiled(label: Optional[str] = None):
+    """
+    Decorator that profiles randomly sampled calls of a handler (PROFILING_SAMPLE_RATE).
+
+    Works for plain and async functions and generators, and keeps the kind of
+    the function, so Gradio still streams generator handlers.
+    """
+    def decorator(fn):
+        name = label or fn.__qualname__
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                profiler = get_profiler()
+                if not profiler.should_profile():
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                    return
+                with profiler.profile(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                profiler = get_profiler()
+                if not profiler.should_profile():
+                    return await fn(*args, **kwargs)
+                with profiler.profile(name):
+                    return await fn(*args, **kwargs)
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                profiler = get_profiler()
+                if not profiler.should_profile():
+                    return (yield from fn(*args, **kwargs))
+                with profiler.profile(name):
+                    return (yield from fn(*args, **kwargs))
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                profiler = get_profiler()
+                if not profiler.should_profile():
+                    return fn(*args, **kwargs)
+                with profiler.profile(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> RequestProfiler:
+    """Get the process-wide request profiler."""
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = RequestProfiler()
+        return _profiler
@@ -0,0 +1,159 @@
+"""
+Per-API-key quotas for the meeting recorder application.
+
+Every API key gets one token bucket per resource: requests, seconds of audio
+transcribed and summary tokens. A bucket holds up to one period's allowance
+and refills continuously, so a key can burst up to its allowance and then
+proceeds at the sustained rate. Costs are checked and charged atomically
+before any work starts, and all buckets of a request are charged together or
+not at all. Buckets live in the shared state store, so every worker process
+enforces the same limits and usage survives restarts. Keys are stored as
+hashes, never in plain text.
+"""
+
+import os
+import sys
+import time
+import hashlib
+from typing import Any, Dict, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import QUOTA_CONFIG
+from utils.state_store import SharedStateStore, get_state_store
+
+# Resource name -> (config key of the allowance, period of the allowance in seconds)
+RESOURCES = {
+    "requests": ("requests_per_minute", 60),
+    "audio_seconds": ("audio_seconds_per_hour", 3600),
+    "summary_tokens": ("summary_tokens_per_hour", 3600),
+}
+
+_RESOURCE_NAMES = {"requests": "請求次數", "audio_seconds": "音頻時長", "summary_tokens": "摘要 token"}
+
+
+class QuotaExceeded(Exception):
+    """API 密鑰的配額不足，錯誤信息即返回給用戶的提示。"""
+
+    def __init__(self, resource: str, retry_after: Optional[float], remaining: Dict[str, Dict[str, float]]):
+        if retry_after is None:
+            message = f"單次請求的{_RESOURCE_NAMES[resource]}超過 API 密鑰的配額上限"
+        else:
+            message = f"API 密鑰的{_RESOURCE_NAMES[resource]}配額已用完，請在 {int(retry_after) + 1} 秒後重試"
+        super().__init__(message)
+        self.resource = resource
+        self.retry_after = retry_after
+        self.remaining = remaining
+
+
+def key_id(api_key: str) -> str:
+    """Identifier of an API key that is safe to store and log."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class QuotaManager:
+    """Token-bucket quotas per API key, shared between processes."""
+
+    NAMESPACE = "quota_buckets"
+
+    def __init__(self, store: SharedStateStore = None, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the quota manager.
+
+        Args:
+            store: Shared state store (default: the process-wide store)
+            config: Quota settings (default: QUOTA_CONFIG)
+        """
+        self.store = store or get_state_store()
+        self.config = dict(QUOTA_CONFIG, **(config or {}))
+
+    def limit(self, resource: str) -> float:
+        """Capacity of a bucket: the allowance of one period."""
+        return self.config[RESOURCES[resource][0]]
+
+    def _refill_rate(self, resource: str) -> float:
+        """Units added to a bucket per second."""
+        return self.limit(resource) / RESOURCES[resource][1]
+
+    def _level(self, key: str, resource: str, now: float) -> float:
+        """Current fill level of a bucket, including the refill since it was last charged."""
+        bucket = self.store.get(self.NAMESPACE, f"{key}:{resource}")
+        if bucket is None:
+            return self.limit(resource)
+        elapsed = max(0.0, now - bucket["updated_at"])
+        return min(self.limit(resource), bucket["level"] + elapsed * self._refill_rate(resource))
+
+    def _snapshot(self, key: str, now: float) -> Dict[str, Dict[str, float]]:
+        """Limit and remaining amount of every bucket of a key."""
+        return {
+            resource: {"limit": self.limit(resource), "remaining": self._level(key, resource, now)}
+            for resource in RESOURCES
+        }
+
+    def consume(self, api_key: str, **costs: float) -> Dict[str, Dict[str, float]]:
+        """
+        Charge a request's costs to an API key's buckets.
+
+        Args:
+            api_key: API key of the request
+            **costs: Amount per resource, e.g. requests=1, audio_seconds=620.5
+
+        Returns:
+            Dict of resource -> {"limit", "remaining"} after the charge
+
+        Raises:
+            QuotaExceeded: If any bucket cannot cover its cost; nothing is charged then
+        """
+        key = key_id(api_key)
+        with self.store.transaction():
+            now = time.time()
+            levels = self._snapshot(key, now)
+            if not self.config["enabled"]:
+                return levels
+            for resource, cost in costs.items():
+                if not cost:
+                    continue
+                # A cost larger than the whole bucket can never be covered by waiting
+                if cost > self.limit(resource):
+                    raise QuotaExceeded(resource, None, levels)
+                level = levels[resource]["remaining"]
+                if level < cost:
+                    raise QuotaExceeded(resource, (cost - level) / self._refill_rate(resource), levels)
+            for resource, cost in costs.items():
+                if not cost:
+                    continue
+                levels[resource]["remaining"] -= cost
+                # A bucket that has refilled completely is the same as no bucket, so it may expire
+                refill_time = (self.limit(resource) - levels[resource]["remaining"]) / self._refill_rate(resource)
+                self.store.set(
+                    self.NAMESPACE, f"{key}:{resource}",
+                    {"level": levels[resource]["remaining"], "updated_at": now},
+                    ttl=refill_time + 1
+                )
+            return levels
+
+    def remaining(self, api_key: str) -> Dict[str, Dict[str, float]]:
+        """Limit and remaining amount of every bucket of an API key, without charging anything."""
+        return self._snapshot(key_id(api_key), time.time())
+
+    def estimate_summary_tokens(self, prompt_tokens: int = 0, audio_seconds: float = 0) -> int:
+        """
+        Summary tokens to charge for a request.
+
+        Args:
+            prompt_tokens: Estimated tokens of the transcript to summarize
+            audio_seconds: Seconds of audio whose transcript will be summarized, when the text is not known yet
+        """
+        prompt_tokens += int(audio_seconds * self.config["tokens_per_audio_second"])
+        return prompt_tokens + self.config["summary_output_tokens"]
+
+
+_quota_manager = None
+
+
+def get_quota_manager() -> QuotaManager:
+    """Get the process-wide quota manager."""
+    global _quota_manager
+    if _quota_manager is None:
+        _quota_manager = QuotaManager()
+    return _quota_manager
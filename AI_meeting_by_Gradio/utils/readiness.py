@@ -0,0 +1,184 @@
+"""
+Readiness checks for the meeting recorder application.
+
+A fresh instance pays for a lot on its first request: the TLS handshake to
+OpenAI, spawning the audio and local Whisper worker processes, and Ollama
+loading the model into memory. The probe does that work up front, on a
+background thread, and measures each dependency while doing it, so a
+readiness endpoint can keep traffic away until the instance is warm and can
+report per-dependency latency afterwards.
+
+Checks re-run in the background while the instance is not ready, and
+periodically once it is, which also keeps connections and the Ollama model
+warm. Callers of `status` never wait for a check.
+"""
+
+import os
+import sys
+import time
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import READINESS_CONFIG, SUMMARY_CONFIG, TRANSCRIPTION_CONFIG
+from utils.config import Config
+from utils.openai_client import get_default_client
+from utils.state_store import get_state_store
+from utils.audio_pool import get_audio_pool
+from utils.scheduler import get_scheduler
+
+
+class ReadinessProbe:
+    """Warms the process's pools and dependencies and reports whether it is ready for traffic."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the probe; nothing is checked until `start` or `status` is called.
+
+        Args:
+            config: Readiness settings (default: READINESS_CONFIG)
+        """
+        self.config = dict(READINESS_CONFIG, **(config or {}))
+        self.app_config = Config()
+        self._lock = threading.Lock()
+        self._running = False
+        self._report = {"ready": False, "checks": {}, "checked_at": None}
+
+    def checks(self) -> Dict[str, Callable[[], Any]]:
+        """The checks that apply to the configured providers and engines, by name."""
+        checks = {
+            "state_store": lambda: get_state_store().get("readiness", "ping"),
+            "schedulers": lambda: get_scheduler("transcription").warm_up() + get_scheduler("summary").warm_up(),
+        }
+        if get_audio_pool().enabled:
+            checks["audio_pool"] = get_audio_pool().warm_up
+
+        engine = TRANSCRIPTION_CONFIG["engine"]
+        provider = SUMMARY_CONFIG["provider"]
+        if os.environ.get("OPENAI_API_KEY") and (engine in ("openai", "auto") or provider in ("openai", "auto")):
+            checks["openai"] = self._ping_openai
+        # The auto engine only falls back to local transcription when faster-whisper is installed
+        if engine == "local" or (engine == "auto" and importlib.util.find_spec("faster_whisper") is not None):
+            checks["local_whisper"] = self._warm_local_whisper
+        if provider in ("ollama", "auto"):
+            checks["ollama"] = self._ping_ollama
+            checks["ollama_model"] = self._preload_ollama_model
+        return checks
+
+    def _ping_openai(self) -> None:
+        """Open a keep-alive connection to OpenAI and check that the summary model is available."""
+        get_default_client().ping(self.app_config.summary_model)
+
+    def _warm_local_whisper(self) -> int:
+        """Start the local Whisper workers and load the model in each."""
+        from core.transcription.engines import get_local_engine
+        return get_local_engine().warm_up(timeout=self.config["timeout"])
+
+    def _ping_ollama(self) -> None:
+        """Check that the Ollama server answers."""
+        response = requests.get(f"{SUMMARY_CONFIG['ollama_host'].rstrip('/')}/api/version", timeout=self.config["timeout"])
+        response.raise_for_status()
+
+    def _preload_ollama_model(self) -> None:
+        """Load the summary model into Ollama's memory (a generate request without a prompt only loads it)."""
+        response = requests.post(
+            self.app_config.ollama_url,
+            json={"model": self.app_config.gemma_model, "keep_alive": self.config["ollama_keep_alive"]},
+            timeout=self.config["timeout"]
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama API 返回錯誤: {response.status_code} - {response.text}")
+
+    @staticmethod
+    def _timed(check: Callable[[], Any]) -> Tuple[bool, float, Optional[str]]:
+        """Run a check and return (passed, latency in ms, error)."""
+        started = time.perf_counter()
+        try:
+            check()
+            return True, (time.perf_counter() - started) * 1000, None
+        except Exception as e:
+            return False, (time.perf_counter() - started) * 1000, str(e)
+
+    def run(self) -> Dict[str, Any]:
+        """Run every check concurrently, waiting at most the configured timeout, and return the new report."""
+        checks = self.checks()
+        required = set(self.config["required"]) or set(checks)
+        executor = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="readiness")
+        futures = {name: executor.submit(self._timed, check) for name, check in checks.items()}
+        wait(futures.values(), timeout=self.config["timeout"])
+        # Checks still running keep their threads; they are reported as timed out
+        executor.shutdown(wait=False)
+
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                passed, latency, error = future.result()
+            else:
+                passed, latency, error = False, self.config["timeout"] * 1000, "檢查超時"
+            results[name] = {"ok": passed, "required": name in required, "latency_ms": round(latency, 1)}
+            if error:
+                results[name]["error"] = error
+
+        report = {
+            "ready": all(result["ok"] for result in results.values() if result["required"]),
+            "checks": results,
+            "checked_at": time.time(),
+        }
+        with self._lock:
+            self._report = report
+        return report
+
+    def _run_in_background(self) -> None:
+        """Run the checks and clear the running flag."""
+        try:
+            self.run()
+        except Exception as e:
+            print(f"就緒檢查失敗: {str(e)}")
+        finally:
+            with self._lock:
+                self._running = False
+
+    def start(self) -> bool:
+        """Start a background run unless one is already running. Returns True if it started one."""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(target=self._run_in_background, name="readiness-probe", daemon=True).start()
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Get the latest report without waiting for checks.
+
+        A background run is started when the report is older than the retry interval
+        (while not ready) or the recheck interval (while ready).
+        """
+        with self._lock:
+            report = dict(self._report)
+            running = self._running
+        checked_at = report["checked_at"]
+        interval = self.config["recheck_interval"] if report["ready"] else self.config["retry_interval"]
+        if not running and (checked_at is None or time.time() - checked_at >= interval):
+            self.start()
+            running = True
+        report["warming"] = running
+        return report
+
+
+_readiness_probe = None
+_readiness_probe_lock = threading.Lock()
+
+
+def get_readiness_probe() -> ReadinessProbe:
+    """Get the process-wide readiness probe."""
+    global _readiness_probe
+    with _readiness_probe_lock:
+        if _readiness_probe is None:
+            _readiness_probe = ReadinessProbe()
+        return _readiness_probe
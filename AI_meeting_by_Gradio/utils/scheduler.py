@@ -0,0 +1,198 @@
+"""
+Job scheduling for the meeting recorder application.
+
+Transcription and summary calls are queued in a scheduler that runs a fixed
+number of them at a time and picks the next one by policy instead of in
+arrival order:
+
+- "sjf": shortest job first by estimated cost (seconds of audio for
+  transcription, prompt tokens for summaries), with aging: the effective cost
+  shrinks as cost / (1 + waited / aging_seconds), so a long recording that has
+  waited long enough is not starved by a stream of short voice memos.
+- "wfq": weighted fair queueing per API key (start-time fair queueing), so
+  one tenant's batch cannot starve the others; each tenant gets a share of
+  the workers proportional to its weight.
+- "fifo": arrival order.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import itertools
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SCHEDULER_CONFIG
+from utils.memory import memory_stage
+
+POLICIES = ("sjf", "wfq", "fifo")
+
+
+class _Job:
+    """A queued call with its scheduling tags."""
+
+    __slots__ = ("fn", "args", "kwargs", "context", "future", "cost", "tenant", "seq", "enqueued_at", "start_tag", "finish_tag")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any], cost: float, tenant: str, seq: int):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.context = contextvars.copy_context()
+        self.future = Future()
+        self.cost = cost
+        self.tenant = tenant
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+
+
+class JobScheduler:
+    """Runs queued calls on a fixed number of worker threads, in the order chosen by a policy."""
+
+    def __init__(self, name: str, concurrency: int, policy: str = None, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the scheduler; worker threads are started on first use.
+
+        Args:
+            name: Name of the kind of job, used for the worker thread names
+            concurrency: Number of jobs running at a time
+            policy: "sjf", "wfq" or "fifo" (default: SCHEDULER_CONFIG["policy"])
+            config: Scheduler settings (default: SCHEDULER_CONFIG)
+        """
+        self.config = dict(SCHEDULER_CONFIG, **(config or {}))
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.policy = policy or self.config["policy"]
+        if self.policy not in POLICIES:
+            raise ValueError(f"不支持的調度策略: {self.policy}，可選: sjf、wfq、fifo")
+        self._queue: List[_Job] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._running = 0
+        # Weighted fair queueing state: system virtual time and the last finish tag of each tenant
+        self._virtual_time = 0.0
+        self._tenant_finish: Dict[str, float] = {}
+
+    def submit(self, fn: Callable[..., Any], *args, cost: float = 0, tenant: str = "", **kwargs) -> Future:
+        """
+        Queue `fn(*args, **kwargs)`.
+
+        Args:
+            cost: Estimated size of the job in the scheduler's unit, e.g. seconds of audio
+            tenant: Fair-queueing tenant, e.g. the hashed API key
+
+        Returns:
+            Future of the call's result
+        """
+        with self._cond:
+            self._start_workers()
+            job = _Job(fn, args, kwargs, max(cost, 0.0), tenant, next(self._seq))
+            if self.policy == "wfq":
+                weight = self.config["weights"].get(tenant, 1) or 1
+                job.start_tag = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+                # Zero-cost jobs still take a turn, so they are ordered by arrival within a tenant
+                job.finish_tag = job.start_tag + max(job.cost, 1.0) / weight
+                self._tenant_finish[tenant] = job.finish_tag
+            self._queue.append(job)
+            self._cond.notify()
+        return job.future
+
+    async def run(self, fn: Callable[..., Any], *args, cost: float = 0, tenant: str = "", **kwargs) -> Any:
+        """Queue a call and wait for its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, cost=cost, tenant=tenant, **kwargs))
+
+    def warm_up(self) -> int:
+        """Start the worker threads now instead of on the first job; returns the number of workers."""
+        with self._cond:
+            self._start_workers()
+            return len(self._workers)
+
+    def _priority(self, job: _Job, now: float) -> tuple:
+        """Sort key of a queued job under the policy; the smallest runs next."""
+        if self.policy == "sjf":
+            return (job.cost / (1 + (now - job.enqueued_at) / self.config["aging_seconds"]), job.seq)
+        if self.policy == "wfq":
+            return (job.finish_tag, job.seq)
+        return (job.seq,)
+
+    def _next_job(self) -> _Job:
+        """Remove and return the next job; called with the lock held and a non-empty queue."""
+        # Aging changes priorities over time, so the queue is scanned instead of kept as a heap
+        now = time.time()
+        job = min(self._queue, key=lambda j: self._priority(j, now))
+        self._queue.remove(job)
+        if self.policy == "wfq":
+            self._virtual_time = max(self._virtual_time, job.start_tag)
+            if not any(j.tenant == job.tenant for j in self._queue) and self._tenant_finish.get(job.tenant) == job.finish_tag:
+                # An idle tenant does not keep credit or debt from its past work
+                del self._tenant_finish[job.tenant]
+        return job
+
+    def _start_workers(self) -> None:
+        """Start the worker threads on first use (again after a fork); called with the lock held."""
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        for i in range(len(self._workers), self.concurrency):
+            worker = threading.Thread(target=self._worker, name=f"{self.name}-scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker(self) -> None:
+        """Run jobs in policy order."""
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._next_job()
+                self._running += 1
+            try:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # Run in the submitter's context, e.g. to attribute memory to its request
+                    result = job.context.run(self._call, job)
+                except BaseException as e:
+                    job.future.set_exception(e)
+                else:
+                    job.future.set_result(result)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def _call(self, job: _Job) -> Any:
+        """Run a job as a memory accounting stage named after the scheduler."""
+        with memory_stage(self.name):
+            return job.fn(*job.args, **job.kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue length, running jobs and queued work, for diagnostics."""
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "queued": len(self._queue),
+                "running": self._running,
+                "queued_cost": sum(job.cost for job in self._queue),
+            }
+
+
+_schedulers: Dict[str, JobScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(kind: str) -> JobScheduler:
+    """
+    Get the process-wide scheduler of a kind of job.
+
+    Args:
+        kind: "transcription" or "summary"
+    """
+    with _schedulers_lock:
+        if kind not in _schedulers:
+            _schedulers[kind] = JobScheduler(kind, SCHEDULER_CONFIG[f"{kind}_concurrency"])
+        return _schedulers[kind]
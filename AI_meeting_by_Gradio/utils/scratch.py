@@ -0,0 +1,212 @@
+"""
+Scratch space for temporary files of the meeting recorder application.
+
+Every temporary file (uploads, audio chunks, recordings) lives in a directory
+under one configurable root, which can be put on a tmpfs. Directories are
+named after the owning process, so a periodic janitor can remove the ones left
+behind by crashed processes as well as anything older than the maximum age.
+A disk quota applies backpressure: a request that needs space waits until
+enough has been released, and fails with `ScratchSpaceFull` if it does not
+become available in time.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import shutil
+import tempfile
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SCRATCH_CONFIG
+
+
+class ScratchSpaceFull(Exception):
+    """Raised when the scratch quota does not free up in time."""
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check whether a process with the given pid exists on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScratchSpace:
+    """Quota-limited temporary directories under one root, with a janitor for orphans."""
+
+    def __init__(self, root: str = None, quota_bytes: int = None, max_age: float = None,
+                 janitor_interval: float = None, wait_timeout: float = None):
+        """
+        Initialize the scratch space.
+
+        Args:
+            root: Directory holding all scratch directories (default from SCRATCH_CONFIG)
+            quota_bytes: Maximum total size of the scratch space; 0 disables the quota
+            max_age: Seconds after which the janitor removes a directory even if its owner is alive
+            janitor_interval: Seconds between janitor runs; 0 disables the janitor thread
+            wait_timeout: Seconds a request waits for space before ScratchSpaceFull is raised
+        """
+        self.root = root or SCRATCH_CONFIG["root"]
+        self.quota_bytes = quota_bytes if quota_bytes is not None else SCRATCH_CONFIG["quota_mb"] * 1024 * 1024
+        self.max_age = max_age or SCRATCH_CONFIG["max_age"]
+        self.janitor_interval = janitor_interval if janitor_interval is not None else SCRATCH_CONFIG["janitor_interval"]
+        self.wait_timeout = wait_timeout if wait_timeout is not None else SCRATCH_CONFIG["wait_timeout"]
+        os.makedirs(self.root, exist_ok=True)
+
+        # Space promised to requests in this process that have not written their files yet
+        self._reserved = 0
+        self._space_freed = threading.Condition()
+        self._janitor = None
+        self._janitor_pid = None
+
+    def mkdtemp(self, prefix: str = "tmp") -> str:
+        """Create a scratch directory that the caller must `release`."""
+        self._ensure_janitor()
+        return tempfile.mkdtemp(prefix=f"{prefix}-{os.getpid()}-", dir=self.root)
+
+    def release(self, path: str) -> None:
+        """Remove a scratch directory or file and wake up requests waiting for space."""
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+        with self._space_freed:
+            self._space_freed.notify_all()
+
+    @contextmanager
+    def directory(self, prefix: str = "req", reserve_bytes: int = 0) -> Iterator[str]:
+        """
+        Create a per-request scratch directory that is removed when the block exits, however it exits.
+
+        Args:
+            prefix: Name prefix of the directory
+            reserve_bytes: Space the request expects to write; waits for it under the quota
+
+        Raises:
+            ScratchSpaceFull: If the reserved space does not become available within the wait timeout
+        """
+        self.reserve(reserve_bytes)
+        path = None
+        try:
+            path = self.mkdtemp(prefix)
+            yield path
+        finally:
+            self.unreserve(reserve_bytes)
+            if path is not None:
+                self.release(path)
+
+    @asynccontextmanager
+    async def async_directory(self, prefix: str = "req", reserve_bytes: int = 0) -> AsyncIterator[str]:
+        """Like `directory`, but waits for quota in a worker thread so the event loop is not blocked."""
+        await asyncio.to_thread(self.reserve, reserve_bytes)
+        path = None
+        try:
+            path = self.mkdtemp(prefix)
+            yield path
+        finally:
+            self.unreserve(reserve_bytes)
+            if path is not None:
+                self.release(path)
+
+    def usage(self) -> int:
+        """Total size in bytes of the files under the scratch root."""
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(directory, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def reserve(self, nbytes: int) -> None:
+        """Wait until `nbytes` fit under the quota and reserve them."""
+        if not nbytes or not self.quota_bytes:
+            return
+        if nbytes > self.quota_bytes:
+            raise ScratchSpaceFull(f"臨時空間不足: 需要 {nbytes} 字節，超過配額 {self.quota_bytes} 字節")
+        deadline = time.time() + self.wait_timeout
+        with self._space_freed:
+            while self.usage() + self._reserved + nbytes > self.quota_bytes:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ScratchSpaceFull("臨時空間已滿，請稍後再試")
+                # Space may also be freed by other processes, so wake up periodically
+                self._space_freed.wait(min(remaining, 1.0))
+            self._reserved += nbytes
+
+    def unreserve(self, nbytes: int) -> None:
+        """Return reserved space once the request is done with it."""
+        if not nbytes or not self.quota_bytes:
+            return
+        with self._space_freed:
+            self._reserved -= nbytes
+            self._space_freed.notify_all()
+
+    def clean_orphans(self) -> int:
+        """
+        Remove scratch entries whose owning process is gone or that are older than the maximum age.
+
+        Returns:
+            int: Number of entries removed
+        """
+        removed = 0
+        now = time.time()
+        for entry in os.scandir(self.root):
+            try:
+                age = now - entry.stat(follow_symlinks=False).st_mtime
+            except OSError:
+                continue
+            try:
+                owner = int(entry.name.split("-")[1])
+            except (IndexError, ValueError):
+                owner = None
+            orphaned = owner is not None and owner != os.getpid() and not _pid_alive(owner)
+            if orphaned or age > self.max_age:
+                self.release(entry.path)
+                removed += 1
+        return removed
+
+    def _ensure_janitor(self) -> None:
+        """Start the janitor thread of this process on first use (again after a fork)."""
+        if not self.janitor_interval or self._janitor_pid == os.getpid():
+            return
+        with self._space_freed:
+            if self._janitor_pid == os.getpid():
+                return
+            self._janitor_pid = os.getpid()
+            self._janitor = threading.Thread(target=self._janitor_loop, name="scratch-janitor", daemon=True)
+            self._janitor.start()
+
+    def _janitor_loop(self) -> None:
+        """Periodically remove orphaned scratch entries."""
+        while True:
+            try:
+                removed = self.clean_orphans()
+                if removed:
+                    print(f"臨時空間清理: 移除了 {removed} 個過期或無主的目錄")
+            except Exception as e:
+                print(f"Error cleaning scratch space: {str(e)}")
+            time.sleep(self.janitor_interval)
+
+
+_scratch_space = None
+_scratch_space_lock = threading.Lock()
+
+
+def get_scratch_space() -> ScratchSpace:
+    """Get the process-wide scratch space."""
+    global _scratch_space
+    with _scratch_space_lock:
+        if _scratch_space is None:
+            _scratch_space = ScratchSpace()
+        return _scratch_space
@@ -0,0 +1,91 @@
+"""
+Request coalescing for the meeting recorder application.
+
+Identical requests that arrive while one of them is still running share its
+result instead of calling the upstream API again. Within a process the
+waiters block on the leader's Future; across worker processes the leader
+holds a lease in the shared state store and publishes its result there, and
+the other processes poll for it. If the leader fails, its waiters in the same
+process get the exception, and a waiter in another process takes over the
+lease and runs the call itself.
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+# 添加項目根目錄到 Python 路徑
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SINGLE_FLIGHT_CONFIG
+from utils.state_store import SharedStateStore, get_state_store
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self, namespace: str, store: SharedStateStore = None, lease_ttl: float = None,
+                 result_ttl: float = None, poll_interval: float = None):
+        """
+        Initialize the group.
+
+        Args:
+            namespace: Name of the kind of call, e.g. "transcription"; keys are only shared within a namespace
+            store: Shared state store (default: the process-wide store)
+            lease_ttl: Seconds a leader may run before another process takes over
+            result_ttl: Seconds a finished result is still handed to late duplicates
+            poll_interval: Seconds between checks for another process's result
+        """
+        self.store = store or get_state_store()
+        self.lease_namespace = f"single_flight_lease:{namespace}"
+        self.result_namespace = f"single_flight_result:{namespace}"
+        self.lease_ttl = lease_ttl or SINGLE_FLIGHT_CONFIG["lease_ttl"]
+        self.result_ttl = result_ttl if result_ttl is not None else SINGLE_FLIGHT_CONFIG["result_ttl"]
+        self.poll_interval = poll_interval or SINGLE_FLIGHT_CONFIG["poll_interval"]
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call `fn(*args, **kwargs)` unless an identical call (same key) is already running.
+
+        The result must be JSON-serializable so it can be shared across processes.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._run_shared(key, fn, *args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def _run_shared(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run the call as the cross-process leader, or wait for another process's result."""
+        pid = os.getpid()
+        while True:
+            shared = self.store.get(self.result_namespace, key)
+            if shared is not None:
+                return shared["result"]
+            if self.store.add(self.lease_namespace, key, pid, ttl=self.lease_ttl):
+                try:
+                    result = fn(*args, **kwargs)
+                    if self.result_ttl:
+                        self.store.set(self.result_namespace, key, {"result": result}, ttl=self.result_ttl)
+                    return result
+                finally:
+                    self.store.delete(self.lease_namespace, key)
+            time.sleep(self.poll_interval)
@@ -0,0 +1,242 @@
+"""
+Process-safe shared state for the meeting recorder application.
+
+All API worker processes (and the Gradio app) open the same SQLite database,
+so job state, caches, counters and transcription history behave the same no
+matter how many workers are serving requests.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# 添加項目根目錄到 Python 路徑
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STATE_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at) WHERE expires_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS list_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS list_items_key ON list_items (namespace, key, id);
+"""
+
+
+class SharedStateStore:
+    """SQLite-backed key/value and list store shared between processes."""
+
+    def __init__(self, db_path: str = None, busy_timeout: float = None):
+        """
+        Initialize the store.
+
+        Args:
+            db_path: Path of the SQLite database; every worker must use the same file
+            busy_timeout: Seconds to wait for a lock held by another process
+        """
+        self.db_path = db_path or STATE_CONFIG["db_path"]
+        self.busy_timeout = busy_timeout if busy_timeout is not None else STATE_CONFIG["busy_timeout"]
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in a write transaction that excludes other processes."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Key/value -------------------------------------------------------------
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """Get a value, or `default` if it is missing or expired."""
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Set a value, optionally expiring after `ttl` seconds."""
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now)
+        )
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set a value only if the key is absent or expired. Returns True if it was set."""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now)
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str) -> None:
+        """Delete a value."""
+        self._conn().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def incr(self, namespace: str, key: str, amount: float = 1, ttl: Optional[float] = None) -> float:
+        """Atomically add `amount` to a numeric value and return the new value."""
+        with self.transaction() as conn:
+            now = time.time()
+            row = conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, now)
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+            return value
+
+    def keys(self, namespace: str) -> List[str]:
+        """List the live keys of a namespace."""
+        rows = self._conn().execute(
+            "SELECT key FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY key",
+            (namespace, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        """Get the live keys of a namespace with their values."""
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY key",
+            (namespace, time.time())
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    # Lists -----------------------------------------------------------------
+
+    def append(self, namespace: str, key: str, value: Any, max_items: Optional[int] = None) -> None:
+        """Append a value to a list, dropping the oldest values beyond `max_items`."""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO list_items (namespace, key, value, created_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            if max_items:
+                conn.execute(
+                    "DELETE FROM list_items WHERE namespace = ? AND key = ? AND id NOT IN "
+                    "(SELECT id FROM list_items WHERE namespace = ? AND key = ? ORDER BY id DESC LIMIT ?)",
+                    (namespace, key, namespace, key, max_items)
+                )
+
+    def get_list(self, namespace: str, key: str) -> List[Any]:
+        """Get all values of a list in insertion order."""
+        rows = self._conn().execute(
+            "SELECT value FROM list_items WHERE namespace = ? AND key = ? ORDER BY id",
+            (namespace, key)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def clear_list(self, namespace: str, key: str) -> None:
+        """Remove all values of a list."""
+        self._conn().execute("DELETE FROM list_items WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def list_updated_at(self, namespace: str, key: str) -> Optional[float]:
+        """Get the time of the newest value of a list, or None if it is empty."""
+        row = self._conn().execute(
+            "SELECT MAX(created_at) FROM list_items WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row[0]
+
+    def evict_lists(self, namespace: str, max_age: Optional[float] = None, max_keys: Optional[int] = None) -> int:
+        """
+        Drop whole lists of a namespace.
+
+        Args:
+            namespace: Namespace to clean up
+            max_age: Drop lists whose newest value is older than this many seconds
+            max_keys: Keep only this many most recently updated lists
+
+        Returns:
+            int: Number of lists dropped
+        """
+        with self.transaction() as conn:
+            rows = conn.execute(
+                "SELECT key, MAX(created_at) AS updated_at FROM list_items WHERE namespace = ? "
+                "GROUP BY key ORDER BY updated_at DESC",
+                (namespace,)
+            ).fetchall()
+            cutoff = time.time() - max_age if max_age else None
+            stale = [
+                key for index, (key, updated_at) in enumerate(rows)
+                if (cutoff is not None and updated_at < cutoff) or (max_keys is not None and index >= max_keys)
+            ]
+            conn.executemany(
+                "DELETE FROM list_items WHERE namespace = ? AND key = ?", [(namespace, key) for key in stale]
+            )
+            return len(stale)
+
+    # Maintenance -----------------------------------------------------------
+
+    def purge_expired(self) -> int:
+        """Delete expired keys and return how many were removed."""
+        cursor = self._conn().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Get row counts, for diagnostics."""
+        conn = self._conn()
+        return {
+            "kv": conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0],
+            "list_items": conn.execute("SELECT COUNT(*) FROM list_items").fetchone()[0],
+        }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_state_store() -> SharedStateStore:
+    """Get the process-wide store configured by STATE_CONFIG."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = SharedStateStore()
+    return _default_store
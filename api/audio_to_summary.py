@@ -3,12 +3,14 @@
 提供將會議錄音轉換為文字並生成結構化摘要的 API 端點
 """
 import os
-import tempfile
+import uuid
+import shutil
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, FastAPI, Header
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, FastAPI, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uvicorn
 import sys
 
@@ -26,17 +28,30 @@ if ai_meeting_dir not in sys.path:
 
 # 導入現有的轉錄和摘要模組
 from core.transcription.transcriber import Transcriber
+from core.transcription.engines import TranscriptionError
 from core.summary.generator import SummaryGenerator
+from core.summary import estimate_tokens
+from utils.openai_client import get_client_pool
+from utils.scratch import ScratchSpaceFull, get_scratch_space
+from utils.audio_utils import AudioPreflightError, preflight_audio
+from utils.audio_pool import get_audio_pool
+from utils.memory import memory_stage
+from utils.quota import get_quota_manager, key_id
+from api.quota import enforce_quota
+from utils.admission import get_admission_controller, refine_current_cost
+from utils.scheduler import get_scheduler
 
 # 定義模型
 class AudioProcessRequest(BaseModel):
     audio_file_path: str
     meeting_title: Optional[str] = None
     participants: Optional[List[str]] = None
+    structured: bool = False
 
 class TranscriptionSummaryResponse(BaseModel):
     transcription: str
     summary: str
+    structured: Optional[Dict[str, Any]] = None
     status: str
     message: Optional[str] = None
 
@@ -47,13 +62,37 @@ router = APIRouter()
 transcriber = Transcriber()
 summary_generator = SummaryGenerator()
 
+# 轉錄和摘要任務的調度器（按 SCHEDULER_POLICY 選擇下一個執行的任務）
+transcription_scheduler = get_scheduler("transcription")
+summary_scheduler = get_scheduler("summary")
+
+# 按 API 密鑰緩存的 OpenAI 客戶端池
+client_pool = get_client_pool()
+
+# 上傳文件的臨時空間（配額和清理由 SCRATCH_CONFIG 控制）
+scratch = get_scratch_space()
+
+async def summarize_transcription(transcription, meeting_title, participants, client, api_key, structured=False):
+    """
+    生成摘要（在調度器中排隊，以轉錄的 token 數作為任務大小）
+
+    返回 (摘要, 結構化摘要)；非結構化模式或結構化摘要無效時結構化摘要為 None
+    """
+    kwargs = dict(meeting_title=meeting_title, participants=participants, client=client,
+                  cost=estimate_tokens(transcription), tenant=key_id(api_key))
+    if structured:
+        return await summary_scheduler.run(summary_generator.generate_structured_summary, transcription, **kwargs)
+    return await summary_scheduler.run(summary_generator.generate_summary, transcription, **kwargs), None
+
 @router.post("/api/audio-to-summary", response_model=TranscriptionSummaryResponse)
 async def audio_to_summary(
-    background_tasks: BackgroundTasks,
+    response: Response,
     file: UploadFile = File(...),
     meeting_title: str = Form(""),
     participants: str = Form(""),
-    x_api_key: Optional[str] = Header(None)
+    structured: bool = Form(False),
+    x_api_key: Optional[str] = Header(None),
+    x_session_id: Optional[str] = Header(None)
 ):
     """
     處理上傳的音頻文件，進行轉錄並生成摘要
@@ -61,7 +100,9 @@ async def audio_to_summary(
     - **file**: 上傳的音頻文件（WAV、MP3、M4A 等格式）
     - **meeting_title**: 會議標題（可選）
     - **participants**: 參與者列表，以逗號分隔（可選）
+    - **structured**: 是否以結構化模式生成摘要（可選），為 true 時在 structured 字段中返回經過驗證的 JSON 摘要
     - **x_api_key**: OpenAI API 密鑰（可從請求頭獲取）
+    - **x_session_id**: 會議/會話 ID（可選，從請求頭獲取），同一會議的轉錄結果保存在一起
     
     返回轉錄文本和生成的會議摘要
     """
@@ -71,50 +112,64 @@ async def audio_to_summary(
         if not api_key:
             raise HTTPException(status_code=401, detail="未提供 OpenAI API 密鑰，請在請求頭中添加 X-API-KEY 或設置環境變數 OPENAI_API_KEY")
         
-        # 臨時設置 OpenAI API 密鑰
-        os.environ["OPENAI_API_KEY"] = api_key
+        # 獲取綁定該 API 密鑰的客戶端（不修改全局環境變量，不同租戶的請求可以並發執行）
+        client = client_pool.get(api_key)
+        
+        # 未指定會話時每個請求使用獨立的會話，避免不同調用者的轉錄歷史混在一起
+        session_id = x_session_id or uuid.uuid4().hex
         
         # 解析參與者列表
         participants_list = [p.strip() for p in participants.split(",") if p.strip()]
         
-        # 保存上傳的文件
-        temp_dir = tempfile.mkdtemp()
-        temp_file_path = os.path.join(temp_dir, file.filename)
-        
-        with open(temp_file_path, "wb") as temp_file:
-            temp_file.write(await file.read())
-        
-        # 轉錄音頻文件
-        transcription = transcriber.transcribe_audio(temp_file_path)
-        
-        if "失敗" in transcription or "錯誤" in transcription:
-            # 清理臨時文件
-            background_tasks.add_task(lambda: os.remove(temp_file_path) if os.path.exists(temp_file_path) else None)
-            background_tasks.add_task(lambda: os.rmdir(temp_dir) if os.path.exists(temp_dir) else None)
+        # 在請求專用的臨時目錄中轉錄，無論成功或出錯，離開時都會刪除
+        async with scratch.async_directory("upload", reserve_bytes=file.size or 0) as temp_dir:
+            temp_file_path = os.path.join(temp_dir, os.path.basename(file.filename or "audio"))
             
-            return TranscriptionSummaryResponse(
-                transcription="",
-                summary="",
-                status="error",
-                message=transcription
+            # 分塊保存上傳的文件，不把整個文件讀入內存
+            with memory_stage("save_upload"), open(temp_file_path, "wb") as temp_file:
+                await run_in_threadpool(shutil.copyfileobj, file.file, temp_file)
+            
+            # 只讀取文件頭和少量採樣檢查文件，空白、損壞或靜音的文件不會調用轉錄（在音頻進程池中執行，不阻塞事件循環）
+            audio_info = await get_audio_pool().run_async(preflight_audio, temp_file_path)
+            logger.info(f"音頻預檢通過: {file.filename}, 格式 {audio_info['format']}, 時長 {audio_info['duration']:.0f} 秒, "
+                        f"預計費用 ${audio_info['estimated_cost']:.3f}, 預計耗時 {audio_info['estimated_seconds']:.0f} 秒")
+            
+            # 按實際錄音時長更新准入控制的工作量估算
+            refine_current_cost(get_admission_controller().estimate_cost(audio_seconds=audio_info["duration"], summary=True))
+            
+            # 開始轉錄前扣除該 API 密鑰的配額，摘要 token 按錄音時長預估
+            await enforce_quota(
+                api_key, response, requests=1, audio_seconds=audio_info["duration"],
+                summary_tokens=get_quota_manager().estimate_summary_tokens(audio_seconds=audio_info["duration"])
+            )
+            
+            # 轉錄音頻文件（在調度器中排隊，以錄音時長作為任務大小）
+            transcription = await transcription_scheduler.run(
+                transcriber.transcribe_audio, temp_file_path, client=client, session_id=session_id,
+                cost=audio_info["duration"], tenant=key_id(api_key)
             )
         
-        # 生成摘要
-        summary = summary_generator.generate_summary(
-            transcription, 
-            meeting_title=meeting_title, 
-            participants=participants_list
+        summary, structured_summary = await summarize_transcription(
+            transcription, meeting_title, participants_list, client, api_key, structured
         )
-        
-        # 清理臨時文件
-        background_tasks.add_task(lambda: os.remove(temp_file_path) if os.path.exists(temp_file_path) else None)
-        background_tasks.add_task(lambda: os.rmdir(temp_dir) if os.path.exists(temp_dir) else None)
+        if structured and structured_summary is None:
+            return TranscriptionSummaryResponse(transcription=transcription, summary="", status="error", message=summary)
         
         return TranscriptionSummaryResponse(
             transcription=transcription,
             summary=summary,
+            structured=structured_summary,
             status="success"
         )
+    except HTTPException:
+        raise
+    except AudioPreflightError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TranscriptionError as e:
+        logger.error(f"轉錄失敗: {str(e)}")
+        return TranscriptionSummaryResponse(transcription="", summary="", status="error", message=str(e))
+    except ScratchSpaceFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(scratch.wait_timeout))})
     except Exception as e:
         logger.error(f"處理音頻到摘要時發生錯誤: {str(e)}")
         return TranscriptionSummaryResponse(
@@ -125,14 +180,16 @@ async def audio_to_summary(
         )
 
 @router.post("/api/process-audio-file", response_model=TranscriptionSummaryResponse)
-async def process_audio_file_api(request: AudioProcessRequest, x_api_key: Optional[str] = Header(None)):
+async def process_audio_file_api(request: AudioProcessRequest, response: Response, x_api_key: Optional[str] = Header(None), x_session_id: Optional[str] = Header(None)):
     """
     處理本地音頻文件，進行轉錄並生成摘要
     
     - **audio_file_path**: 本地音頻文件路徑
     - **meeting_title**: 會議標題（可選）
     - **participants**: 參與者列表（可選）
+    - **structured**: 是否以結構化模式生成摘要（可選）
     - **x_api_key**: OpenAI API 密鑰（可從請求頭獲取）
+    - **x_session_id**: 會議/會話 ID（可選，從請求頭獲取），同一會議的轉錄結果保存在一起
     
     返回轉錄文本和生成的會議摘要
     """
@@ -142,37 +199,50 @@ async def process_audio_file_api(request: AudioProcessRequest, x_api_key: Option
         if not api_key:
             raise HTTPException(status_code=401, detail="未提供 OpenAI API 密鑰，請在請求頭中添加 X-API-KEY 或設置環境變數 OPENAI_API_KEY")
         
-        # 臨時設置 OpenAI API 密鑰
-        os.environ["OPENAI_API_KEY"] = api_key
+        # 獲取綁定該 API 密鑰的客戶端（不修改全局環境變量，不同租戶的請求可以並發執行）
+        client = client_pool.get(api_key)
+        
+        # 未指定會話時每個請求使用獨立的會話，避免不同調用者的轉錄歷史混在一起
+        session_id = x_session_id or uuid.uuid4().hex
         
         # 檢查文件是否存在
         if not request.audio_file_path or not os.path.exists(request.audio_file_path):
             raise HTTPException(status_code=400, detail="音頻文件路徑無效或文件不存在")
         
-        # 轉錄音頻文件
-        transcription = transcriber.transcribe_audio(request.audio_file_path)
+        # 檢查文件並在開始轉錄前扣除該 API 密鑰的配額
+        audio_info = await get_audio_pool().run_async(preflight_audio, request.audio_file_path)
+        refine_current_cost(get_admission_controller().estimate_cost(audio_seconds=audio_info["duration"], summary=True))
+        await enforce_quota(
+            api_key, response, requests=1, audio_seconds=audio_info["duration"],
+            summary_tokens=get_quota_manager().estimate_summary_tokens(audio_seconds=audio_info["duration"])
+        )
         
-        if "失敗" in transcription or "錯誤" in transcription:
-            return TranscriptionSummaryResponse(
-                transcription="",
-                summary="",
-                status="error",
-                message=transcription
-            )
+        # 轉錄音頻文件（在調度器中排隊，以錄音時長作為任務大小）
+        transcription = await transcription_scheduler.run(
+            transcriber.transcribe_audio, request.audio_file_path, client=client, session_id=session_id,
+            cost=audio_info["duration"], tenant=key_id(api_key)
+        )
         
-        # 生成摘要
         participants = request.participants if request.participants else []
-        summary = summary_generator.generate_summary(
-            transcription, 
-            meeting_title=request.meeting_title, 
-            participants=participants
+        summary, structured_summary = await summarize_transcription(
+            transcription, request.meeting_title, participants, client, api_key, request.structured
         )
+        if request.structured and structured_summary is None:
+            return TranscriptionSummaryResponse(transcription=transcription, summary="", status="error", message=summary)
         
         return TranscriptionSummaryResponse(
             transcription=transcription,
             summary=summary,
+            structured=structured_summary,
             status="success"
         )
+    except HTTPException:
+        raise
+    except AudioPreflightError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TranscriptionError as e:
+        logger.error(f"轉錄失敗: {str(e)}")
+        return TranscriptionSummaryResponse(transcription="", summary="", status="error", message=str(e))
     except Exception as e:
         logger.error(f"處理音頻文件時發生錯誤: {str(e)}")
         raise HTTPException(status_code=500, detail=f"處理音頻文件時發生錯誤: {str(e)}")
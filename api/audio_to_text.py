@@ -4,10 +4,12 @@
 """
 
 import os
-import tempfile
+import uuid
+import shutil
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, FastAPI, Header
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, FastAPI, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import uvicorn
@@ -28,6 +30,16 @@ if ai_meeting_dir not in sys.path:
 
 # 導入現有的轉錄模組
 from core.transcription.transcriber import Transcriber
+from core.transcription.engines import TranscriptionError
+from utils.openai_client import get_client_pool
+from utils.scratch import ScratchSpaceFull, get_scratch_space
+from utils.audio_utils import AudioPreflightError, preflight_audio
+from utils.audio_pool import get_audio_pool
+from utils.memory import memory_stage
+from utils.quota import key_id
+from api.quota import enforce_quota
+from utils.admission import get_admission_controller, refine_current_cost
+from utils.scheduler import get_scheduler
 
 # 定義直接在文件中的模型
 class AudioTextRequest(BaseModel):
@@ -44,17 +56,28 @@ router = APIRouter()
 # 初始化轉錄器
 transcriber = Transcriber()
 
+# 轉錄和摘要任務的調度器（按 SCHEDULER_POLICY 選擇下一個執行的任務）
+transcription_scheduler = get_scheduler("transcription")
+
+# 按 API 密鑰緩存的 OpenAI 客戶端池
+client_pool = get_client_pool()
+
+# 上傳文件的臨時空間（配額和清理由 SCRATCH_CONFIG 控制）
+scratch = get_scratch_space()
+
 @router.post("/api/audio-to-text")
 async def audio_to_text(
-    background_tasks: BackgroundTasks,
+    response: Response,
     file: UploadFile = File(...),
-    x_api_key: Optional[str] = Header(None)
+    x_api_key: Optional[str] = Header(None),
+    x_session_id: Optional[str] = Header(None)
 ):
     """
     處理上傳的音頻文件，進行轉錄
     
     - **file**: 上傳的音頻文件（WAV、MP3、M4A 等格式）
     - **x_api_key**: OpenAI API 密鑰（可從請求頭獲取）
+    - **x_session_id**: 會議/會話 ID（可選，從請求頭獲取），同一會議的轉錄結果保存在一起
     
     返回轉錄文本
     """
@@ -64,30 +87,37 @@ async def audio_to_text(
         if not api_key:
             raise HTTPException(status_code=401, detail="未提供 OpenAI API 密鑰，請在請求頭中添加 X-API-KEY 或設置環境變數 OPENAI_API_KEY")
         
-        # 臨時設置 OpenAI API 密鑰
-        os.environ["OPENAI_API_KEY"] = api_key
-        
-        # 檢查文件是否為音頻文件
-        content_type = file.content_type
-        if not content_type or not content_type.startswith("audio/"):
-            raise HTTPException(status_code=400, detail="請上傳有效的音頻文件")
-        
-        # 創建臨時文件
-        temp_dir = tempfile.mkdtemp()
-        temp_file_path = os.path.join(temp_dir, file.filename)
+        # 獲取綁定該 API 密鑰的客戶端（不修改全局環境變量，不同租戶的請求可以並發執行）
+        client = client_pool.get(api_key)
         
-        # 保存上傳的文件
-        with open(temp_file_path, "wb") as buffer:
-            contents = await file.read()
-            buffer.write(contents)
+        # 未指定會話時每個請求使用獨立的會話，避免不同調用者的轉錄歷史混在一起
+        session_id = x_session_id or uuid.uuid4().hex
         
-        # 進行轉錄
-        logger.info(f"開始轉錄文件: {file.filename}")
-        transcription = transcriber.transcribe_audio(temp_file_path)
-        
-        # 清理臨時文件
-        background_tasks.add_task(os.remove, temp_file_path)
-        background_tasks.add_task(os.rmdir, temp_dir)
+        # 在請求專用的臨時目錄中處理，無論成功或出錯，離開時都會刪除
+        async with scratch.async_directory("upload", reserve_bytes=file.size or 0) as temp_dir:
+            temp_file_path = os.path.join(temp_dir, os.path.basename(file.filename or "audio"))
+            
+            # 分塊保存上傳的文件，不把整個文件讀入內存
+            with memory_stage("save_upload"), open(temp_file_path, "wb") as buffer:
+                await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
+            
+            # 只讀取文件頭和少量採樣檢查文件，空白、損壞或靜音的文件不會調用轉錄（在音頻進程池中執行，不阻塞事件循環）
+            audio_info = await get_audio_pool().run_async(preflight_audio, temp_file_path)
+            logger.info(f"音頻預檢通過: {file.filename}, 格式 {audio_info['format']}, 時長 {audio_info['duration']:.0f} 秒, "
+                        f"預計費用 ${audio_info['estimated_cost']:.3f}, 預計耗時 {audio_info['estimated_seconds']:.0f} 秒")
+            
+            # 按實際錄音時長更新准入控制的工作量估算
+            refine_current_cost(get_admission_controller().estimate_cost(audio_seconds=audio_info["duration"]))
+            
+            # 開始轉錄前扣除該 API 密鑰的配額
+            await enforce_quota(api_key, response, requests=1, audio_seconds=audio_info["duration"])
+            
+            # 進行轉錄（在調度器中排隊，以錄音時長作為任務大小）
+            logger.info(f"開始轉錄文件: {file.filename}")
+            transcription = await transcription_scheduler.run(
+                transcriber.transcribe_audio, temp_file_path, client=client, session_id=session_id,
+                cost=audio_info["duration"], tenant=key_id(api_key)
+            )
         
         return TranscriptionResponse(
             transcription=transcription,
@@ -95,6 +125,13 @@ async def audio_to_text(
         )
     except HTTPException:
         raise
+    except AudioPreflightError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TranscriptionError as e:
+        logger.error(f"轉錄失敗: {str(e)}")
+        return TranscriptionResponse(transcription="", status="error", message=str(e))
+    except ScratchSpaceFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(scratch.wait_timeout))})
     except Exception as e:
         logger.error(f"處理音頻轉文字時發生錯誤: {str(e)}")
         return TranscriptionResponse(
@@ -104,12 +141,13 @@ async def audio_to_text(
         )
 
 @router.post("/api/process-audio-text")
-async def process_audio_text_api(request: AudioTextRequest, x_api_key: Optional[str] = Header(None)):
+async def process_audio_text_api(request: AudioTextRequest, response: Response, x_api_key: Optional[str] = Header(None), x_session_id: Optional[str] = Header(None)):
     """
     處理本地音頻文件，進行轉錄
     
     - **audio_file_path**: 本地音頻文件路徑
     - **x_api_key**: OpenAI API 密鑰（可從請求頭獲取）
+    - **x_session_id**: 會議/會話 ID（可選，從請求頭獲取），同一會議的轉錄結果保存在一起
     
     返回轉錄文本
     """
@@ -119,16 +157,27 @@ async def process_audio_text_api(request: AudioTextRequest, x_api_key: Optional[
         if not api_key:
             raise HTTPException(status_code=401, detail="未提供 OpenAI API 密鑰，請在請求頭中添加 X-API-KEY 或設置環境變數 OPENAI_API_KEY")
         
-        # 臨時設置 OpenAI API 密鑰
-        os.environ["OPENAI_API_KEY"] = api_key
+        # 獲取綁定該 API 密鑰的客戶端（不修改全局環境變量，不同租戶的請求可以並發執行）
+        client = client_pool.get(api_key)
+        
+        # 未指定會話時每個請求使用獨立的會話，避免不同調用者的轉錄歷史混在一起
+        session_id = x_session_id or uuid.uuid4().hex
         
         # 檢查文件是否存在
         if not os.path.exists(request.audio_file_path):
             raise HTTPException(status_code=400, detail="音頻文件不存在")
         
-        # 進行轉錄
+        # 檢查文件並在開始轉錄前扣除該 API 密鑰的配額
+        audio_info = await get_audio_pool().run_async(preflight_audio, request.audio_file_path)
+        refine_current_cost(get_admission_controller().estimate_cost(audio_seconds=audio_info["duration"]))
+        await enforce_quota(api_key, response, requests=1, audio_seconds=audio_info["duration"])
+        
+        # 進行轉錄（在調度器中排隊，以錄音時長作為任務大小）
         logger.info(f"開始轉錄文件: {request.audio_file_path}")
-        transcription = transcriber.transcribe_audio(request.audio_file_path)
+        transcription = await transcription_scheduler.run(
+            transcriber.transcribe_audio, request.audio_file_path, client=client, session_id=session_id,
+            cost=audio_info["duration"], tenant=key_id(api_key)
+        )
         
         return TranscriptionResponse(
             transcription=transcription,
@@ -136,6 +185,11 @@ async def process_audio_text_api(request: AudioTextRequest, x_api_key: Optional[
         )
     except HTTPException:
         raise
+    except AudioPreflightError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TranscriptionError as e:
+        logger.error(f"轉錄失敗: {str(e)}")
+        return TranscriptionResponse(transcription="", status="error", message=str(e))
     except Exception as e:
         logger.error(f"處理音頻轉文字時發生錯誤: {str(e)}")
         return TranscriptionResponse(
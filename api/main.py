@@ -4,7 +4,8 @@
 """
 
 import uvicorn
-from fastapi import FastAPI, Request
+import hmac
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, JSONResponse
 import sys
@@ -22,6 +23,12 @@ if ai_meeting_dir not in sys.path:
 from api.text_to_summary import router as text_router
 from api.audio_to_text import router as audio_text_router
 from api.audio_to_summary import router as audio_summary_router
+from api.meetings import router as meetings_router
+from utils.admission import Overloaded, current_ticket, get_admission_controller
+from utils.readiness import get_readiness_probe
+from utils.profiling import get_profiler
+from utils.memory import get_memory_tracker
+from config import READINESS_CONFIG, MEMORY_CONFIG
 
 # 創建主應用
 app = FastAPI(
@@ -46,6 +53,7 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
+from starlette.concurrency import run_in_threadpool
 
 class LimitUploadSize(BaseHTTPMiddleware):
     def __init__(self, app, max_upload_size: int):
@@ -64,6 +72,96 @@ class LimitUploadSize(BaseHTTPMiddleware):
                     )
         return await call_next(request)
 
+class AdmissionControl(BaseHTTPMiddleware):
+    """按預估工作量接收請求，已承諾的工作無法在 SLO 內完成時返回 503 和 Retry-After"""
+
+    # 需要准入控制的路徑及其工作量的估算方式
+    COSTED_PATHS = {
+        "/api/audio-to-text": "audio",
+        "/api/audio-to-summary": "audio_summary",
+        "/api/text-to-summary": "text",
+        "/api/process-audio-text": "file",
+        "/api/process-audio-file": "file",
+    }
+
+    def __init__(self, app, controller=None):
+        super().__init__(app)
+        self.controller = controller or get_admission_controller()
+
+    def estimate_cost(self, request: Request):
+        """在讀取請求體之前按路徑和上傳大小估算工作量（秒），不需要准入控制的請求返回 None"""
+        kind = self.COSTED_PATHS.get(request.url.path)
+        if request.method != "POST" or kind is None:
+            return None
+        content_length = int(request.headers.get("content-length") or 0)
+        if kind in ("audio", "audio_summary"):
+            audio_seconds = content_length / self.controller.config["upload_bytes_per_audio_second"]
+            return self.controller.estimate_cost(audio_seconds=audio_seconds, summary=kind == "audio_summary")
+        if kind == "text":
+            # UTF-8 中文每個字 3 字節，約為 1 個 token
+            return self.controller.estimate_cost(prompt_tokens=content_length // 3)
+        # 本地文件的時長在處理函數中預檢後才知道
+        return self.controller.estimate_cost()
+
+    async def dispatch(self, request: Request, call_next):
+        cost = self.estimate_cost(request)
+        if cost is None or not self.controller.config["enabled"]:
+            return await call_next(request)
+        try:
+            ticket = await self.controller.admit(cost)
+        except Overloaded as e:
+            return JSONResponse(
+                status_code=503,
+                content={"detail": str(e)},
+                headers={"Retry-After": str(int(e.retry_after) + 1)}
+            )
+        # 處理函數得到準確的錄音時長後可以通過 refine_current_cost 更新工作量
+        token = current_ticket.set(ticket)
+        try:
+            return await call_next(request)
+        finally:
+            current_ticket.reset(token)
+            await run_in_threadpool(ticket.release)
+
+class RequestProfiling(BaseHTTPMiddleware):
+    """分析帶有管理員 X-Profile 請求頭或被隨機抽中的請求，分析文件名在 X-Profile-Id 響應頭中返回"""
+
+    def __init__(self, app, profiler=None):
+        super().__init__(app)
+        self.profiler = profiler or get_profiler()
+
+    async def dispatch(self, request: Request, call_next):
+        if not self.profiler.enabled or not self.profiler.should_profile(request.headers.get("x-profile")):
+            return await call_next(request)
+        with self.profiler.profile(f"{request.method}_{request.url.path}") as profile_id:
+            response = await call_next(request)
+        if profile_id:
+            response.headers["X-Profile-Id"] = profile_id
+        return response
+
+class MemoryAccounting(BaseHTTPMiddleware):
+    """按請求和處理階段記錄上傳、轉錄和摘要請求的內存用量，寫入日誌並在 /debug/memory 中列出"""
+
+    def __init__(self, app, tracker=None):
+        super().__init__(app)
+        self.tracker = tracker or get_memory_tracker()
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method != "POST" or request.url.path not in AdmissionControl.COSTED_PATHS:
+            return await call_next(request)
+        # 包括請求體的解析（上傳文件寫入臨時文件）
+        with self.tracker.request(f"{request.method} {request.url.path}"):
+            return await call_next(request)
+
+# 添加准入控制中間件（在上傳大小限制之後執行）
+app.add_middleware(AdmissionControl)
+
+# 添加性能分析中間件（包含准入控制在內的整個請求處理過程）
+app.add_middleware(RequestProfiling)
+
+# 添加內存用量統計中間件
+app.add_middleware(MemoryAccounting)
+
 # 添加最大上傳大小限制中間件 (100MB)
 app.add_middleware(LimitUploadSize, max_upload_size=100 * 1024 * 1024)
 
@@ -71,6 +169,7 @@ app.add_middleware(LimitUploadSize, max_upload_size=100 * 1024 * 1024)
 app.include_router(text_router, tags=["文字轉摘要"])
 app.include_router(audio_text_router, tags=["音頻轉文字"])
 app.include_router(audio_summary_router, tags=["音頻轉摘要"])
+app.include_router(meetings_router, tags=["會議記錄"])
 
 # 添加 OPTIONS 方法的全局處理
 @app.options("/{full_path:path}")
@@ -86,11 +185,44 @@ async def root():
     """重定向到 API 文檔"""
     return RedirectResponse(url="/docs")
 
+@app.on_event("startup")
+async def warm_up():
+    """在後台預熱連接池和進程池、探測模型提供者並預加載 Ollama 模型，不阻塞服務啟動"""
+    if READINESS_CONFIG["warm_on_startup"]:
+        get_readiness_probe().start()
+
 @app.get("/health", tags=["健康檢查"])
 async def health_check():
-    """API 健康檢查端點"""
+    """API 健康檢查端點（存活探針：進程能響應即返回 200）"""
     return {"status": "healthy"}
 
+@app.get("/ready", tags=["健康檢查"])
+async def readiness_check():
+    """
+    API 就緒檢查端點（就緒/啟動探針）
+
+    預熱完成且所有必需的依賴可用時返回 200，否則返回 503；
+    響應中包含每個依賴的檢查結果和延遲（毫秒）。檢查在後台執行，本端點不會等待檢查完成
+    """
+    report = get_readiness_probe().status()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/debug/memory", tags=["健康檢查"])
+async def debug_memory(top: int = Query(20, ge=1, le=200), x_admin_token: str = Header(None)):
+    """
+    內存用量診斷端點（需要在 X-Admin-Token 請求頭中提供 MEMORY_DEBUG_TOKEN）
+
+    返回本進程的當前和峰值 RSS、各處理階段的最大內存增長、最近請求的內存用量（峰值增長最大的在前），
+    啟用 MEMORY_TRACEMALLOC 時還包括分配內存最多的代碼位置
+    - **top**: 列出的分配位置數量
+    """
+    token = MEMORY_CONFIG["admin_token"]
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="管理員令牌無效")
+    return await run_in_threadpool(get_memory_tracker().stats, top)
+
 if __name__ == "__main__":
-    # 使用字符串導入方式運行應用
+    # 開發模式：單進程並自動重載；生產環境請使用 `python -m api.serve` 以多工作進程運行
     uvicorn.run("api.main:app", host="0.0.0.0", port=8080, reload=True)
@@ -0,0 +1,281 @@
+"""
+會議記錄查詢 API
+提供已導出會議記錄的列表、全文搜索、語義搜索、詳情查詢、文件下載，以及行動項目和決策查詢 API 端點
+"""
+
+import os
+import hmac
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, FastAPI, Header, Query
+from fastapi.responses import FileResponse
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+import uvicorn
+import sys
+
+# 添加項目根目錄到 Python 路徑，以便正確導入模塊
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 設置日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meetings_api")
+
+# 添加 AI_meeting_by_Gradio 目錄到 Python 路徑
+ai_meeting_dir = os.path.join(os.path.dirname(__file__), '..', 'AI_meeting_by_Gradio')
+if ai_meeting_dir not in sys.path:
+    sys.path.append(ai_meeting_dir)
+
+# 導入現有的導出模組
+from core.export.exporter import Exporter
+from core.export.writers import EXPORT_FORMATS, format_for_path
+from config import EXPORT_CONFIG
+
+# 定義響應模型
+class MeetingItem(BaseModel):
+    """會議列表項"""
+    id: int
+    meeting_title: str
+    participants: List[str]
+    date: str
+    created_at: float
+    export_path: Optional[str] = None
+    snippet: Optional[str] = None
+
+class MeetingListResponse(BaseModel):
+    """分頁的會議列表響應模型"""
+    items: List[MeetingItem]
+    total: int
+    page: int
+    page_size: int
+
+class SemanticSearchItem(BaseModel):
+    """向量搜索結果項"""
+    id: int
+    meeting_title: str
+    participants: List[str]
+    date: str
+    created_at: float
+    export_path: Optional[str] = None
+    score: float
+    field: str
+    snippet: str
+
+class MeetingDetailResponse(BaseModel):
+    """會議詳情響應模型"""
+    id: int
+    meeting_title: str
+    participants: List[str]
+    date: str
+    created_at: float
+    export_path: Optional[str] = None
+    transcriptions: List[Dict[str, str]]
+    summary: str
+    structured_summary: Optional[Dict[str, Any]] = None
+
+class ActionItem(BaseModel):
+    """結構化摘要中的行動項目"""
+    meeting_id: int
+    meeting_title: str
+    meeting_date: str
+    task: str
+    owner: Optional[str] = None
+    due_date: Optional[str] = None
+    due_text: Optional[str] = None
+    status: str
+
+class ActionItemListResponse(BaseModel):
+    """分頁的行動項目列表響應模型"""
+    items: List[ActionItem]
+    total: int
+    page: int
+    page_size: int
+
+class DecisionItem(BaseModel):
+    """結構化摘要中的決策"""
+    meeting_id: int
+    meeting_title: str
+    meeting_date: str
+    decision: str
+    context: Optional[str] = None
+
+class DecisionListResponse(BaseModel):
+    """分頁的決策列表響應模型"""
+    items: List[DecisionItem]
+    total: int
+    page: int
+    page_size: int
+
+# 創建 APIRouter
+router = APIRouter()
+
+# 初始化導出器（與 Gradio 應用共用同一個導出目錄和會議檔案庫）
+exporter = Exporter()
+
+@router.on_event("startup")
+async def import_exports():
+    """在導出器的後台線程中把尚未加入檔案庫的導出文件（例如檔案庫建立前導出的文件）加入檔案庫，不阻塞服務啟動"""
+    def log_result(future):
+        try:
+            imported = future.result()
+        except Exception as e:
+            logger.error(f"導入已有導出文件時發生錯誤: {str(e)}")
+            return
+        if imported:
+            logger.info(f"已將 {imported} 個已有導出文件加入會議檔案庫")
+    exporter.import_exports_async().add_done_callback(log_result)
+
+def require_archive_token(x_archive_token: Optional[str] = Header(None)):
+    """
+    檢查會議記錄查詢端點的訪問令牌（請求頭 X-Archive-Token 需與 ARCHIVE_API_TOKEN 相同）
+
+    會議記錄包含所有調用者的轉錄和摘要，未配置令牌時一律拒絕訪問
+    """
+    token = EXPORT_CONFIG["api_token"]
+    if not x_archive_token:
+        raise HTTPException(status_code=401, detail="未提供會議記錄訪問令牌，請在請求頭中添加 X-Archive-Token")
+    if not token or not hmac.compare_digest(x_archive_token.encode("utf-8"), token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="會議記錄訪問令牌無效")
+
+@router.get("/api/meetings", response_model=MeetingListResponse, dependencies=[Depends(require_archive_token)])
+async def list_meetings(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100)
+):
+    """
+    列出已導出的會議記錄，最新的在前
+
+    - **page**: 頁碼（從 1 開始）
+    - **page_size**: 每頁數量（最多 100）
+    """
+    return await run_in_threadpool(exporter.list_meetings, page, page_size)
+
+@router.get("/api/meetings/search", response_model=MeetingListResponse, dependencies=[Depends(require_archive_token)])
+async def search_meetings(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100)
+):
+    """
+    按標題、參與者、轉錄內容和摘要全文搜索會議記錄，最相關的在前
+
+    - **q**: 搜索關鍵詞，多個關鍵詞以空格分隔（需全部匹配）
+    - **page**: 頁碼（從 1 開始）
+    - **page_size**: 每頁數量（最多 100）
+    """
+    try:
+        return await run_in_threadpool(exporter.search_meetings, q, page, page_size)
+    except Exception as e:
+        logger.error(f"搜索會議記錄時發生錯誤: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"搜索會議記錄時發生錯誤: {str(e)}")
+
+@router.get("/api/meetings/semantic-search", response_model=List[SemanticSearchItem], dependencies=[Depends(require_archive_token)])
+async def semantic_search_meetings(
+    q: str = Query(..., min_length=1),
+    k: int = Query(5, ge=1, le=50)
+):
+    """
+    按語義相似度搜索會議記錄（本地向量索引，不依賴外部服務），例如「哪次會議決定了 X？」
+
+    - **q**: 查詢內容
+    - **k**: 返回的會議數量（最多 50）
+
+    返回最相關的會議及最匹配的段落
+    """
+    return await run_in_threadpool(exporter.semantic_search, q, k)
+
+@router.get("/api/action-items", response_model=ActionItemListResponse, dependencies=[Depends(require_archive_token)])
+async def list_action_items(
+    owner: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, pattern="^(open|done)$"),
+    due_before: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    due_after: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    meeting_id: Optional[int] = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200)
+):
+    """
+    查詢已導出會議結構化摘要中的行動項目（本地索引查詢，不調用模型），截止日期最早的在前
+
+    - **owner**: 負責人（不區分大小寫的部分匹配）
+    - **status**: 狀態，open 或 done
+    - **due_before** / **due_after**: 截止日期範圍（YYYY-MM-DD，包含邊界）；截止時間不是具體日期（如「下週五」，見 due_text）的項目不會匹配
+    - **meeting_id**: 只返回該會議的行動項目
+    - **page**: 頁碼（從 1 開始）
+    - **page_size**: 每頁數量（最多 200）
+    """
+    return await run_in_threadpool(exporter.query_action_items, owner, status, due_before, due_after, meeting_id, page, page_size)
+
+@router.get("/api/decisions", response_model=DecisionListResponse, dependencies=[Depends(require_archive_token)])
+async def list_decisions(
+    q: Optional[str] = Query(None),
+    meeting_id: Optional[int] = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200)
+):
+    """
+    查詢已導出會議結構化摘要中的決策（本地索引查詢，不調用模型），最新的會議在前
+
+    - **q**: 決策內容或背景包含的文字（可選）
+    - **meeting_id**: 只返回該會議的決策
+    - **page**: 頁碼（從 1 開始）
+    - **page_size**: 每頁數量（最多 200）
+    """
+    return await run_in_threadpool(exporter.query_decisions, q, meeting_id, page, page_size)
+
+@router.get("/api/meetings/{meeting_id}", response_model=MeetingDetailResponse, dependencies=[Depends(require_archive_token)])
+async def get_meeting(meeting_id: int):
+    """
+    獲取單個會議記錄的完整內容
+
+    - **meeting_id**: 會議記錄 ID
+    """
+    meeting = await run_in_threadpool(exporter.get_meeting, meeting_id)
+    if meeting is None:
+        raise HTTPException(status_code=404, detail="會議記錄不存在")
+    return meeting
+
+@router.get("/api/meetings/{meeting_id}/download", dependencies=[Depends(require_archive_token)])
+async def download_meeting(meeting_id: int, format: Optional[str] = Query(None)):
+    """
+    下載會議記錄文件（以流的方式返回）
+
+    - **meeting_id**: 會議記錄 ID
+    - **format**: 文件格式，可選 json、json.gz、json.zst、jsonl、md（默認為導出時的格式）
+    """
+    if format is not None and format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的導出格式: {format}，可選: {', '.join(EXPORT_FORMATS)}")
+
+    try:
+        # 在導出器的後台線程中生成文件，不阻塞事件循環
+        filepath = await asyncio.wrap_future(exporter.get_export_file_async(meeting_id, format))
+    except Exception as e:
+        logger.error(f"生成會議記錄文件時發生錯誤: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"生成會議記錄文件時發生錯誤: {str(e)}")
+    if filepath is None:
+        raise HTTPException(status_code=404, detail="會議記錄不存在")
+
+    media_type = EXPORT_FORMATS[format_for_path(filepath)][1]
+    return FileResponse(filepath, media_type=media_type, filename=os.path.basename(filepath))
+
+# 創建 FastAPI 應用
+app = FastAPI(title="會議記錄查詢 API", description="提供已導出會議記錄的列表、全文搜索、語義搜索、詳情查詢和文件下載 API")
+
+# 允許跨域請求
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# 將路由添加到應用
+app.include_router(router)
+
+# 獨立運行時使用
+if __name__ == "__main__":
+    # 使用字符串導入方式運行應用
+    uvicorn.run("api.meetings:app", host="0.0.0.0", port=8004, reload=True)
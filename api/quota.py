@@ -0,0 +1,49 @@
+"""
+API 密鑰配額
+在開始處理請求前按 API 密鑰扣除請求次數、音頻時長和摘要 token 配額，並在響應頭中返回剩餘額度
+"""
+
+import os
+import sys
+from typing import Dict
+
+from fastapi import HTTPException, Response
+from starlette.concurrency import run_in_threadpool
+
+# 添加 AI_meeting_by_Gradio 目錄到 Python 路徑
+ai_meeting_dir = os.path.join(os.path.dirname(__file__), '..', 'AI_meeting_by_Gradio')
+if ai_meeting_dir not in sys.path:
+    sys.path.append(ai_meeting_dir)
+
+from utils.quota import QuotaExceeded, get_quota_manager
+
+# 配額資源對應的響應頭名稱
+_HEADER_NAMES = {"requests": "Requests", "audio_seconds": "Audio-Seconds", "summary_tokens": "Summary-Tokens"}
+
+
+def rate_limit_headers(levels: Dict[str, Dict[str, float]]) -> Dict[str, str]:
+    """將各項配額的上限和剩餘額度轉換為 X-RateLimit-* 響應頭"""
+    headers = {}
+    for resource, level in levels.items():
+        name = _HEADER_NAMES[resource]
+        headers[f"X-RateLimit-Limit-{name}"] = str(int(level["limit"]))
+        headers[f"X-RateLimit-Remaining-{name}"] = str(max(0, int(level["remaining"])))
+    return headers
+
+
+async def enforce_quota(api_key: str, response: Response, **costs: float) -> None:
+    """
+    扣除請求的配額，配額不足時返回 429
+    
+    - **api_key**: 請求使用的 API 密鑰
+    - **response**: 用於寫入剩餘額度響應頭的響應對象
+    - **costs**: 各項資源的用量，例如 requests=1, audio_seconds=620.5
+    """
+    try:
+        levels = await run_in_threadpool(get_quota_manager().consume, api_key, **costs)
+    except QuotaExceeded as e:
+        headers = rate_limit_headers(e.remaining)
+        if e.retry_after is not None:
+            headers["Retry-After"] = str(int(e.retry_after) + 1)
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
+    response.headers.update(rate_limit_headers(levels))
@@ -0,0 +1,43 @@
+"""
+會議摘要 API 生產環境入口
+以多個工作進程運行 API 服務，充分利用容器的所有 CPU 核心
+
+工作進程之間需要共享的狀態（任務狀態、緩存、限流計數、轉錄歷史）
+保存在 SHARED_STATE_DB 指向的 SQLite 數據庫中，因此增減工作進程數不會改變服務行為。
+"""
+
+import os
+import sys
+import uvicorn
+
+# 添加項目根目錄到 Python 路徑，以便正確導入模塊
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def get_worker_count() -> int:
+    """獲取工作進程數，未設置 API_WORKERS 時使用 CPU 核心數"""
+    workers = int(os.environ.get("API_WORKERS", "0"))
+    if workers > 0:
+        return workers
+    return os.cpu_count() or 1
+
+
+def main():
+    """以多工作進程模式啟動 API 服務"""
+    host = os.environ.get("API_HOST", "0.0.0.0")
+    # Cloud Run 通過 PORT 環境變量指定監聽端口
+    port = int(os.environ.get("API_PORT", os.environ.get("PORT", "8080")))
+
+    uvicorn.run(
+        "api.main:app",
+        host=host,
+        port=port,
+        workers=get_worker_count(),
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        timeout_keep_alive=int(os.environ.get("API_KEEP_ALIVE", "30")),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,11 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("text_to_summary_api")
 
-from fastapi import APIRouter, HTTPException, FastAPI, Header
+from fastapi import APIRouter, HTTPException, FastAPI, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uvicorn
 import sys
 
@@ -27,6 +28,12 @@ if ai_meeting_dir not in sys.path:
 
 # 導入現有的摘要模組
 from core.summary.generator import SummaryGenerator
+from core.summary import estimate_tokens
+from utils.openai_client import get_client_pool
+from utils.quota import get_quota_manager, key_id
+from api.quota import enforce_quota
+from utils.admission import get_admission_controller, refine_current_cost
+from utils.scheduler import get_scheduler
 
 # 定義請求和響應模型
 class TextSummaryRequest(BaseModel):
@@ -34,10 +41,14 @@ class TextSummaryRequest(BaseModel):
     text: str
     meeting_title: Optional[str] = ""
     participants: Optional[List[str]] = None
+    session_id: Optional[str] = None
+    incremental: bool = False
+    structured: bool = False
 
 class SummaryResponse(BaseModel):
     """摘要響應模型"""
     summary: str
+    structured: Optional[Dict[str, Any]] = None
     status: str = "success"
     message: Optional[str] = None
 
@@ -47,14 +58,25 @@ router = APIRouter()
 # 初始化摘要生成器
 summary_generator = SummaryGenerator()
 
+# 摘要任務的調度器（按 SCHEDULER_POLICY 選擇下一個執行的任務）
+summary_scheduler = get_scheduler("summary")
+
+# 按 API 密鑰緩存的 OpenAI 客戶端池
+client_pool = get_client_pool()
+
 @router.post("/api/text-to-summary", response_model=SummaryResponse)
-async def text_to_summary(request: TextSummaryRequest, x_api_key: Optional[str] = Header(None)):
+async def text_to_summary(request: TextSummaryRequest, response: Response, x_api_key: Optional[str] = Header(None)):
     """
     將會議文字記錄轉換為結構化摘要
     
     - **text**: 會議文字記錄
     - **meeting_title**: 會議標題（可選）
     - **participants**: 參與者列表（可選）
+    - **session_id**: 會議/會話 ID（可選，增量摘要時必填），增量摘要狀態按 API 密鑰分開保存
+    - **incremental**: 是否增量更新摘要（可選）。為 true 時 text 為目前為止的完整轉錄，
+      只有上一次請求之後新增的部分會與上一次的摘要一起發送給模型
+    - **structured**: 是否以結構化模式生成（可選）。為 true 時模型輸出經過驗證的 JSON，
+      在 structured 字段中返回標題、摘要、關鍵點、行動項目（負責人、截止日期、狀態）和決策
     - **x_api_key**: OpenAI API 密鑰（可從請求頭獲取）
     
     返回生成的會議摘要
@@ -65,17 +87,57 @@ async def text_to_summary(request: TextSummaryRequest, x_api_key: Optional[str]
         if not api_key:
             raise HTTPException(status_code=401, detail="未提供 OpenAI API 密鑰，請在請求頭中添加 X-API-KEY 或設置環境變數 OPENAI_API_KEY")
         
-        # 臨時設置 OpenAI API 密鑰
-        os.environ["OPENAI_API_KEY"] = api_key
+        # 獲取綁定該 API 密鑰的客戶端（不修改全局環境變量，不同租戶的請求可以並發執行）
+        client = client_pool.get(api_key)
         
-        # 使用現有的摘要生成器生成摘要
-        participants = request.participants if request.participants else []
-        summary = summary_generator.generate_summary(
-            request.text, 
-            meeting_title=request.meeting_title, 
-            participants=participants
+        # 增量摘要按會話保存進度，必須指定會話
+        if request.incremental and not request.session_id:
+            raise HTTPException(status_code=400, detail="增量摘要需要提供 session_id")
+        if request.incremental and request.structured:
+            raise HTTPException(status_code=400, detail="增量摘要不支持結構化模式")
+        
+        # 按實際文字長度更新准入控制的工作量估算，並在開始生成前扣除該 API 密鑰的配額
+        prompt_tokens = estimate_tokens(request.text)
+        refine_current_cost(get_admission_controller().estimate_cost(prompt_tokens=prompt_tokens))
+        await enforce_quota(
+            api_key, response, requests=1,
+            summary_tokens=get_quota_manager().estimate_summary_tokens(prompt_tokens=prompt_tokens)
         )
         
+        # 使用現有的摘要生成器生成摘要（在調度器中排隊，以 token 數作為任務大小）
+        participants = request.participants if request.participants else []
+        if request.incremental:
+            summary = await summary_scheduler.run(
+                summary_generator.generate_incremental_summary,
+                request.text,
+                request.session_id,
+                meeting_title=request.meeting_title,
+                participants=participants,
+                client=client,
+                cost=prompt_tokens, tenant=key_id(api_key)
+            )
+        elif request.structured:
+            summary, structured = await summary_scheduler.run(
+                summary_generator.generate_structured_summary,
+                request.text,
+                meeting_title=request.meeting_title,
+                participants=participants,
+                client=client,
+                cost=prompt_tokens, tenant=key_id(api_key)
+            )
+            if structured is None:
+                return SummaryResponse(summary="", status="error", message=summary)
+            return SummaryResponse(summary=summary, structured=structured)
+        else:
+            summary = await summary_scheduler.run(
+                summary_generator.generate_summary,
+                request.text,
+                meeting_title=request.meeting_title,
+                participants=participants,
+                client=client,
+                cost=prompt_tokens, tenant=key_id(api_key)
+            )
+        
         return SummaryResponse(summary=summary)
     except HTTPException:
         raise